@@ -1,8 +1,22 @@
 import hashlib
+import os
+import threading
+import time
 from base64 import decodebytes as decode
+from collections import OrderedDict
+
 from pyramid.authentication import BasicAuthAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.security import Allow, Authenticated
+from pyramid.threadlocal import get_current_registry
+
+
+#: Default number of seconds a user's checked credentials are cached
+#: (``0`` disables the cache)
+DEFAULT_AUTH_CACHE_TTL = 0
+
+#: Default maximum number of cached credentials
+DEFAULT_AUTH_CACHE_SIZE = 1024
 
 
 class RootFactory(object):
@@ -22,12 +36,141 @@ class RootFactory(object):
         raise KeyError(key)
 
 
+class CredentialCache(object):
+    """A bounded, in-process cache of the principals of the users
+    whose credentials have been successfully checked,
+    which expire ``ttl`` seconds after being checked.
+    When full, the least recently used credentials are dropped.
+
+    Passwords are not kept, only a (salted) digest of them,
+    so a changed password is not matched by the cached credentials.
+    However, the previous password (and groups) of a user are accepted
+    until their cached credentials expire or are invalidated
+    (see :meth:`invalidate`), because users are managed
+    by the legacy system, which does not notify this application.
+
+    :param ttl: number of seconds the credentials are cached
+                (``0`` disables the cache)
+    :type ttl: float
+    :param max_size: maximum number of cached credentials
+    :type max_size: int
+
+    """
+
+    def __init__(self, ttl=DEFAULT_AUTH_CACHE_TTL,
+                 max_size=DEFAULT_AUTH_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._salt = os.urandom(16)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, username, password):
+        digest = hashlib.sha256(self._salt + password.encode('utf8'))
+        return username, digest.digest()
+
+    def get(self, username, password):
+        """Lookup the principals of the given credentials.
+
+        :return: the principals or ``None`` when not cached
+        :rtype: list of str
+
+        """
+        key = self._key(username, password)
+        with self._lock:
+            try:
+                expires, principals = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return list(principals)
+
+    def set(self, username, password, principals):
+        """Cache the principals of the given (successfully checked)
+        credentials.
+
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        key = self._key(username, password)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl,
+                                  tuple(principals))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username=None):
+        """Drop the cached credentials of ``username``,
+        or all the cached credentials when no username is given
+        (e.g. after a user's password or groups have changed).
+
+        """
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+                return
+            for key in [x for x in self._entries if x[0] == username]:
+                del self._entries[key]
+
+    def stats(self):
+        """Report the cache's ``hits``, ``misses`` and ``size``.
+
+        :rtype: dict
+
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+        }
+
+
+def get_credential_cache(registry=None):
+    """Retrieve the cache of checked credentials.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: :class:`CredentialCache`
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    return registry.credential_cache
+
+
 def check_credentials(username, password, request):
     """Returns a sequence of principal identifiers for the user.
+    Successfully checked credentials are cached
+    (see :class:`CredentialCache`).
     """
+    cache = get_credential_cache(request.registry)
+    principals = cache.get(username, password)
+    if principals is None:
+        principals = _lookup_principals(username, password, request)
+        if principals is not None:
+            cache.set(username, password, principals)
+    return principals
+
+
+def _lookup_principals(username, password, request):
     t = request.db_tables
 
-    with request.get_db_engine('common').begin() as db_conn:
+    # The request's connection is shared with the rest of the request.
+    db_conn = request.db_conn
+    with db_conn.begin():
         result = db_conn.execute(
             t.persons.select()
             .where(t.persons.c.personid == username))
@@ -54,6 +197,12 @@ def check_password(pass_hash, password):
 
 
 def includeme(config):
+    settings = config.registry.settings
+    config.registry.credential_cache = CredentialCache(
+        ttl=float(settings.get('auth.cache_ttl', DEFAULT_AUTH_CACHE_TTL)),
+        max_size=int(settings.get('auth.cache_size') or
+                     DEFAULT_AUTH_CACHE_SIZE),
+    )
     auth_policy = BasicAuthAuthenticationPolicy(check_credentials)
     config.set_authentication_policy(auth_policy)
     config.set_authorization_policy(ACLAuthorizationPolicy())
@@ -0,0 +1,138 @@
+"""\
+Coalescing of the out-of-band requests made by concurrent publications.
+
+Publications that finish within a few seconds of each other often
+request the same urls of the legacy system for the same content
+(e.g. poking the ``latest`` page or purging the cache of a shared module).
+When a coalescing window is set, a publication's content is added
+to the content waiting for its requests to be sent
+(in the database, see :mod:`press.storage`), keyed by module id.
+When the window closes, a task builds the requests for all the content
+that is waiting
+(see :func:`press.subscribers.send_requests.send_pending_requests`),
+so that each module is requested once and purged along with the others.
+
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from pyramid.threadlocal import get_current_registry
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import case
+
+from .storage import pending_requests
+
+
+__all__ = (
+    'PendingRequests',
+    'get_coalesce_window',
+)
+
+
+#: Default number of seconds to wait before sending requests,
+#: during which the requests for the same content are coalesced
+#: (``0`` disables coalescing)
+DEFAULT_COALESCE_WINDOW = 0
+
+#: Number of seconds after which pending content is added again,
+#: in case the task that should have sent its requests was lost
+PENDING_EXPIRY = 600
+
+
+def get_coalesce_window(registry=None):
+    """Lookup the number of seconds requests wait to be coalesced.
+    A window of ``0`` disables coalescing.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: float
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    return float(settings.get('http.coalesce_window') or
+                 DEFAULT_COALESCE_WINDOW)
+
+
+class PendingRequests:
+    """The content waiting for its legacy requests to be sent,
+    stored in the database. Content is keyed by the url of the
+    application that published it and its module id,
+    so the latest version of a module that is published
+    more than once while waiting is the one requested.
+    The caller is responsible for the transaction.
+
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+
+    """
+
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+
+    def add(self, application_url, ids, now=None):
+        """Add the published content.
+
+        :param application_url: the url of the application
+                                that published the content
+        :type application_url: str
+        :param ids: a pairing of moduleid and major & minor version
+        :type ids: sequence of tuples containing the module and a sequence
+                   of the major and minor version
+        :return: the ids of the content that was not already waiting,
+                 for which the requests are to be sent
+        :rtype: list of str
+
+        """
+        if now is None:
+            now = datetime.now()
+        # The latest version of each module, in the order given
+        versions = OrderedDict()
+        for id, version in ids:
+            versions[id] = version
+        if not versions:
+            return []
+        c = pending_requests.c
+        # One statement both adds the content and tells what was added,
+        # so that content claimed meanwhile (see ``claim``) is added again
+        # and requested. The time the content started waiting is kept,
+        # unless it has expired, so the added content is that which
+        # started waiting now.
+        stmt = insert(pending_requests).values([
+            {'application_url': application_url,
+             'module_id': id,
+             'major_version': version[0],
+             'minor_version': version[1],
+             'queued': now}
+            for id, version in versions.items()])
+        expired = c.queued < now - timedelta(seconds=PENDING_EXPIRY)
+        result = self.db_conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[c.application_url, c.module_id],
+                set_={'major_version': stmt.excluded.major_version,
+                      'minor_version': stmt.excluded.minor_version,
+                      'queued': case([(expired, stmt.excluded.queued)],
+                                     else_=c.queued)})
+            .returning(c.module_id, c.queued))
+        added = set(id for id, queued in result if queued == now)
+        return [id for id in versions if id in added]
+
+    def claim(self, application_url):
+        """Remove the content, because its requests are about to be sent.
+        The same content published from now on is requested again.
+
+        :param application_url: the url of the application
+                                that published the content
+        :type application_url: str
+        :return: a pairing of moduleid and major & minor version
+        :rtype: list of tuples containing the module and a tuple
+                of the major and minor version
+
+        """
+        c = pending_requests.c
+        result = self.db_conn.execute(
+            pending_requests.delete()
+            .where(c.application_url == application_url)
+            .returning(c.module_id, c.major_version, c.minor_version))
+        return sorted([(id, (major, minor)) for id, major, minor in result])
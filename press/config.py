@@ -5,8 +5,29 @@ from pyramid.config import Configurator
 from pyramid.config.settings import asbool
 from sqlalchemy.exc import SAWarning
 
-from .auth import RootFactory
+from .auth import (
+    DEFAULT_AUTH_CACHE_SIZE,
+    DEFAULT_AUTH_CACHE_TTL,
+    RootFactory,
+)
+from .coalesce import DEFAULT_COALESCE_WINDOW
 from .exceptions import AppStartUpWarning
+from .fingerprints import DEFAULT_FINGERPRINTS_TTL
+from .housekeeping import DEFAULT_SWEEP_INTERVAL, DEFAULT_WORKSPACE_TTL
+from .outofband import (
+    DEFAULT_HTTP_CONCURRENCY,
+    DEFAULT_HTTP_DEADLINE,
+    DEFAULT_HTTP_HOST_CONCURRENCY,
+    DEFAULT_HTTP_POOL_SIZE,
+    REQUESTS_TIMEOUT,
+)
+from .publishing import DEFAULT_SCRATCH_MAX_SIZE
+from .subscribers.purge_cache import DEFAULT_PURGE_MAX_URL_LENGTH
+from .utils import BUFFER_CHUNK_SIZE
+
+
+#: Default maximum size (in bytes) of an uploaded litezip
+DEFAULT_UPLOAD_MAX_SIZE = 1073741824  # 1GB
 
 
 def discover_set(settings, setting_name, env_var, default=None,
@@ -78,23 +99,76 @@ def configure(settings=None):
     discover_set(settings, 'shared_directory', 'SHARED_DIR')
     assert os.path.exists(settings['shared_directory'])  # required
     # TODO check permissions for write access
+    discover_set(settings, 'shared_directory.keep_last',
+                 'SHARED_DIR_KEEP_LAST', 0, int)
+    discover_set(settings, 'shared_directory.ttl', 'SHARED_DIR_TTL',
+                 DEFAULT_WORKSPACE_TTL, float)
+    discover_set(settings, 'shared_directory.sweep_interval',
+                 'SHARED_DIR_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL, float)
 
     initialize_sentry_integration()
     discover_set(settings, 'celery.broker', 'AMQP_URL')
 
+    discover_set(settings, 'upload.chunk_size', 'UPLOAD_CHUNK_SIZE',
+                 BUFFER_CHUNK_SIZE, int)
+    discover_set(settings, 'upload.max_size', 'UPLOAD_MAX_SIZE',
+                 DEFAULT_UPLOAD_MAX_SIZE, int)
+    discover_set(settings, 'publishing.workers', 'PUBLISHING_WORKERS', 0, int)
+    discover_set(settings, 'publishing.module_timings',
+                 'PUBLISHING_MODULE_TIMINGS', False, asbool)
+    discover_set(settings, 'scratch_directory', 'SCRATCH_DIR')
+    discover_set(settings, 'scratch_directory.max_size', 'SCRATCH_MAX_SIZE',
+                 DEFAULT_SCRATCH_MAX_SIZE, int)
+
+    discover_set(settings, 'http.pool_size', 'HTTP_POOL_SIZE',
+                 DEFAULT_HTTP_POOL_SIZE, int)
+    discover_set(settings, 'http.connect_timeout', 'HTTP_CONNECT_TIMEOUT',
+                 REQUESTS_TIMEOUT[0], float)
+    discover_set(settings, 'http.read_timeout', 'HTTP_READ_TIMEOUT',
+                 REQUESTS_TIMEOUT[1], float)
+    discover_set(settings, 'http.concurrency', 'HTTP_CONCURRENCY',
+                 DEFAULT_HTTP_CONCURRENCY, int)
+    discover_set(settings, 'http.host_concurrency', 'HTTP_HOST_CONCURRENCY',
+                 DEFAULT_HTTP_HOST_CONCURRENCY, int)
+    discover_set(settings, 'http.deadline', 'HTTP_DEADLINE',
+                 DEFAULT_HTTP_DEADLINE, float)
+    discover_set(settings, 'http.coalesce_window', 'HTTP_COALESCE_WINDOW',
+                 DEFAULT_COALESCE_WINDOW, float)
+
+    discover_set(settings, 'purge.max_url_length', 'PURGE_MAX_URL_LENGTH',
+                 DEFAULT_PURGE_MAX_URL_LENGTH, int)
+    discover_set(settings, 'purge.collapse_ids', 'PURGE_COLLAPSE_IDS',
+                 True, asbool)
+
+    discover_set(settings, 'fingerprints.ttl', 'FINGERPRINTS_TTL',
+                 DEFAULT_FINGERPRINTS_TTL, float)
+    discover_set(settings, 'publication_log.max_age',
+                 'PUBLICATION_LOG_MAX_AGE', 0, float)
+
+    discover_set(settings, 'auth.cache_ttl', 'AUTH_CACHE_TTL',
+                 DEFAULT_AUTH_CACHE_TTL, float)
+    discover_set(settings, 'auth.cache_size', 'AUTH_CACHE_SIZE',
+                 DEFAULT_AUTH_CACHE_SIZE, int)
+
     discover_set(settings, 'debug', 'DEBUG', False, asbool)
     settings['logging.level'] = settings['debug'] and 'DEBUG' or 'INFO'
 
     # Create the configuration object
     config = Configurator(settings=settings, root_factory=RootFactory)
     config.include('.logging')
+    config.include('.timing')
     config.include('.subscribers')
     config.include('.views')
     config.include('.tasks')
+    config.include('.housekeeping')
+    config.include('.jobs')
+    config.include('.tracking')
+    config.include('.fingerprints')
     config.include('.auth')
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=SAWarning)
         config.include('cnxdb.contrib.pyramid')
+    config.include('.db')
 
     config.scan(ignore=['press.celery'])
     return config
@@ -0,0 +1,103 @@
+"""\
+The request's database connection and the gauges of the connection pool.
+
+Each request checks out at most one connection from the pool
+(``request.db_conn``), on first use, which is shared by everything
+done during the request (e.g. authentication and publishing)
+and is returned to the pool once the request has finished.
+
+"""
+import threading
+
+from cnxdb.contrib.pyramid import IEngine
+from pyramid.threadlocal import get_current_registry
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+__all__ = (
+    'PoolGauges',
+    'get_pool_gauges',
+)
+
+
+class PoolGauges(object):
+    """Gauges of a connection pool's usage, used to size the pool.
+
+    :param pool: the connection pool
+    :type pool: :class:`sqlalchemy.pool.Pool`
+
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self._lock = threading.Lock()
+        event.listen(pool, 'checkout', self._on_checkout)
+        event.listen(pool, 'checkin', self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out,
+                                        self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out -= 1
+
+    def stats(self):
+        """Report the pool's ``size`` (``None`` when unbounded),
+        the number of connections currently ``checked_out``,
+        the most connections checked out at once (``peak_checked_out``),
+        the total number of ``checkouts`` and the number of connections
+        in ``overflow`` of the pool's size.
+
+        :rtype: dict
+
+        """
+        is_bounded = isinstance(self.pool, QueuePool)
+        return {
+            'size': is_bounded and self.pool.size() or None,
+            'checked_out': self.checked_out,
+            'peak_checked_out': self.peak_checked_out,
+            'checkouts': self.checkouts,
+            'overflow': is_bounded and max(self.pool.overflow(), 0) or 0,
+        }
+
+
+def get_pool_gauges(registry=None):
+    """Retrieve the gauges of the (common) database connection pool.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: :class:`PoolGauges`
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    return registry.db_pool_gauges
+
+
+def _db_conn(request):
+    """Request attribute factory to give access to the request's
+    database connection, which is released when the request has finished.
+
+    """
+    db_conn = request.get_db_engine('common').connect()
+    request.add_finished_callback(lambda request: db_conn.close())
+    return db_conn
+
+
+def includeme(config):
+    """Add the database connection to every request
+    and measure the usage of the connection pool.
+
+    """
+    engine = config.registry.getUtility(IEngine, name='common')
+    config.registry.db_pool_gauges = PoolGauges(engine.pool)
+    config.add_request_method(_db_conn, name='db_conn', reify=True)
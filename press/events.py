@@ -23,8 +23,16 @@ class LegacyPublicationFinished:
     :param request: the request object
     :type request: :class:`pyramid.request.Request`
 
+    Subscribers add the (method, url) pairs to be requested of the
+    legacy system to ``http_requests``; these are sent as one batch
+    (see :func:`press.outofband.make_requests`) after all
+    the other subscribers have run. When coalescing
+    (see :mod:`press.coalesce`), the requests are built again
+    for all the waiting content once the coalescing window has closed.
+
     """
 
     def __init__(self, ids, request):
         self.ids = ids
         self.request = request
+        self.http_requests = []
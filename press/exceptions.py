@@ -16,7 +16,21 @@ class StaleVersion(Exception):
         self.item = item
 
 
+class StaleVersions(Exception):
+    """Raised when the checked out versions of one or more items
+    are older than their published versions"""
+    def __init__(self, errors):
+        #: the :class:`StaleVersion` of each stale item
+        self.errors = errors
+
+
 class Unchanged(Exception):
     """Raised when checked out version is older than published version"""
     def __init__(self, model):
         self.model = model
+
+
+class UploadTooLarge(Exception):
+    """Raised when an uploaded file is larger than the allowed size"""
+    def __init__(self, max_size):
+        self.max_size = max_size
@@ -0,0 +1,201 @@
+"""\
+Fingerprints of the litezips this application has published,
+used to recognize the resubmission of an already published litezip
+(e.g. a client's retry after a timeout) without publishing it again.
+
+A litezip's fingerprint is a Merkle-style hash of its contents:
+each directory is hashed from the names and hashes of its entries
+(the SHA1 of a file, or the hash of a subdirectory),
+so the fingerprint changes when any file is added, removed, renamed
+or changed.
+
+The fingerprints are kept in the database for ``fingerprints.ttl``
+seconds, which is how long a resubmission is recognized.
+
+"""
+import hashlib
+from datetime import datetime
+
+from pyramid.threadlocal import get_current_registry
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import select, text
+
+from .housekeeping import get_sweep_interval
+from .models import PublishedLitezip
+from .storage import expire_rows, fingerprints
+from .tasks import task
+
+
+__all__ = (
+    'FingerprintStore',
+    'expire_fingerprints',
+    'fingerprint_manifest',
+    'get_fingerprints_ttl',
+    'lookup_published_state',
+)
+
+
+#: Default number of seconds the fingerprints are kept
+DEFAULT_FINGERPRINTS_TTL = 604800  # 1 week
+
+
+def _hash_tree(tree):
+    hasher = hashlib.sha1()
+    for name in sorted(tree):
+        value = tree[name]
+        if isinstance(value, dict):
+            kind, value = 'tree', _hash_tree(value)
+        else:
+            kind = 'blob'
+        hasher.update('{} {} {}\n'.format(kind, name, value).encode('utf8'))
+    return hasher.hexdigest()
+
+
+def fingerprint_manifest(manifest, root):
+    """Produce the fingerprint of an expanded litezip
+    from the SHA1 of each of its files.
+
+    :param manifest: file hashes as produced by
+                     :func:`press.publishing.ingest_zip`
+    :type manifest: dict
+    :param root: the directory the litezip was expanded in
+    :type root: :class:`pathlib.Path`
+    :return: the fingerprint
+    :rtype: str
+
+    """
+    tree = {}
+    for path, hashes in manifest.items():
+        parts = path.relative_to(root).parts
+        node = tree
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = hashes['sha1']
+    return _hash_tree(tree)
+
+
+def lookup_published_state(ids, db_conn):
+    """Lookup the currently published state of the given content,
+    which changes whenever any of it is published.
+
+    :param ids: the ids of the content (e.g. m12345 or col11629)
+    :type ids: sequence of str
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :return: mapping of id to the module_ident of its latest version
+    :rtype: dict
+
+    """
+    result = db_conn.execute(
+        text('SELECT moduleid, module_ident FROM latest_modules '
+             'WHERE moduleid = any(:ids)')
+        .bindparams(ids=list(ids)))
+    return {moduleid: module_ident for moduleid, module_ident in result}
+
+
+def get_fingerprints_ttl(registry=None):
+    """Lookup the number of seconds the fingerprints are kept.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: float
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    return float(settings.get('fingerprints.ttl') or
+                 DEFAULT_FINGERPRINTS_TTL)
+
+
+class FingerprintStore:
+    """The fingerprints of the published litezips, stored in the database
+    (see :mod:`press.storage`), each with the published state of its
+    content (see :func:`lookup_published_state`) at the time
+    it was published and the response to its publication.
+    The caller is responsible for the transaction.
+
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+
+    """
+
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+
+    def get(self, fingerprint):
+        """Lookup the published litezip with the given fingerprint.
+
+        :param fingerprint: the litezip's fingerprint
+        :type fingerprint: str
+        :return: the published litezip or ``None`` when not published
+        :rtype: :class:`press.models.PublishedLitezip`
+
+        """
+        c = fingerprints.c
+        row = self.db_conn.execute(
+            select([c.state, c.status_code, c.response])
+            .where(c.fingerprint == fingerprint)).first()
+        return row and PublishedLitezip(*row) or None
+
+    def set(self, fingerprint, published, recorded=None):
+        """Record the published litezip with the given fingerprint.
+
+        :param fingerprint: the litezip's fingerprint
+        :type fingerprint: str
+        :param published: the published state of the litezip's content
+                          and the response to its publication
+        :type published: :class:`press.models.PublishedLitezip`
+        :param recorded: when it was published (defaults to now)
+        :type recorded: :class:`datetime.datetime`
+
+        """
+        if recorded is None:
+            recorded = datetime.now()
+        values = dict(published._asdict(), recorded=recorded)
+        stmt = insert(fingerprints).values(fingerprint=fingerprint, **values)
+        self.db_conn.execute(stmt.on_conflict_do_update(
+            index_elements=[fingerprints.c.fingerprint],
+            set_=values))
+
+    def expire(self, ttl, now=None):
+        """Remove the fingerprints recorded longer than ``ttl`` seconds ago.
+
+        :param ttl: the time-to-live in seconds
+        :type ttl: float
+        :param now: the current time (defaults to now)
+        :type now: :class:`datetime.datetime`
+        :return: the number of removed fingerprints
+        :rtype: int
+
+        """
+        return expire_rows(self.db_conn, fingerprints.c.recorded, ttl,
+                           now=now)
+
+
+@task(bind=True)
+def expire_fingerprints(self):
+    """Periodically remove the fingerprints that are older than
+    ``fingerprints.ttl`` (see :meth:`FingerprintStore.expire`).
+
+    """
+    ttl = get_fingerprints_ttl(self.registry)
+    pyramid_request = self.get_pyramid_request()
+    db_conn = pyramid_request.db_conn
+    with db_conn.begin():
+        return FingerprintStore(db_conn).expire(ttl)
+
+
+def includeme(config):
+    """Schedule the periodic expiry of the fingerprints
+    with Celery beat.
+
+    """
+    task_path = '.'.join([expire_fingerprints.__module__,
+                          expire_fingerprints.__name__])
+    config.registry.celery_app.conf.beat_schedule.update({
+        'expire-fingerprints': {
+            'task': task_path,
+            'schedule': get_sweep_interval(config.registry),
+        },
+    })
@@ -0,0 +1,221 @@
+"""\
+Housekeeping of the shared directory.
+
+Each publication uploads a file and expands it into a directory
+within the shared directory (see :mod:`press.publishing`).
+These are released once the publication has finished, either by
+removing them or by retaining the last few for debugging.
+Anything left behind (e.g. by a crashed process) is swept away
+by a periodic task once it is older than a time-to-live.
+
+"""
+import shutil
+import time
+from datetime import datetime
+
+from pyramid.threadlocal import get_current_registry
+
+from .publishing import (
+    EXPANSION_PREFIX,
+    UPLOAD_PREFIX,
+    get_scratch_location,
+    get_var_location,
+)
+from .tasks import task
+
+
+__all__ = (
+    'get_disk_usage',
+    'get_retention',
+    'get_sweep_interval',
+    'release_workspace',
+    'sweep_shared_directory',
+    'sweep_workspace',
+)
+
+
+#: Directory (within the shared directory) of the retained publication files
+RETAINED_DIR = 'retained'
+
+#: Default number of seconds after which an upload or expansion is orphaned
+DEFAULT_WORKSPACE_TTL = 86400  # 1 day
+
+#: Default number of seconds between sweeps of the shared directory
+DEFAULT_SWEEP_INTERVAL = 3600  # 1 hour
+
+_WORKSPACE_PREFIXES = (UPLOAD_PREFIX, EXPANSION_PREFIX)
+
+
+def get_retention(registry=None):
+    """Lookup the number of finished publications to retain the files of
+    and the number of seconds after which an upload or expansion
+    is considered orphaned.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the number to keep and the time-to-live in seconds
+    :rtype: tuple of int and float
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    keep_last = int(settings.get('shared_directory.keep_last') or 0)
+    ttl = float(settings.get('shared_directory.ttl') or
+                DEFAULT_WORKSPACE_TTL)
+    return keep_last, ttl
+
+
+def get_sweep_interval(registry=None):
+    """Lookup the number of seconds between sweeps of the shared directory.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: float
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    return float(settings.get('shared_directory.sweep_interval') or
+                 DEFAULT_SWEEP_INTERVAL)
+
+
+def _remove(path):
+    try:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(str(path))
+        else:
+            path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _is_workspace(path):
+    return path.name.startswith(_WORKSPACE_PREFIXES)
+
+
+def release_workspace(paths, registry=None):
+    """Release the uploaded file and expanded directory of a finished
+    publication. These are removed, unless ``shared_directory.keep_last``
+    is set, in which case they are moved into the ``retained`` directory
+    and only that many of the latest publications are kept.
+
+    :param paths: the publication's uploaded file and expanded directory
+    :type paths: sequence of :class:`pathlib.Path`
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+
+    """
+    keep_last, _ = get_retention(registry)
+    paths = [path for path in paths if path is not None]
+    if not paths:
+        return
+    if not keep_last:
+        for path in paths:
+            _remove(path)
+        return
+
+    retained = get_var_location(registry) / RETAINED_DIR
+    retained.mkdir(exist_ok=True)
+    # Named by time, so that the names sort in the order of publication
+    name = '{}-{}'.format(datetime.now().strftime('%Y%m%dT%H%M%S.%f'),
+                          paths[0].name)
+    destination = retained / name
+    destination.mkdir()
+    for path in paths:
+        if path.exists():
+            # Moved rather than renamed, because expansions may be
+            # on another filesystem (see the scratch directory).
+            shutil.move(str(path), str(destination / path.name))
+
+    for path in sorted(retained.iterdir())[:-keep_last]:
+        _remove(path)
+
+
+def sweep_workspace(registry=None, now=None):
+    """Remove the uploaded files and expanded directories (within the
+    shared and scratch directories) that were last modified longer than
+    ``shared_directory.ttl`` seconds ago. These have been left behind,
+    because publications release theirs when finished.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the removed paths
+    :rtype: list of :class:`pathlib.Path`
+
+    """
+    _, ttl = get_retention(registry)
+    if now is None:
+        now = time.time()
+    locations = [get_var_location(registry)]
+    scratch_directory, _ = get_scratch_location(registry)
+    if scratch_directory is not None:
+        locations.append(scratch_directory)
+    removed = []
+    paths = [path for location in locations for path in location.iterdir()]
+    for path in paths:
+        try:
+            modified = path.stat().st_mtime
+        except FileNotFoundError:  # pragma: no cover
+            continue
+        if _is_workspace(path) and now - modified > ttl:
+            _remove(path)
+            removed.append(path)
+    return removed
+
+
+def get_disk_usage(registry=None):
+    """Measure the shared directory's disk usage.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the ``total``, ``used`` and ``free`` bytes of the disk,
+             the number of ``uploads`` and ``expansions``
+             and the number of ``retained`` publications
+    :rtype: dict
+
+    """
+    location = get_var_location(registry)
+    usage = shutil.disk_usage(str(location))
+    names = [path.name for path in location.iterdir()]
+    retained = location / RETAINED_DIR
+    return {
+        'total': usage.total,
+        'used': usage.used,
+        'free': usage.free,
+        'uploads': len([x for x in names if x.startswith(UPLOAD_PREFIX)]),
+        'expansions': len([x for x in names
+                           if x.startswith(EXPANSION_PREFIX)]),
+        'retained': retained.exists() and len(list(retained.iterdir())) or 0,
+    }
+
+
+@task(bind=True)
+def sweep_shared_directory(self):
+    """Periodically remove the orphaned uploads and expansions
+    (see :func:`sweep_workspace`).
+
+    """
+    pyramid_request = self.get_pyramid_request()
+    removed = sweep_workspace(pyramid_request.registry)
+    for path in removed:
+        pyramid_request.log.info(
+            "removed orphaned '{}' from the shared directory"
+            .format(path.name))
+    return len(removed)
+
+
+def includeme(config):
+    """Schedule the periodic sweep of the shared directory
+    with Celery beat.
+
+    """
+    task_path = '.'.join([sweep_shared_directory.__module__,
+                          sweep_shared_directory.__name__])
+    config.registry.celery_app.conf.beat_schedule.update({
+        'sweep-shared-directory': {
+            'task': task_path,
+            'schedule': get_sweep_interval(config.registry),
+        },
+    })
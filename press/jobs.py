@@ -0,0 +1,248 @@
+"""\
+Publication jobs, which publish an uploaded litezip outside of the
+request that uploaded it (see :func:`run_publication_job`).
+
+The state of each job is kept in a file within the shared directory,
+so that it is shared by the web and worker processes.
+
+"""
+import json
+import re
+import time
+import uuid
+from pathlib import Path
+
+import structlog
+from pyramid.request import Request
+from pyramid.scripting import prepare
+from pyramid.threadlocal import get_current_registry
+
+from .housekeeping import (
+    get_retention,
+    get_sweep_interval,
+    release_workspace,
+)
+from .legacy_publishing import publish_upload
+from .publishing import get_var_location
+from .tasks import task
+
+
+__all__ = (
+    'FAILED',
+    'FINISHED',
+    'JobStore',
+    'PROCESSING',
+    'QUEUED',
+    'expire_publication_jobs',
+    'get_job_store',
+    'run_publication_job',
+)
+
+
+logger = structlog.get_logger('press.jobs')
+
+#: Directory (within the shared directory) of the jobs
+JOBS_DIR = 'jobs'
+
+# Job states
+QUEUED = 'queued'
+PROCESSING = 'processing'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def get_job_store(registry=None):
+    """Retrieve the store of publication jobs.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: :class:`JobStore`
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    return JobStore(get_var_location(registry) / JOBS_DIR)
+
+
+class JobStore:
+    """The publication jobs, stored as a file per job.
+
+    A job is a dict containing its ``id``, its ``status``
+    (one of ``queued``, ``processing``, ``finished`` or ``failed``),
+    the ``phase`` of the publication (while processing), the
+    ``created`` and ``updated`` times, and, once done, the
+    ``status_code`` and ``result`` of the publication
+    (the response the publication request would have made).
+
+    :param directory: location of the job files
+    :type directory: :class:`pathlib.Path`
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, job_id):
+        return self.directory / '{}.json'.format(job_id)
+
+    def _write(self, job):
+        self.directory.mkdir(exist_ok=True)
+        path = self._path(job['id'])
+        tmp_path = path.with_suffix('.tmp')
+        with tmp_path.open('w') as fb:
+            json.dump(job, fb)
+        tmp_path.replace(path)
+
+    def create(self, **data):
+        """Create a queued job.
+
+        :param data: data used to run the job
+        :return: the job
+        :rtype: dict
+
+        """
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': QUEUED,
+            'phase': None,
+            'created': now,
+            'updated': now,
+            'data': data,
+        }
+        self._write(job)
+        return job
+
+    def get(self, job_id):
+        """Lookup a job.
+
+        :param job_id: the job's id
+        :type job_id: str
+        :return: the job or ``None`` when it doesn't exist
+        :rtype: dict
+
+        """
+        if not _JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with self._path(job_id).open('r') as fb:
+                return json.load(fb)
+        except FileNotFoundError:
+            return None
+
+    def update(self, job_id, **changes):
+        """Update a job.
+
+        :param job_id: the job's id
+        :type job_id: str
+        :return: the job or ``None`` when it doesn't exist
+        :rtype: dict
+
+        """
+        job = self.get(job_id)
+        if job is None:
+            # e.g. the job expired while it was being processed,
+            # which is not undone by writing it again.
+            return None
+        job.update(changes)
+        job['updated'] = time.time()
+        self._write(job)
+        return job
+
+    def expire(self, ttl, now=None):
+        """Remove the jobs that were last updated
+        longer than ``ttl`` seconds ago.
+
+        :return: the ids of the removed jobs
+        :rtype: list of str
+
+        """
+        if now is None:
+            now = time.time()
+        if not self.directory.exists():
+            return []
+        removed = []
+        for path in self.directory.glob('*.json'):
+            if now - path.stat().st_mtime > ttl:
+                path.unlink()
+                removed.append(path.stem)
+        return removed
+
+
+@task(bind=True)
+def run_publication_job(self, job_id):
+    """Publish the job's uploaded litezip
+    (see :func:`press.legacy_publishing.publish_upload`),
+    recording the progress and outcome of the publication in the job.
+
+    """
+    registry = self.registry
+    store = get_job_store(registry)
+    job = store.get(job_id)
+    if job is None:
+        # e.g. the job expired before the worker got to it
+        logger.error('publication job not found', job_id=job_id)
+        return
+    data = job['data']
+
+    # The publication needs a request for the host the litezip
+    # was uploaded to, because of the urls made from it.
+    request = Request.blank('/', base_url=data['application_url'])
+    env = prepare(request=request, registry=registry)
+    upload_filepath = Path(data['upload'])
+    workspace = [upload_filepath]
+
+    def update(**changes):
+        if store.update(job_id, **changes) is None:
+            # The publication carries on, but its outcome is not kept.
+            logger.warning('publication job not found', job_id=job_id)
+
+    def report(phase):
+        update(status=PROCESSING, phase=phase)
+
+    try:
+        status_code, result = publish_upload(
+            env['request'],
+            upload_filepath,
+            (data['publisher'], data['message']),
+            workspace,
+            report=report,
+        )
+    except Exception:
+        update(status=FAILED, status_code=500, result=None)
+        raise
+    else:
+        status = status_code < 400 and FINISHED or FAILED
+        update(status=status, status_code=status_code, result=result)
+    finally:
+        release_workspace(workspace, registry)
+        # Release the request's resources (e.g. its database connection)
+        env['request']._process_finished_callbacks()
+        env['closer']()
+
+
+@task(bind=True)
+def expire_publication_jobs(self):
+    """Periodically remove the jobs that are older than the time-to-live
+    of the shared directory's files (see :func:`JobStore.expire`).
+
+    """
+    _, ttl = get_retention(self.registry)
+    return len(get_job_store(self.registry).expire(ttl))
+
+
+def includeme(config):
+    """Schedule the periodic expiry of the publication jobs
+    with Celery beat.
+
+    """
+    task_path = '.'.join([expire_publication_jobs.__module__,
+                          expire_publication_jobs.__name__])
+    config.registry.celery_app.conf.beat_schedule.update({
+        'expire-publication-jobs': {
+            'task': task_path,
+            'schedule': get_sweep_interval(config.registry),
+        },
+    })
@@ -1,3 +1,4 @@
 from .litezip import *  # noqa: F403,F401
 from .collection import *  # noqa: F403,F401
 from .module import *  # noqa: F403,F401
+from .upload import *  # noqa: F403,F401
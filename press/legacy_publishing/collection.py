@@ -1,11 +1,15 @@
 from hashlib import sha1
+
+from lxml import etree
 from pyramid.threadlocal import get_current_request
 from sqlalchemy.sql import text
 
 from press.exceptions import StaleVersion, Unchanged
 from press.parsers import parse_collxml
-from .utils import replace_id_and_version, needs_major_rev, needs_minor_rev, \
-    produce_hashes_from_filepath
+from press.parsers.common import make_elm_tree
+from press.utils import lookup_hashes
+from .utils import replace_id_and_version, diff_collection_trees, \
+    is_major_change, is_minor_change, insert_resource_files
 
 
 __all__ = (
@@ -14,7 +18,7 @@ __all__ = (
 
 
 def publish_legacy_book(model, metadata, submission, db_conn,
-                        modules_changed=None):
+                        modules_changed=None, manifest=None, cache=None):
     """Publish a Book (aka Collection) as the legacy (zope-based) system
     would.
 
@@ -26,6 +30,13 @@ def publish_legacy_book(model, metadata, submission, db_conn,
     :type submission: tuple
     :param db_conn: a database connection object
     :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param modules_changed: whether any of the collection's modules
+                            were published along with it
+    :type modules_changed: bool
+    :param manifest: file hashes (see :func:`press.publishing.ingest_zip`)
+    :type manifest: dict
+    :param cache: a cache of the publication's parsed documents
+    :type cache: :class:`press.parsers.DocumentCache`
 
     """
     t = get_current_request().db_tables
@@ -61,7 +72,7 @@ def publish_legacy_book(model, metadata, submission, db_conn,
         existing_shas = {filename: sha for filename, sha in shas}
 
         if existing_shas['collection.xml'] \
-                == produce_hashes_from_filepath(model.file)['sha1']:
+                == lookup_hashes(model.file, manifest)['sha1']:
             for res in model.resources:
                 if res.sha1 != existing_shas.get(res.filename):
                     break  # publish!
@@ -79,18 +90,24 @@ def publish_legacy_book(model, metadata, submission, db_conn,
 
     existing_file = db_conn.execute(file_sql).fetchone()
 
-    pre = parse_collxml(existing_file.file)
+    # Both trees are built from lxml trees, so that they are comparable
+    # and the (possibly cached) collection document is not parsed again.
+    pre = parse_collxml(etree.fromstring(bytes(existing_file.file)))
 
     major_version = existing_module.major_version
     minor_version = existing_module.minor_version
 
-    with model.file.open('rb') as pf:
-        post_tree = parse_collxml(pf)
+    post_tree = parse_collxml(make_elm_tree(model, cache))
 
-    if needs_major_rev(pre, post_tree):
+    with get_current_request().timer.phase('publishing.collection_diff'):
+        changes = diff_collection_trees(pre, post_tree)
+    get_current_request().log.info(
+        'collection changes', collection=metadata.id,
+        **changes._asdict())
+    if is_major_change(changes):
         major_version += 1
         minor_version = 1
-    elif needs_minor_rev(pre, post_tree):
+    elif is_minor_change(changes):
         minor_version += 1
     else:
         raise Unchanged(model)
@@ -170,31 +187,7 @@ def publish_legacy_book(model, metadata, submission, db_conn,
     db_conn.execute(stmt)
 
     # Insert resource files (images, pdfs, etc.)
-    for resource in model.resources:
-        try:
-            # Try finding an existing file first
-            fileid = db_conn.execute(
-                text('SELECT fileid FROM '
-                     'files WHERE sha1 = :sha1')
-                .bindparams(sha1=resource.sha1)
-            ).fetchone().fileid
-        except AttributeError:
-            # Insert it when it doesn't exist
-            with resource.data.open('rb') as fp:
-                result = db_conn.execute(
-                    t.files.insert().values(
-                        file=fp.read(),
-                        media_type=resource.media_type,
-                    )
-                )
-            fileid = result.inserted_primary_key[0]
-        result = db_conn.execute(
-            t.module_files.insert().values(
-                module_ident=ident,
-                fileid=fileid,
-                filename=resource.filename,
-            )
-        )
+    insert_resource_files(model.resources, ident, db_conn)
 
     # Copy over existing module_files entries
     stmt = text(
@@ -215,7 +208,7 @@ def publish_legacy_book(model, metadata, submission, db_conn,
     )
 
     # Rewrite the content with the id and version
-    replace_id_and_version(model, id, version)
+    replace_id_and_version(model, id, version, cache=cache)
 
     # Insert module files (content and resources)
     with model.file.open('rb') as fb:
@@ -1,22 +1,67 @@
 from litezip.main import COLLECTION_NSMAP
-from lxml import etree
 
 from litezip import Collection, Module
+from pyramid.threadlocal import get_current_request
 
-from press.parsers import parse_collection_metadata, parse_module_metadata
+from press.exceptions import StaleVersion, StaleVersions
+from press.parsers import DocumentCache, parse_collection_metadata
+from press.publishing import parse_document_version, preprocess_modules
 
-from press.exceptions import Unchanged
 from press.utils import convert_version_to_legacy_version
 from .collection import publish_legacy_book
-from .module import publish_legacy_page
+from .module import (
+    fetch_latest_modules,
+    find_changed_modules,
+    publish_legacy_pages,
+)
 
 
 __all__ = (
+    'check_versions',
     'publish_litezip',
 )
 
 
-def publish_litezip(struct, submission, db_conn):
+def check_versions(struct, db_conn, existing_modules=None):
+    """Check that every item in the litezip is checked out
+    at its currently published version, prior to publishing any of them.
+
+    Only the ``md:version`` of each document is parsed and the published
+    versions are looked up with a single query.
+
+    :param struct: a litezip struct
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param existing_modules: the already looked up latest versions
+        (see :func:`press.legacy_publishing.module.fetch_latest_modules`)
+    :type existing_modules: dict
+    :raises press.exceptions.StaleVersions: with every item
+        that is not at its currently published version
+
+    """
+    items = [item for item in struct if item.id is not None]
+    if not items:
+        return
+    if existing_modules is None:
+        existing_modules = fetch_latest_modules(
+            [item.id for item in items], db_conn)
+    current_versions = {moduleid: row.version
+                        for moduleid, row in existing_modules.items()}
+
+    errors = []
+    for item in items:
+        current_version = current_versions.get(item.id)
+        if current_version is None:
+            continue  # not yet published
+        version = parse_document_version(item.file)
+        if version != current_version:
+            errors.append(StaleVersion(version, current_version, item))
+    if errors:
+        raise StaleVersions(errors)
+
+
+def publish_litezip(struct, submission, db_conn, manifest=None,
+                    workers=None):
     """Publish the contents of a litezip structured set of data.
 
     :param struct: a litezip struct from (probably from
@@ -26,6 +71,14 @@ def publish_litezip(struct, submission, db_conn):
     :type submission: tuple
     :param db_conn: a database connection object
     :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param manifest: file hashes (see :func:`press.publishing.ingest_zip`)
+    :type manifest: dict
+    :param workers: the number of workers used to preprocess the modules
+                    (see :func:`press.publishing.preprocess_modules`)
+    :type workers: int
+    :raises press.exceptions.StaleVersions: when any of the items
+        is not at its currently published version
+        (see :func:`check_versions`)
 
     """
     # Dissect objects from litezip struct.
@@ -35,44 +88,78 @@ def publish_litezip(struct, submission, db_conn):
         raise NotImplementedError('litezip without collection')
 
     id_map = {}  # pragma: no cover
+    timer = get_current_request().timer
+
+    # Refuse stale content before doing any of the work to publish it.
+    # The latest versions are looked up once for the whole publication.
+    with timer.phase('publishing.preflight'):
+        existing_modules = fetch_latest_modules(
+            [x.id for x in struct if x.id is not None], db_conn)
+        check_versions(struct, db_conn, existing_modules=existing_modules)
+
+    # Each document is parsed once for the duration of this publication.
+    cache = DocumentCache()
 
     # Parse Collection tree to update the newly published Modules.
-    with collection.file.open('rb') as fb:
-        xml = etree.parse(fb)
+    xml = cache.parse(collection.file)
+
+    # Only the Modules that have changed need to be parsed and published.
+    manifest = {} if manifest is None else manifest
+    with timer.phase('publishing.change_detection'):
+        changed = find_changed_modules(
+            [x for x in struct if isinstance(x, Module)], db_conn,
+            manifest=manifest, existing_modules=existing_modules)
+    modules = changed.modules
+
+    # Parse and hash the changed Modules before writing to the database.
+    items = []
+    with timer.phase('publishing.preprocessing'):
+        preprocessed = preprocess_modules(modules, manifest, workers=workers,
+                                          cache=cache, timer=timer)
+    for module, metadata, hashes in preprocessed:
+        manifest[module.file] = hashes
+        items.append((module, metadata))
 
     # Publish the Modules.
-    for module in [x for x in struct if isinstance(x, Module)]:
-        metadata = parse_module_metadata(module)
-        old_id = module.id
-
-        try:
-            (id, version), ident = publish_legacy_page(module, metadata,
-                                                       submission, db_conn)
-            id_map[old_id] = (id, version)
-            # Update the Collection tree
-            xpath = '//col:module[@document="{}"]'.format(old_id)
-            for elm in xml.xpath(xpath, namespaces=COLLECTION_NSMAP):
-                elm.attrib['document'] = id
-                version_attrib_name = (
-                    '{{{}}}version-at-this-collection-version'
-                    .format(COLLECTION_NSMAP['cnxorg']))
-                legacy_version = convert_version_to_legacy_version(version)
-                elm.attrib[version_attrib_name] = legacy_version
-        except Unchanged:
-            pass  # only publish content that has changed.
+    with timer.phase('publishing.modules'):
+        published = publish_legacy_pages(items, submission, db_conn,
+                                         manifest=manifest, cache=cache,
+                                         changed=changed)
+    # The Module trees are no longer needed.
+    for module in modules:
+        cache.discard(module.file)
+    # Only the content that has changed was published.
+    for old_id, ((id, version), ident) in published.items():
+        id_map[old_id] = (id, version)
+        # Update the Collection tree
+        xpath = '//col:module[@document="{}"]'.format(old_id)
+        for elm in xml.xpath(xpath, namespaces=COLLECTION_NSMAP):
+            elm.attrib['document'] = id
+            version_attrib_name = (
+                '{{{}}}version-at-this-collection-version'
+                .format(COLLECTION_NSMAP['cnxorg']))
+            legacy_version = convert_version_to_legacy_version(version)
+            elm.attrib[version_attrib_name] = legacy_version
 
     modules_changed = bool(id_map)
     if modules_changed:
-        # Rebuild the Collection tree from the newly published Modules.
-        with collection.file.open('wb') as fb:
-            fb.write(etree.tounicode(xml).encode('utf8'))
+        # The Collection tree now refers to the newly published Modules,
+        # it is written out when the Collection's id and version are set.
+        cache.modified(collection.file)
+        # The hashes for the original file no longer apply.
+        manifest.pop(collection.file, None)
 
     # Maybe publish the Collection.
-    metadata = parse_collection_metadata(collection)
-    old_id = collection.id
-    (id, version), ident = publish_legacy_book(
-        collection, metadata, submission, db_conn,
-        modules_changed=modules_changed)
+    try:
+        with timer.phase('publishing.collection'):
+            metadata = parse_collection_metadata(collection, cache)
+            old_id = collection.id
+            (id, version), ident = publish_legacy_book(
+                collection, metadata, submission, db_conn,
+                modules_changed=modules_changed, manifest=manifest,
+                cache=cache)
+    finally:
+        cache.flush()
     id_map[old_id] = (id, version)
 
     return id_map
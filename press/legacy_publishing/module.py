@@ -1,17 +1,31 @@
+from collections import namedtuple
+from hashlib import sha1
+
 from pyramid.threadlocal import get_current_request
-from sqlalchemy.sql import text
+from sqlalchemy.sql import or_, text
 
-from press.utils import produce_hashes_from_filepath
+from press.utils import lookup_hashes
 from press.exceptions import StaleVersion, Unchanged
-from .utils import replace_id_and_version
+from .utils import bulk_insert_resource_files, replace_id_and_version
 
 
 __all__ = (
+    'ChangedModules',
+    'fetch_latest_modules',
+    'find_changed_modules',
     'publish_legacy_page',
+    'publish_legacy_pages',
 )
 
 
-def publish_legacy_page(model, metadata, submission, db_conn):
+#: The result of :func:`find_changed_modules`, which carries the rows
+#: (by module id) and file SHA1s (by module_ident) it looked up,
+#: so that they are not looked up again to publish the changed modules
+ChangedModules = namedtuple('ChangedModules',
+                            'modules existing_modules existing_shas')
+
+
+def publish_legacy_page(model, metadata, submission, db_conn, manifest=None):
     """Publish a Page (aka Module) as the legacy (zope-based) system
     would.
 
@@ -23,174 +37,348 @@ def publish_legacy_page(model, metadata, submission, db_conn):
     :type submission: tuple
     :param db_conn: a database connection object
     :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param manifest: file hashes (see :func:`press.publishing.ingest_zip`)
+    :type manifest: dict
 
     """
-    t = get_current_request().db_tables
+    published = publish_legacy_pages([(model, metadata)], submission,
+                                     db_conn, manifest=manifest)
+    try:
+        return published[model.id]
+    except KeyError:
+        # cnxml and all resources are identical to already published
+        raise Unchanged(model)
+
 
-    if model.id is None or metadata.id is None:  # pragma: no cover
-        raise NotImplementedError()
+def fetch_latest_modules(ids, db_conn):
+    """Lookup the latest published version of the given modules
+    (or collections) at once.
 
+    :param ids: the module ids
+    :type ids: sequence of str
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :return: mapping of module id to its ``latest_modules`` row,
+             which leaves out those that have not been published
+    :rtype: dict
+
+    """
+    t = get_current_request().db_tables
     result = db_conn.execute(
         t.latest_modules.select()
-        .where(t.latest_modules.c.moduleid == metadata.id)
+        .where(t.latest_modules.c.moduleid.in_(ids))
     )
+    return {row.moduleid: row for row in result}
 
-    # At this time, this code assumes an existing module
-    existing_module = result.fetchone()
 
-    if metadata.version != existing_module.version:
-        raise StaleVersion(metadata.version, existing_module.version, model)
+def _fetch_existing_shas(module_idents, db_conn):
+    result = db_conn.execute(
+        text("SELECT module_ident, filename, sha1 FROM module_files"
+             " JOIN files USING (fileid)"
+             " WHERE module_ident = ANY(:mod_idents)")
+        .bindparams(mod_idents=list(module_idents)))
+    existing_shas = {ident: {} for ident in module_idents}
+    for ident, filename, sha in result:
+        existing_shas[ident][filename] = sha
+    return existing_shas
 
-    shas = (db_conn.execute(
-            text("SELECT filename, sha1 FROM module_files"
-                 " JOIN files USING (fileid)"
-                 " WHERE module_ident = :mod_ident")
-            .bindparams(mod_ident=existing_module.module_ident))
-            ).fetchall()
 
-    existing_shas = {filename: sha for filename, sha in shas}
+def _is_changed(model, existing_shas, manifest=None):
+    mod_sha1 = lookup_hashes(model.file, manifest)['sha1']
+    if mod_sha1 != existing_shas.get('index.cnxml'):
+        return True
+    for res in model.resources:
+        if (res.filename not in existing_shas or
+                res.sha1 != existing_shas[res.filename]):
+            return True
+    return False
 
-    mod_sha1 = produce_hashes_from_filepath(model.file)['sha1']
-    if mod_sha1 == existing_shas['index.cnxml']:
-        for res in model.resources:
-            if (res.filename not in existing_shas or
-                    res.sha1 != existing_shas[res.filename]):
-                break  # publish!
-        else:  # cnxml and all resources are identical to already published
-            raise Unchanged(model)
 
-    major_version = existing_module.major_version + 1
+def find_changed_modules(modules, db_conn, manifest=None,
+                         existing_modules=None):
+    """Find the modules whose content (cnxml or resources) differs from
+    the latest published version of the module, by comparing their SHA1s
+    to those of the published files, which are looked up all at once.
+    This needs neither the module's metadata nor its parsed document,
+    so it is used to avoid parsing the modules that have not changed.
+
+    :param modules: the modules
+    :type modules: sequence of :class:`litezip.Module`
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param manifest: file hashes (see :func:`press.publishing.ingest_zip`)
+    :type manifest: dict
+    :param existing_modules: the already looked up latest versions
+                             (see :func:`fetch_latest_modules`)
+    :type existing_modules: dict
+    :return: the changed modules, in the given order, including those
+             that have not been published before, along with the
+             looked up rows and SHA1s
+             (to be given to :func:`publish_legacy_pages`)
+    :rtype: :class:`ChangedModules`
 
-    # Get existing abstract, if exists, otherwise add it
+    """
+    modules = list(modules)
+    if existing_modules is None:
+        existing_modules = fetch_latest_modules(
+            [x.id for x in modules if x.id is not None], db_conn)
+    existing_shas = _fetch_existing_shas(
+        set([existing_modules[x.id].module_ident
+             for x in modules if x.id in existing_modules]),
+        db_conn)
+    changed = []
+    for model in modules:
+        try:
+            existing_module = existing_modules[model.id]
+        except KeyError:
+            changed.append(model)  # i.e. not yet published
+            continue
+        if _is_changed(model, existing_shas[existing_module.module_ident],
+                       manifest):
+            changed.append(model)
+    return ChangedModules(changed, existing_modules, existing_shas)
+
+
+def _lookup_abstract_ids(abstracts, db_conn):
+    """Get the existing abstracts, adding those that do not exist."""
+    t = get_current_request().db_tables
+    abstracts = set(abstracts)
+    non_null_abstracts = [x for x in abstracts if x is not None]
+    criteria = [t.abstracts.c.abstract.in_(non_null_abstracts)]
+    if None in abstracts:
+        criteria.append(t.abstracts.c.abstract.is_(None))
     result = db_conn.execute(
         t.abstracts.select()
-        .where(t.abstracts.c.abstract == metadata.abstract)
+        .where(or_(*criteria))
     )
-    try:
-        abstractid = result.fetchone().abstractid
-    except AttributeError:  # NoneType
-        result = db_conn.execute(t.abstracts.insert()
-                                 .values(abstract=metadata.abstract))
-        abstractid = result.inserted_primary_key[0]
+    abstract_ids = {}
+    for row in result:
+        abstract_ids.setdefault(row.abstract, row.abstractid)
+
+    missing = [x for x in abstracts if x not in abstract_ids]
+    if missing:
+        result = db_conn.execute(
+            t.abstracts.insert()
+            .values([{'abstract': abstract} for abstract in missing])
+            .returning(t.abstracts.c.abstract, t.abstracts.c.abstractid))
+        abstract_ids.update(result.fetchall())
+    return abstract_ids
+
 
-    # Get the license identifier
+def _lookup_license_ids(license_urls, db_conn):
+    t = get_current_request().db_tables
     result = db_conn.execute(
         t.licenses.select()
-        .where(t.licenses.c.url == metadata.license_url))
-    licenseid = result.fetchone().licenseid
+        .where(t.licenses.c.url.in_(set(license_urls))))
+    return {row.url: row.licenseid for row in result}
+
+
+def publish_legacy_pages(items, submission, db_conn, manifest=None,
+                         cache=None, changed=None):
+    """Publish many Pages (aka Modules) as the legacy (zope-based) system
+    would.
+
+    The existing modules, their files, abstracts and licenses are looked
+    up for all the given modules at once, and the new modules are written
+    with a handful of bulk inserts rather than several statements
+    per module.
+
+    :param items: pairs of module and its metadata
+    :type items: sequence of :class:`litezip.Module` and
+                 :class:`press.models.ModuleMetadata` pairs
+    :param submission: a two value tuple containing a userid
+                       and submit message
+    :type submission: tuple
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param manifest: file hashes (see :func:`press.publishing.ingest_zip`)
+    :type manifest: dict
+    :param cache: a cache of the publication's parsed documents
+    :type cache: :class:`press.parsers.DocumentCache`
+    :param changed: the result of :func:`find_changed_modules`
+                    for the given modules, in which case they are
+                    neither looked up nor compared again
+    :type changed: :class:`ChangedModules`
+    :return: mapping of the model's id to the published id & version
+             and module_ident, containing only the modules that changed
+    :rtype: dict
+    :raises press.exceptions.StaleVersion: when a module's version
+        is not the currently published version
+
+    """
+    if not items:
+        return {}
+    t = get_current_request().db_tables
+
+    for model, metadata in items:
+        if model.id is None or metadata.id is None:  # pragma: no cover
+            raise NotImplementedError()
+
+    # At this time, this code assumes existing modules
+    if changed is None:
+        existing_modules = fetch_latest_modules(
+            [metadata.id for _, metadata in items], db_conn)
+    else:
+        existing_modules = changed.existing_modules
+
+    for model, metadata in items:
+        existing_module = existing_modules[metadata.id]
+        if metadata.version != existing_module.version:
+            raise StaleVersion(metadata.version, existing_module.version,
+                               model)
+
+    if changed is None:
+        existing_shas = _fetch_existing_shas(
+            [x.module_ident for x in existing_modules.values()], db_conn)
+
+        # Only publish the modules that have changed.
+        items = [
+            (model, metadata) for model, metadata in items
+            if _is_changed(
+                model,
+                existing_shas[existing_modules[metadata.id].module_ident],
+                manifest,
+            )
+        ]
+        if not items:
+            return {}
+
+    abstract_ids = _lookup_abstract_ids(
+        [metadata.abstract for _, metadata in items], db_conn)
+    license_ids = _lookup_license_ids(
+        [metadata.license_url for _, metadata in items], db_conn)
 
     # Insert module metadata
-    result = db_conn.execute(t.modules.insert().values(
-        uuid=existing_module.uuid,
-        moduleid=metadata.id,
-        major_version=major_version,
-        portal_type='Module',
-        name=metadata.title,
-        created=existing_module.created,
-        abstractid=abstractid,
-        licenseid=licenseid,
-        doctype='',
-        submitter=submission[0],
-        submitlog=submission[1],
-        language=metadata.language,
-        authors=metadata.authors,
-        maintainers=metadata.maintainers,
-        licensors=metadata.licensors,
-        # Carry over parentage information
-        parent=existing_module.parent,
-        parentauthors=existing_module.parentauthors,
-        google_analytics=existing_module.google_analytics,
-    ).returning(
+    values = []
+    for model, metadata in items:
+        existing_module = existing_modules[metadata.id]
+        values.append(dict(
+            uuid=existing_module.uuid,
+            moduleid=metadata.id,
+            major_version=existing_module.major_version + 1,
+            portal_type='Module',
+            name=metadata.title,
+            created=existing_module.created,
+            abstractid=abstract_ids[metadata.abstract],
+            licenseid=license_ids[metadata.license_url],
+            doctype='',
+            submitter=submission[0],
+            submitlog=submission[1],
+            language=metadata.language,
+            authors=metadata.authors,
+            maintainers=metadata.maintainers,
+            licensors=metadata.licensors,
+            # Carry over parentage information
+            parent=existing_module.parent,
+            parentauthors=existing_module.parentauthors,
+            google_analytics=existing_module.google_analytics,
+        ))
+    result = db_conn.execute(t.modules.insert().values(values).returning(
         t.modules.c.module_ident,
         t.modules.c.moduleid,
         t.modules.c.major_version,
         t.modules.c.minor_version,
     ))
-    ident, id, major_version, minor_version = result.fetchone()
-    version = (major_version, minor_version,)
+    inserted = {id: (ident, (major_version, minor_version,))
+                for ident, id, major_version, minor_version in result}
+
+    published = {}  # model id to ((id, version), ident)
+    for model, metadata in items:
+        ident, version = inserted[metadata.id]
+        published[model.id] = ((metadata.id, version), ident)
+    idents = {model.id: published[model.id][1] for model, _ in items}
 
     # Insert subjects metadata
-    stmt = (text('INSERT INTO moduletags '
-                 'SELECT :module_ident AS module_ident, tagid '
-                 'FROM tags WHERE tag = any(:subjects)')
-            .bindparams(module_ident=ident,
-                        subjects=list(metadata.subjects)))
-    result = db_conn.execute(stmt)
+    pairs = [(idents[model.id], subject)
+             for model, metadata in items
+             for subject in set(metadata.subjects)]
+    if pairs:
+        stmt = (text('INSERT INTO moduletags '
+                     'SELECT m.module_ident, tagid '
+                     'FROM unnest(:module_idents ::integer[],'
+                     '            :subjects ::text[])'
+                     '       AS m(module_ident, subject)'
+                     '     JOIN tags ON (tag = m.subject)')
+                .bindparams(module_idents=[x[0] for x in pairs],
+                            subjects=[x[1] for x in pairs]))
+        db_conn.execute(stmt)
 
     # Insert keywords metadata
-    stmt = (text('INSERT INTO keywords (word) '
-                 'SELECT iword AS word '
-                 'FROM unnest(:keywords ::text[]) AS iword '
-                 '     LEFT JOIN keywords AS kw ON (kw.word = iword) '
-                 'WHERE kw.keywordid IS NULL')
-            .bindparams(keywords=list(metadata.keywords)))
-    db_conn.execute(stmt)
-    stmt = (text('INSERT INTO modulekeywords '
-                 'SELECT :module_ident AS module_ident, keywordid '
-                 'FROM keywords WHERE word = any(:keywords)')
-            .bindparams(module_ident=ident,
-                        keywords=list(metadata.keywords)))
-    db_conn.execute(stmt)
+    pairs = [(idents[model.id], keyword)
+             for model, metadata in items
+             for keyword in set(metadata.keywords)]
+    if pairs:
+        stmt = (text('INSERT INTO keywords (word) '
+                     'SELECT iword AS word '
+                     'FROM unnest(:keywords ::text[]) AS iword '
+                     '     LEFT JOIN keywords AS kw ON (kw.word = iword) '
+                     'WHERE kw.keywordid IS NULL')
+                .bindparams(keywords=sorted(set([x[1] for x in pairs]))))
+        db_conn.execute(stmt)
+        stmt = (text('INSERT INTO modulekeywords '
+                     'SELECT m.module_ident, keywordid '
+                     'FROM unnest(:module_idents ::integer[],'
+                     '            :keywords ::text[])'
+                     '       AS m(module_ident, keyword)'
+                     '     JOIN keywords ON (word = m.keyword)')
+                .bindparams(module_idents=[x[0] for x in pairs],
+                            keywords=[x[1] for x in pairs]))
+        db_conn.execute(stmt)
 
     # Insert resource files (images, pdfs, etc.)
-    for resource in model.resources:
-        try:
-            # Try finding an existing file first
-            fileid = db_conn.execute(
-                text('SELECT fileid FROM '
-                     'files WHERE sha1 = :sha1')
-                .bindparams(sha1=resource.sha1)
-            ).fetchone().fileid
-        except AttributeError:
-            # Insert it when it doesn't exist
-            with resource.data.open('rb') as fp:
-                result = db_conn.execute(
-                    t.files.insert().values(
-                        file=fp.read(),
-                        media_type=resource.media_type,
-                    )
-                )
-            fileid = result.inserted_primary_key[0]
-        result = db_conn.execute(
-            t.module_files.insert().values(
-                module_ident=ident,
-                fileid=fileid,
-                filename=resource.filename,
-            )
-        )
+    bulk_insert_resource_files(
+        {idents[model.id]: model.resources for model, _ in items},
+        db_conn,
+    )
 
     # Copy over existing module_files entries
     stmt = text(
         'INSERT INTO module_files '
-        'SELECT :module_ident, fileid, filename '
-        'FROM module_files '
-        'WHERE module_ident = :previous_module_ident '
-        '      AND ('
-        '          filename NOT IN (SELECT filename '
-        '                           FROM module_files '
-        '                           WHERE module_ident = :module_ident)'
-        '          AND filename !~ \'index.cnxml\')'
-    )
-    db_conn.execute(
-        stmt,
-        module_ident=ident,
-        previous_module_ident=existing_module.module_ident,
+        'SELECT m.module_ident, mf.fileid, mf.filename '
+        'FROM unnest(:module_idents ::integer[],'
+        '            :previous_module_idents ::integer[])'
+        '       AS m(module_ident, previous_module_ident)'
+        '     JOIN module_files AS mf'
+        '          ON (mf.module_ident = m.previous_module_ident) '
+        'WHERE mf.filename NOT IN (SELECT filename '
+        '                          FROM module_files '
+        '                          WHERE module_ident = m.module_ident)'
+        '      AND mf.filename !~ \'index.cnxml\''
+    ).bindparams(
+        module_idents=[idents[model.id] for model, _ in items],
+        previous_module_idents=[
+            existing_modules[metadata.id].module_ident
+            for _, metadata in items
+        ],
     )
+    db_conn.execute(stmt)
 
     # Rewrite the content with the id and version
-    replace_id_and_version(model, id, version)
+    shas = {}  # module_ident to sha1
+    contents = {}  # sha1 to content
+    for model, metadata in items:
+        (id, version), ident = published[model.id]
+        replace_id_and_version(model, id, version, cache=cache)
+        with model.file.open('rb') as fb:
+            content = fb.read()
+        sha = sha1(content).hexdigest()
+        shas[ident] = sha
+        # Identical content is only inserted once.
+        contents[sha] = content
 
-    # Insert module files (content and resources)
-    with model.file.open('rb') as fb:
-        result = db_conn.execute(t.files.insert().values(
-            file=fb.read(),
-            media_type='text/xml',
-        ))
-    fileid = result.inserted_primary_key[0]
-    result = db_conn.execute(t.module_files.insert().values(
-        module_ident=ident,
-        fileid=fileid,
-        filename='index.cnxml',
-    ))
+    # Insert module files (content)
+    result = db_conn.execute(
+        t.files.insert()
+        .values([{'file': content, 'media_type': 'text/xml'}
+                 for content in contents.values()])
+        .returning(t.files.c.sha1, t.files.c.fileid))
+    fileids = dict(result.fetchall())
+    db_conn.execute(t.module_files.insert().values([
+        {'module_ident': ident,
+         'fileid': fileids[sha],
+         'filename': 'index.cnxml',
+         }
+        for ident, sha in shas.items()
+    ]))
 
-    return (id, version), ident
+    return published
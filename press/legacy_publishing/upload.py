@@ -0,0 +1,219 @@
+import zipfile
+
+from litezip import validate_litezip
+
+from press import events
+from press.exceptions import StaleVersion, StaleVersions, Unchanged
+from press.fingerprints import (
+    FingerprintStore,
+    fingerprint_manifest,
+    lookup_published_state,
+)
+from press.models import PublishedLitezip
+from press.publishing import (
+    discover_content_dir,
+    ingest_zip,
+    parse_litezip,
+)
+from press.utils import (
+    convert_version_tuple_to_version_string,
+    convert_version_to_legacy_version
+)
+from .litezip import publish_litezip
+
+
+__all__ = (
+    'publish_upload',
+)
+
+
+def _ignore_phase(phase):
+    pass
+
+
+def _stale_version_message(err):
+    return {
+        'id': 3,
+        'message': 'stale version',
+        'item': err.item.id,
+        'error': 'checked out version is {co}'
+                 ' but currently published'
+                 ' is {cv}'.format(co=err.checked_out_version,
+                                   cv=err.current_version),
+    }
+
+
+def publish_upload(request, upload_filepath, submission, workspace,
+                   report=None):
+    """Publish an uploaded litezip, producing the response
+    (the http status code and body) to the publication request.
+
+    :param request: the request object
+    :type request: :class:`pyramid.request.Request`
+    :param upload_filepath: path to the uploaded litezip
+    :type upload_filepath: :class:`pathlib.Path`
+    :param submission: a two value tuple containing a userid
+                       and submit message
+    :type submission: tuple
+    :param workspace: the publication's files, to which the expanded
+                      litezip's directory is appended
+    :type workspace: list of :class:`pathlib.Path`
+    :param report: called with the name of each phase of the
+                   publication as it starts (i.e. ``expanding``,
+                   ``validating``, ``publishing`` and ``notifying``)
+    :type report: callable
+    :return: the http status code and the response body
+    :rtype: tuple of int and list, dict or None
+
+    The time taken by each phase is logged as a summary record
+    once the publication is done (see :mod:`press.timing`).
+
+    A litezip identical to one that has already been published
+    (see :mod:`press.fingerprints`) is not published again,
+    unless its content has since been published by other means.
+    Instead, the response to its publication is produced again.
+
+    """
+    if report is None:
+        report = _ignore_phase
+
+    status_code = 500  # i.e. when an exception is raised
+    try:
+        status_code, body = _publish_upload(request, upload_filepath,
+                                            submission, workspace, report)
+    finally:
+        # A summary of where the publication's time went.
+        request.log.info('publication timings', status_code=status_code,
+                         **request.timer.summary())
+    return status_code, body
+
+
+def _find_published(request, fingerprint):
+    """Find the response to the publication of the litezip with the given
+    fingerprint, when it has been published and none of its content
+    has been published since.
+
+    """
+    db_conn = request.db_conn
+    with db_conn.begin():
+        published = FingerprintStore(db_conn).get(fingerprint)
+        if published is None:
+            return None
+        state = lookup_published_state(published.state, db_conn)
+    if state != published.state:
+        return None
+    return published.status_code, published.response
+
+
+def _record_published(request, fingerprint, litezip_struct,
+                      status_code, body):
+    """Record the published state of the litezip's content
+    and the response to its publication.
+
+    """
+    db_conn = request.db_conn
+    try:
+        with db_conn.begin():
+            state = lookup_published_state(
+                [x.id for x in litezip_struct if x.id is not None], db_conn)
+            FingerprintStore(db_conn).set(
+                fingerprint, PublishedLitezip(state, status_code, body))
+    except Exception:
+        # The publication has already been committed,
+        # so its response must not fail because it was not recorded.
+        request.log.exception('failed to record the published litezip',
+                              fingerprint=fingerprint)
+
+
+def _publish_upload(request, upload_filepath, submission, workspace,
+                    report):
+    timer = request.timer
+
+    # Check that it's a valid zipfile, while expanding and hashing it.
+    report('expanding')
+    try:
+        with timer.phase('expanding'):
+            litezip_dir, manifest = ingest_zip(upload_filepath)
+    except zipfile.BadZipFile:
+        return 400, {'messages': [
+            {'id': 1,
+             'message': 'The given file is not a valid zip formatted file.'},
+        ]}
+    workspace.append(litezip_dir)
+
+    # Recognize the resubmission of an already published litezip.
+    with timer.phase('fingerprinting'):
+        fingerprint = fingerprint_manifest(manifest, litezip_dir)
+        response = _find_published(request, fingerprint)
+    if response is not None:
+        request.log.info('litezip already published',
+                         fingerprint=fingerprint)
+        # The response to the litezip's publication
+        return response
+
+    litezip_dir = discover_content_dir(litezip_dir)
+
+    # Parse the litezip to a data type structure.
+    report('validating')
+    with timer.phase('parsing'):
+        litezip_struct = parse_litezip(litezip_dir, manifest)
+
+    # Validate the litezip content
+    with timer.phase('validating'):
+        validation_msgs = validate_litezip(litezip_struct)
+    if validation_msgs:  # if it's not an empty list of messages
+        return 400, {'messages': [
+            {'id': 2,
+             'message': 'validation issue',
+             'item': str(path.relative_to(litezip_dir)),
+             'error': message,
+             }
+            for path, message in validation_msgs
+        ]}
+
+    start_event = events.LegacyPublicationStarted(
+        litezip_struct,
+        request,
+    )
+    with timer.phase('notifying'):
+        request.registry.notify(start_event)
+
+    report('publishing')
+    db_conn = request.db_conn
+    try:
+        with timer.phase('publishing'), db_conn.begin():
+            id_mapping = publish_litezip(litezip_struct, submission,
+                                         db_conn, manifest=manifest)
+    except StaleVersions as err:
+        return 400, {'messages': [
+            _stale_version_message(error) for error in err.errors
+        ]}
+    except StaleVersion as err:
+        return 400, {'messages': [_stale_version_message(err)]}
+    except Unchanged:
+        _record_published(request, fingerprint, litezip_struct, 202, None)
+        return 202, None  # maybe?  # TODO: change neb as well.
+
+    resp_data = []
+    for src_id, (id, ver) in id_mapping.items():
+        version_string = convert_version_tuple_to_version_string(ver)
+        legacy_version = convert_version_to_legacy_version(ver)
+        resp_data.append({
+            'source_id': src_id,
+            'id': id,
+            'version': version_string,
+            'legacy_version': legacy_version,
+            'url': request.route_url('api.v1.versioned_content',
+                                     id=id, ver=legacy_version),
+        })
+    _record_published(request, fingerprint, litezip_struct, 200, resp_data)
+
+    report('notifying')
+    finish_event = events.LegacyPublicationFinished(
+        id_mapping.values(),
+        request,
+    )
+    with timer.phase('notifying'):
+        request.registry.notify(finish_event)
+
+    return 200, resp_data
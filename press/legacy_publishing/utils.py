@@ -4,42 +4,257 @@ from litezip import (
 )
 from litezip.main import COLLECTION_NSMAP
 from lxml import etree
+from pyramid.threadlocal import get_current_request
+from sqlalchemy.sql import text
 
+from ..models import CollectionChanges
 from ..utils import convert_version_to_legacy_version, \
     produce_hashes_from_filepath
 
 __all__ = (
+    'bulk_insert_resource_files',
+    'diff_collection_trees',
+    'insert_resource_files',
     'replace_derived_from',
     'replace_id_and_version',
+    'is_major_change',
+    'is_minor_change',
     'needs_major_rev',
     'needs_minor_rev',
     'produce_hashes_from_filepath',
 )
 
 
-def needs_major_rev(pre, post):
-    """True if:
-    - Collection title changes (this does not include module title changes)
-    - Collection structure changes (adding, removing, moving)
+# Maximum number of bytes of file data to send in a single insert
+FILES_INSERT_BATCH_SIZE = 16777216  # 16MB
+
+
+def _batch_by_size(resources, max_size=FILES_INSERT_BATCH_SIZE):
+    """Group the resources into batches of roughly ``max_size`` bytes
+    of file data, so that large resources are not all held in memory
+    at the same time.
+
+    """
+    batch, batch_size = [], 0
+    for resource in resources:
+        size = resource.data.stat().st_size
+        if batch and batch_size + size > max_size:
+            yield batch
+            batch, batch_size = [], 0
+        batch.append(resource)
+        batch_size += size
+    if batch:
+        yield batch
+
+
+def insert_resource_files(resources, module_ident, db_conn):
+    """Associate the given resources with a module, reusing
+    any file that already exists in the database.
+
+    :param resources: resources of the module
+    :type resources: sequence of :class:`litezip.Resource`
+    :param module_ident: the module's identifier
+    :type module_ident: int
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+
+    """
+    bulk_insert_resource_files({module_ident: resources}, db_conn)
+
+
+def bulk_insert_resource_files(resources_by_ident, db_conn):
+    """Associate resources with many modules, reusing
+    any file that already exists in the database.
+
+    Existing files are resolved in one query, only the missing files
+    are inserted and the ``module_files`` entries are inserted
+    in one statement.
+
+    :param resources_by_ident: mapping of module identifier
+                               to the module's resources
+    :type resources_by_ident: dict of int to
+                              sequence of :class:`litezip.Resource`
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+
     """
-    removed = set(pre.iter('module')) - set(post.iter('module'))
-    added = set(post.iter('module')) - set(pre.iter('module'))
+    all_resources = [resource
+                     for resources in resources_by_ident.values()
+                     for resource in resources]
+    if not all_resources:
+        return
+    t = get_current_request().db_tables
+
+    # Find the existing files
+    shas = sorted(set([resource.sha1 for resource in all_resources]))
+    result = db_conn.execute(
+        text('SELECT sha1, fileid FROM files WHERE sha1 = ANY(:shas)')
+        .bindparams(shas=shas))
+    fileids = dict(result.fetchall())
+
+    # Insert the files that don't exist
+    missing = {}
+    for resource in all_resources:
+        if resource.sha1 not in fileids:
+            missing.setdefault(resource.sha1, resource)
+    for batch in _batch_by_size(missing.values()):
+        values = []
+        for resource in batch:
+            with resource.data.open('rb') as fp:
+                values.append({
+                    'file': fp.read(),
+                    'media_type': resource.media_type,
+                })
+        result = db_conn.execute(
+            t.files.insert()
+            .values(values)
+            .returning(t.files.c.sha1, t.files.c.fileid))
+        fileids.update(result.fetchall())
+
+    db_conn.execute(t.module_files.insert().values([
+        {'module_ident': module_ident,
+         'fileid': fileids[resource.sha1],
+         'filename': resource.filename,
+         }
+        for module_ident, resources in resources_by_ident.items()
+        for resource in resources
+    ]))
+
+
+# The version attribute of a module within the collection tree
+VERSION_ATTR = 'version-at-this-collection-version'
+
+
+def _child_text(elm, tag):
+    for child in elm.children:
+        if child.tag == tag:
+            return child.alltext()
+    return None
+
+
+def _walk_content(tree):
+    """Walk the collection's content in a single pass, collecting
+    the modules (in document order) and the subcollections.
+    A subcollection is keyed by its path, the position of it
+    and each of its parent subcollections within their parent.
 
-    if len(removed) != 0 or len(added) != 0:
-        return True  # number of modules changed
+    """
+    modules = []  # (document id, subcollection path, title, version)
+    subcollections = {}  # subcollection path to title
+
+    def walk(elm, path):
+        position = 0
+        for child in elm.children:
+            if child.tag == 'module':
+                modules.append((child.attr('document'), path,
+                                _child_text(child, 'title'),
+                                child.attr(VERSION_ATTR)))
+            elif child.tag == 'subcollection':
+                sub_path = path + (position,)
+                position += 1
+                subcollections[sub_path] = _child_text(child, 'title')
+                walk(child, sub_path)
+            elif child.tag == 'content':
+                walk(child, path)
+
+    content = tree.find('content')
+    if content is not tree.Empty:
+        walk(content, ())
+    return modules, subcollections
+
+
+def _collection_metadata(tree):
+    abstract = tree.find('abstract')
+    return {
+        'abstract': (abstract.text, abstract.tail)
+        if abstract is not tree.Empty else None,
+        'subjects': tree.find('subjectlist').alltext(),
+        'parameters': params_as_dict(tree.findall('param')),
+        'actors': actors_as_dict(tree.findall('person')),
+        'roles': roles_as_dict(tree.findall('role')),
+    }
+
+
+def diff_collection_trees(pre, post):
+    """Compare two collection trees (see :func:`press.parsers.parse_collxml`)
+    and produce the set of changes between them.
+
+    Modules are keyed by their ``document`` id, subcollections by their
+    path and the collection itself by the empty path ``()``.
+    Each tree is walked once, so this runs in linear time.
+
+    :param pre: the collection tree before the change
+    :type pre: :class:`press.models.PressElement`
+    :param post: the collection tree after the change
+    :type post: :class:`press.models.PressElement`
+    :return: the ids of the added, removed and moved modules;
+             the keys of the retitled collection, subcollections
+             and modules; the names of the changed collection metadata
+             (abstract, subjects, parameters, actors or roles);
+             and the ids of the modules with a changed version
+    :rtype: :class:`press.models.CollectionChanges`
 
+    """
+    pre_modules, pre_subcols = _walk_content(pre)
+    post_modules, post_subcols = _walk_content(post)
+    pre_ids = set([x[0] for x in pre_modules])
+    post_ids = set([x[0] for x in post_modules])
+    common_ids = pre_ids & post_ids
+
+    added = tuple(sorted(post_ids - pre_ids))
+    removed = tuple(sorted(pre_ids - post_ids))
+
+    # A module has moved when its position among the modules
+    # in both trees, or its subcollection, has changed.
+    moved = set()
+    pre_order = [x for x in pre_modules if x[0] in common_ids]
+    post_order = [x for x in post_modules if x[0] in common_ids]
+    for this, other in zip(pre_order, post_order):
+        if this[:2] != other[:2]:
+            moved.update([this[0], other[0]])
+
+    retitled = []
     if pre.find('title').alltext() != post.find('title').alltext():
-        return True  # collection's title changed
+        retitled.append(())
+    for path, title in sorted(pre_subcols.items()):
+        if path in post_subcols and post_subcols[path] != title:
+            retitled.append(path)
+    pre_by_id = {x[0]: x for x in pre_order}
+    post_by_id = {x[0]: x for x in post_order}
+    retitled.extend([id for id in sorted(common_ids)
+                     if pre_by_id[id][2] != post_by_id[id][2]])
+
+    pre_metadata = _collection_metadata(pre)
+    post_metadata = _collection_metadata(post)
+    metadata_changed = tuple([name for name in pre_metadata
+                              if pre_metadata[name] != post_metadata[name]])
+
+    version_changed = tuple([id for id in sorted(common_ids)
+                             if pre_by_id[id][3] != post_by_id[id][3]])
+
+    return CollectionChanges(
+        added=added,
+        removed=removed,
+        moved=tuple(sorted(moved)),
+        retitled=tuple(retitled),
+        metadata_changed=metadata_changed,
+        version_changed=version_changed,
+    )
 
-    for this, other in zip(pre.find('content').iter('module'),
-                           post.find('content').iter('module')):
-        if this != other:
-            return True  # order changed
 
-    return False
+def is_major_change(changes):
+    """True if:
+    - Collection title changes (this does not include module title changes)
+    - Collection structure changes (adding, removing, moving)
+
+    :param changes: the changes (see :func:`diff_collection_trees`)
+    :type changes: :class:`press.models.CollectionChanges`
+    """
+    return bool(changes.added or changes.removed or changes.moved or
+                () in changes.retitled)
 
 
-def needs_minor_rev(pre, post):
+def is_minor_change(changes):
     """True if:
     1. Collection or module metadata changes
         - abstract
@@ -48,37 +263,25 @@ def needs_minor_rev(pre, post):
     3. Collection or module actor changes
     4. Collection or module role changes
     5. Module version changes
-    """
-    if pre.find('abstract') != post.find('abstract'):
-        return True
-    if pre.find('subjectlist').alltext() != post.find('subjectlist').alltext():
-        return True
 
-    params_before = params_as_dict(pre.findall('param'))
-    params_after = params_as_dict(post.findall('param'))
-
-    if params_before != params_after:
-        return True
-
-    actors_before = actors_as_dict(pre.findall('person'))
-    actors_after = actors_as_dict(post.findall('person'))
-
-    if actors_before != actors_after:
-        return True
-
-    roles_before = roles_as_dict(pre.findall('role'))
-    roles_after = roles_as_dict(post.findall('role'))
+    :param changes: the changes (see :func:`diff_collection_trees`)
+    :type changes: :class:`press.models.CollectionChanges`
+    """
+    return bool(changes.metadata_changed or changes.version_changed)
 
-    if roles_before != roles_after:
-        return True
 
-    pre_versions = versions_as_set(pre.findall('module'))
-    post_versions = versions_as_set(post.findall('module'))
+def needs_major_rev(pre, post):
+    """True if the changes between the trees need a major revision,
+    see :func:`is_major_change`.
+    """
+    return is_major_change(diff_collection_trees(pre, post))
 
-    if pre_versions != post_versions:
-        return True
 
-    return False
+def needs_minor_rev(pre, post):
+    """True if the changes between the trees need a minor revision,
+    see :func:`is_minor_change`.
+    """
+    return is_minor_change(diff_collection_trees(pre, post))
 
 
 def params_as_dict(params):
@@ -165,7 +368,7 @@ def replace_derived_from(model, derived_from_url):
         fb.write(etree.tounicode(xml).encode('utf8'))
 
 
-def replace_id_and_version(model, id, version):
+def replace_id_and_version(model, id, version, cache=None):
     """Does an inplace replacement of the given model's id and version
 
     :param model: module
@@ -174,14 +377,24 @@ def replace_id_and_version(model, id, version):
     :type id: str
     :param version: major and minor version tuple
     :type version: tuple of int
+    :param cache: a cache of the publication's parsed documents,
+                  used to lookup the already parsed document
+    :type cache: :class:`press.parsers.DocumentCache`
 
     """
     # Rewrite the content with the id and version
-    with model.file.open('rb') as fb:
-        xml = etree.parse(fb)
+    if cache is not None:
+        xml = cache.parse(model.file)
+    else:
+        with model.file.open('rb') as fb:
+            xml = etree.parse(fb)
     elm = xml.xpath('//md:content-id', namespaces=COLLECTION_NSMAP)[0]
     elm.text = id
     elm = xml.xpath('//md:version', namespaces=COLLECTION_NSMAP)[0]
     elm.text = convert_version_to_legacy_version(version)
-    with model.file.open('wb') as fb:
-        fb.write(etree.tounicode(xml).encode('utf8'))
+    if cache is not None:
+        cache.modified(model.file)
+        cache.write(model.file)
+    else:
+        with model.file.open('wb') as fb:
+            fb.write(etree.tounicode(xml).encode('utf8'))
@@ -0,0 +1,130 @@
+"""\
+Migration of this application's database tables and data
+(see :mod:`press.storage`), which is run once per deployment,
+before the application is started::
+
+    python -m press.migrate
+
+It is safe to run any number of times. Each data migration is recorded
+once it has been applied and is not applied again.
+
+"""
+import json
+from datetime import datetime
+
+import structlog
+from cnxdb.contrib.pyramid import IEngine
+from sqlalchemy.sql import select
+
+from .config import configure
+from .publishing import get_var_location
+from .storage import create_schema, migrations
+from .tracking import PublicationLog
+
+
+__all__ = (
+    'import_tracked_publications',
+    'main',
+    'migrate',
+)
+
+
+logger = structlog.get_logger('press.migrate')
+
+#: Directory (within the shared directory) of the publications
+#: tracked as one file each, which the publication log replaces
+TRACKED_PUBS_DIR = 'tracked-pubs'
+
+# The format of the tracked publication file names
+# (i.e. ``str(datetime)``), which leaves out the microseconds
+# when they are zero.
+TIMESTAMP_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S')
+
+
+def _parse_timestamp(value):
+    for format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, format)
+        except ValueError:
+            pass
+    raise ValueError("invalid timestamp '{}'".format(value))
+
+
+def _read_tracked_publication(filepath):
+    published = _parse_timestamp(filepath.stem)
+    with filepath.open('r') as fb:
+        ids = [(id, (major, minor)) for id, (major, minor) in json.load(fb)]
+    return published, ids
+
+
+def _is_applied(db_conn, name):
+    stmt = select([migrations.c.name]).where(migrations.c.name == name)
+    return db_conn.execute(stmt).first() is not None
+
+
+def import_tracked_publications(db_conn, directory):
+    """Import the publications tracked as one ``<datetime>.json`` file
+    per publication (the format the publication log replaces)
+    within the given directory into the publication log.
+
+    The files are imported in one transaction, which also records
+    that the import has been applied, so that an interrupted import
+    is redone as a whole. Files that can not be read are logged
+    and left in place, the imported files are removed.
+
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param directory: the directory containing the files
+    :type directory: :class:`pathlib.Path`
+    :return: the number of imported publications or ``None``
+             when the import had already been applied
+    :rtype: int
+
+    """
+    name = 'import-tracked-publications'
+    imported = []
+    with db_conn.begin():
+        if _is_applied(db_conn, name):
+            return None
+        log = PublicationLog(db_conn)
+        for filepath in sorted(directory.glob('*.json')):
+            try:
+                published, ids = _read_tracked_publication(filepath)
+            except (OSError, ValueError, TypeError) as exc:
+                logger.warning('skipped tracked publication file',
+                               filename=filepath.name, error=str(exc))
+                continue
+            log.append(ids, published=published)
+            imported.append(filepath)
+        db_conn.execute(migrations.insert()
+                        .values(name=name, applied=datetime.now()))
+
+    for filepath in imported:
+        filepath.unlink()
+    logger.info('imported tracked publications', count=len(imported))
+    return len(imported)
+
+
+def migrate(registry):
+    """Create the tables and apply the data migrations.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+
+    """
+    engine = registry.getUtility(IEngine, name='common')
+    create_schema(engine)
+    with engine.connect() as db_conn:
+        import_tracked_publications(
+            db_conn, get_var_location(registry) / TRACKED_PUBS_DIR)
+
+
+def main():  # pragma: no cover
+    """Command line entry point (``python -m press.migrate``)."""
+    config = configure()
+    config.commit()
+    migrate(config.registry)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
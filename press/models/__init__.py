@@ -3,9 +3,12 @@ from collections import namedtuple
 from .press_element import PressElement
 
 __all__ = (
+    'CollectionChanges',
     'CollectionMetadata',
     'ModuleMetadata',
     'PressElement',
+    'PublishedLitezip',
+    'TrackedPublication',
 )
 
 CollectionMetadata = namedtuple(
@@ -23,3 +26,19 @@ ModuleMetadata = namedtuple(
      'authors maintainers licensors '
      'keywords subjects abstract'),
 )
+
+CollectionChanges = namedtuple(
+    'CollectionChanges',
+    ('added removed moved retitled '
+     'metadata_changed version_changed'),
+)
+
+TrackedPublication = namedtuple(
+    'TrackedPublication',
+    'published ids',
+)
+
+PublishedLitezip = namedtuple(
+    'PublishedLitezip',
+    'state status_code response',
+)
@@ -1,24 +1,144 @@
+import sys
+
+
+class _ChildList(list):
+    """The list of an element's children, which resets the element's
+    (and its ancestors') indexes whenever it is changed.
+    """
+    __slots__ = ('owner',)
+
+    def __init__(self, owner, iterable=()):
+        super().__init__(iterable)
+        self.owner = owner
+
+    def _changed(self):
+        self.owner._reset_indexes()
+
+
+def _changes(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
+        return result
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'clear',
+              'sort', 'reverse'):
+    setattr(_ChildList, _name, _changes(_name))
+del _name
+
+
 class PressElement:
     """Represents a collxml element parsed from a Collection XML file.
+
+    The element's hash is computed once and cached, it is reset when
+    the ``tag``, ``text``, ``tail`` or ``attrs`` are assigned.
+    The ``attrs`` should therefore be treated as read-only.
+
+    Lookups by tag (e.g. :meth:`find` and :meth:`findall`) use an index
+    of the element's descendants by tag, built with a single walk of the
+    tree and kept until the tree is changed.
     """
+    __slots__ = (
+        '_tag', '_text', '_tail', '_attrs',
+        '_children', 'parent',
+        '_hash', '_child_index', '_tag_index',
+    )
+
     class Empty:
         def alltext():
             return ''
 
     def __init__(self, tag, attrs=None, text='', tail=''):
-        self.tag = tag  # TODO: prevent whitespace in tag name / VALIDATE tag
-        self.text = text
-        self.tail = tail
-        self.attrs = (attrs and attrs.copy()) or {}
-        self.children = []
+        # Assigned directly rather than through the properties,
+        # because many thousands of elements are created per parse.
         self.parent = None
+        self._child_index = None
+        self._tag_index = None
+        self._hash = None
+        # TODO: prevent whitespace in tag name / VALIDATE tag
+        self._tag = tag and sys.intern(tag)
+        self._text = text
+        self._tail = tail
+        self._attrs = (attrs and attrs.copy()) or {}
+        self._children = _ChildList(self)
+
+    @property
+    def tag(self):
+        return self._tag
+
+    @tag.setter
+    def tag(self, value):
+        # Tags come from a small vocabulary, so share the string objects.
+        self._tag = value and sys.intern(value)
+        self._hash = None
+        if self.parent is not None:
+            self.parent._reset_indexes()
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self._hash = None
+
+    @property
+    def tail(self):
+        return self._tail
+
+    @tail.setter
+    def tail(self, value):
+        self._tail = value
+        self._hash = None
+
+    @property
+    def attrs(self):
+        return self._attrs
+
+    @attrs.setter
+    def attrs(self, value):
+        self._attrs = value
+        self._hash = None
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = _ChildList(self, value)
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        node = self
+        while node is not None:
+            node._child_index = None
+            node._tag_index = None
+            node = node.parent
+
+    def _get_tag_index(self):
+        if self._tag_index is None:
+            index = {}
+            for elm in self.iter():
+                index.setdefault(elm.tag, []).append(elm)
+            self._tag_index = index
+        return self._tag_index
 
     """Make it hashable so that we can convert the tree to a set and then use
     set operations.
     """
     def __hash__(self):
-        module_id = self.attrs.get('document', '')
-        return hash((self.tag, self.text, self.tail, module_id))
+        if self._hash is None:
+            module_id = self._attrs.get('document', '')
+            self._hash = hash((self._tag, self._text, self._tail, module_id))
+        return self._hash
 
     def __eq__(self, other):
         return hash(self) == hash(other)
@@ -41,23 +161,30 @@ class PressElement:
         attr_str = ''.join(keyvals)
         return '<%s%s>%s</%s>' % (self.tag, attr_str, text + tail, self.tag)
 
+    def _get_child_index(self):
+        if self._child_index is None:
+            index = {}
+            for child in self.children:
+                index.setdefault(child.tag, []).append(child)
+            self._child_index = index
+        return self._child_index
+
     """Easy way to get an element's (direct, not deeply nested) child by name.
     """
     def __getitem__(self, name):
-        ch = dict()
-        tags = [c.tag for c in self.children]
-
-        for child in self.children:
-            if tags.count(name) > 1:  # more than 1 child with the same name
-                ch[child.tag] = [c for c in self.children if c.tag == name]
-            else:
-                ch[child.tag] = child
+        found = self._get_child_index().get(name)
         # FIXME: perhaps we can improve error messaging by returning
         #        something other than None
-        default = None
-        return ch.get(name, default)
+        if not found:
+            return None
+        elif len(found) > 1:  # more than 1 child with the same name
+            return list(found)
+        return found[0]
 
     def __getattr__(self, name):
+        if name.startswith('_'):
+            # e.g. a slot that has not been set yet
+            raise AttributeError(name)
         item = self.__getitem__(name)
         if item:  # see: __bool__
             return item
@@ -79,21 +206,27 @@ class PressElement:
     def iter(self, tag=None):
         if tag == '*':
             tag = None
-        if tag is None or self.tag == tag:
-            yield self
+        if tag is not None:
+            yield from tuple(self._get_tag_index().get(tag, ()))
+            return
+        yield self
 
         for child in self:
-            yield from child.iter(tag)
+            yield from child.iter()
 
     def find(self, tag=None):
         # returns the first matching element within self where tag == tag
+        if tag is None or tag == '*':
+            return self
         try:
-            return tuple(self.iter(tag))[0]
-        except IndexError:
+            return self._get_tag_index()[tag][0]
+        except KeyError:
             return self.Empty  # not found
 
     def findall(self, tag=None):
-        return tuple(self.iter(tag))
+        if tag is None or tag == '*':
+            return tuple(self.iter())
+        return tuple(self._get_tag_index().get(tag, ()))
 
     def find_by_path(self, path):
         path = path.strip('/')
@@ -2,28 +2,320 @@
 Out-of-band asynchronous task (a.k.a. Celery tasks).
 
 """
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
+import structlog
+from pyramid.threadlocal import get_current_registry
+from requests.adapters import HTTPAdapter
 
 from press.tasks import task
 
 
+__all__ = (
+    'DeadlineExceeded',
+    'dispatch_requests',
+    'get_http_concurrency',
+    'get_http_deadline',
+    'get_http_host_concurrency',
+    'get_http_session',
+    'get_http_stats',
+    'get_http_timeout',
+    'make_request',
+    'make_requests',
+)
+
+
 REQUESTS_TIMEOUT = (1, 120)  # (<connect>, <read>)
 
+#: Default number of connections kept open per host
+DEFAULT_HTTP_POOL_SIZE = 10
+
+#: Default number of requests a batch sends at the same time
+DEFAULT_HTTP_CONCURRENCY = 8
+
+#: Default number of requests a batch sends to one host at the same time
+DEFAULT_HTTP_HOST_CONCURRENCY = 4
+
+#: Default number of seconds a request in a batch may take
+DEFAULT_HTTP_DEADLINE = 180
+
+# The per-process http sessions, see ``get_http_session``
+_sessions = {}  # pid to session
+_sessions_lock = threading.Lock()
+
+logger = structlog.get_logger('press.outofband')
+
+
+def _get_settings(registry=None):
+    if registry is None:
+        registry = get_current_registry()
+    return registry.settings or {}
+
+
+def get_http_timeout(registry=None):
+    """Lookup the http connect and read timeouts for this application.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the connect and read timeouts in seconds
+    :rtype: tuple of float
+
+    """
+    settings = _get_settings(registry)
+    return (
+        float(settings.get('http.connect_timeout') or REQUESTS_TIMEOUT[0]),
+        float(settings.get('http.read_timeout') or REQUESTS_TIMEOUT[1]),
+    )
+
+
+def get_http_concurrency(registry=None):
+    """Lookup the number of requests a batch of requests
+    (see :func:`make_requests`) sends at the same time.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: int
+
+    """
+    settings = _get_settings(registry)
+    return int(settings.get('http.concurrency') or DEFAULT_HTTP_CONCURRENCY)
+
+
+def get_http_host_concurrency(registry=None):
+    """Lookup the number of requests a batch of requests
+    sends to the same host at the same time.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: int
+
+    """
+    settings = _get_settings(registry)
+    return int(settings.get('http.host_concurrency') or
+               DEFAULT_HTTP_HOST_CONCURRENCY)
+
+
+def get_http_deadline(registry=None):
+    """Lookup the number of seconds a request within a batch of requests
+    may take, which includes waiting for its turn with the host.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: float
+
+    """
+    settings = _get_settings(registry)
+    return float(settings.get('http.deadline') or DEFAULT_HTTP_DEADLINE)
+
+
+def get_http_session(registry=None):
+    """Retrieve the http session for this process. The session keeps
+    its connections alive, so that they are reused across requests
+    (and task executions) to the same host.
+
+    A new session is created in each process, because connections
+    can not be shared with the (forked) worker processes.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the session
+    :rtype: :class:`requests.Session`
+
+    """
+    pid = os.getpid()
+    try:
+        return _sessions[pid]
+    except KeyError:
+        pass
+    settings = _get_settings(registry)
+    pool_size = int(settings.get('http.pool_size') or DEFAULT_HTTP_POOL_SIZE)
+    with _sessions_lock:
+        if pid not in _sessions:
+            # Forget the sessions inherited from a parent process.
+            _sessions.clear()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[pid] = session
+        return _sessions[pid]
+
+
+def get_http_stats():
+    """Produce the connection statistics for this process' http session.
+
+    :return: the number of ``requests`` made, the number of
+             ``connections`` opened and the number of requests
+             that ``reused`` an open connection
+    :rtype: dict
+
+    """
+    stats = {'requests': 0, 'connections': 0}
+    session = _sessions.get(os.getpid())
+    adapters = session and set(session.adapters.values()) or ()
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats['requests'] += pool.num_requests
+            stats['connections'] += pool.num_connections
+    stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+    return stats
+
 
 @task(bind=True, max_retries=3, default_retry_delay=5)
 def make_request(self, url, method='GET'):
+    pyramid_request = self.get_pyramid_request()
+    registry = pyramid_request.registry
     req = requests.Request(method, url).prepare()
-    with requests.Session() as session:
+    session = get_http_session(registry)
+    try:
+        session.send(req, timeout=get_http_timeout(registry))
+    except requests.exceptions.RequestException as exc:
         try:
-            session.send(req, timeout=REQUESTS_TIMEOUT)
-        except requests.exceptions.RequestException as exc:
-            pyramid_request = self.get_pyramid_request()
+            self.retry(exc=exc)
+        except self.MaxRetriesExceededError:
+            # max_retries will stop us from doing a too many retries.
+            pyramid_request.raven_client.captureException()
+            raise
+        # XXX url?
+        msg = "problem requesting '{}'".format(url)
+        pyramid_request.log.exception(msg)
+    logger.debug('http connection stats', **get_http_stats())
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when a request did not complete within its deadline."""
+
+
+def _interleave_by_host(http_requests):
+    """Order the indexes of the requests so that consecutive requests
+    go to different hosts where possible.
+
+    """
+    by_host = OrderedDict()
+    for i, (method, url) in enumerate(http_requests):
+        by_host.setdefault(urlsplit(url).netloc, []).append(i)
+    queues = list(by_host.values())
+    order = []
+    while queues:
+        order.extend([queue.pop(0) for queue in queues])
+        queues = [queue for queue in queues if queue]
+    return by_host.keys(), order
+
+
+def dispatch_requests(http_requests, registry=None):
+    """Send the requests concurrently, ``http.concurrency`` at a time
+    and at most ``http.host_concurrency`` at a time to the same host.
+    Each request must complete within ``http.deadline`` seconds
+    of it being started, otherwise it fails
+    with :exc:`DeadlineExceeded`.
+
+    :param http_requests: sequence of method and url pairs
+    :type http_requests: sequence of tuples
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the outcome (the ``status`` code or the ``error``)
+             and the exception (if any) of each request
+    :rtype: list of tuples containing a dict and an exception or None
+
+    """
+    if not http_requests:
+        return []
+    session = get_http_session(registry)
+    connect_timeout, read_timeout = get_http_timeout(registry)
+    deadline = get_http_deadline(registry)
+    host_concurrency = get_http_host_concurrency(registry)
+    hosts, order = _interleave_by_host(http_requests)
+    host_slots = {host: threading.BoundedSemaphore(host_concurrency)
+                  for host in hosts}
+
+    def send(method, url):
+        expires = time.monotonic() + deadline
+        slot = host_slots[urlsplit(url).netloc]
+        if not slot.acquire(timeout=deadline):
+            raise DeadlineExceeded('waited {}s for the host'.format(deadline))
+        try:
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(
+                    'waited {}s for the host'.format(deadline))
+            req = requests.Request(method, url).prepare()
+            timeout = (min(connect_timeout, remaining),
+                       min(read_timeout, remaining))
             try:
-                self.retry(exc=exc)
-            except self.MaxRetriesExceededError:
-                # max_retries will stop us from doing a too many retries.
-                pyramid_request.raven_client.captureException()
+                return session.send(req, timeout=timeout)
+            except requests.exceptions.Timeout as exc:
+                # The deadline shortened the timeout
+                if remaining < max(connect_timeout, read_timeout):
+                    raise DeadlineExceeded(
+                        'no response within {}s'.format(deadline)) from exc
                 raise
-            # XXX url?
-            msg = "problem requesting '{}'".format(url)
-            pyramid_request.log.exception(msg)
+        finally:
+            slot.release()
+
+    workers = min(get_http_concurrency(registry), len(http_requests))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {i: executor.submit(send, *http_requests[i])
+                   for i in order}
+
+    results = []
+    for i, (method, url) in enumerate(http_requests):
+        outcome = {'method': method, 'url': url}
+        try:
+            resp = futures[i].result()
+        except requests.exceptions.RequestException as exc:
+            outcome['error'] = repr(exc)
+            results.append((outcome, exc))
+        else:
+            outcome['status'] = resp.status_code
+            results.append((outcome, None))
+    return results
+
+
+@task(bind=True, max_retries=3, default_retry_delay=5)
+def make_requests(self, http_requests):
+    """Make a batch of requests (see :func:`dispatch_requests`).
+    The requests that fail are retried (as a batch) by the task.
+
+    :param http_requests: sequence of method and url pairs
+    :type http_requests: sequence of tuples
+    :return: the outcome (the ``status`` code or the ``error``)
+             of each request
+    :rtype: list of dict
+
+    """
+    if not http_requests:
+        return []
+    pyramid_request = self.get_pyramid_request()
+    results = dispatch_requests(http_requests, pyramid_request.registry)
+
+    failed = []
+    for outcome, exc in results:
+        if exc is None:
+            pyramid_request.log.info(
+                "requested '{url}' ({method}): {status}".format(**outcome))
+        else:
+            failed.append((outcome['method'], outcome['url']))
+            pyramid_request.log.error(
+                "problem requesting '{url}' ({method}): {error}"
+                .format(**outcome))
+    logger.debug('http connection stats', **get_http_stats())
+
+    if failed:
+        exc = [exc for _, exc in results if exc is not None][-1]
+        try:
+            # Only retry the requests that failed.
+            self.retry(args=(failed,), exc=exc)
+        except self.MaxRetriesExceededError:
+            # max_retries will stop us from doing a too many retries.
+            pyramid_request.raven_client.captureException()
+            raise
+    return [outcome for outcome, _ in results]
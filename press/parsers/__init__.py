@@ -1,2 +1,3 @@
+from .cache import DocumentCache  # noqa: F401
 from .collection import parse_collection_metadata, parse_collxml  # noqa: F401
 from .module import parse_module_metadata  # noqa: F401
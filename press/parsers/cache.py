@@ -0,0 +1,86 @@
+from lxml import etree
+
+
+__all__ = (
+    'DocumentCache',
+)
+
+
+class DocumentCache:
+    """A cache of parsed xml documents (:mod:`lxml.etree` trees), used for
+    the duration of a publication so that each file is parsed only once.
+
+    Documents are keyed by their path and modification time; a file that
+    has changed on disk since it was parsed is parsed again. A tree that
+    is changed in memory should be marked using :meth:`modified`, after
+    which it is kept until it is serialized back to its file by
+    :meth:`write` or :meth:`flush`.
+
+    """
+
+    def __init__(self):
+        self._entries = {}  # path to (mtime, tree)
+        self._modified = set()
+
+    def __contains__(self, filepath):
+        return filepath in self._entries
+
+    def parse(self, filepath):
+        """Parse the document at the given ``filepath``
+        or retrieve the already parsed tree.
+
+        :param filepath: a filesystem path to the file
+        :type filepath: :class:`pathlib.Path`
+        :return: the parsed document
+        :rtype: :class:`lxml.etree._ElementTree`
+
+        """
+        try:
+            mtime, tree = self._entries[filepath]
+        except KeyError:
+            pass
+        else:
+            if (filepath in self._modified or
+                    mtime == filepath.stat().st_mtime_ns):
+                return tree
+        mtime = filepath.stat().st_mtime_ns
+        with filepath.open('rb') as fb:
+            tree = etree.parse(fb)
+        self._entries[filepath] = (mtime, tree)
+        return tree
+
+    def modified(self, filepath):
+        """Mark the tree of the document at ``filepath``
+        as having been changed in memory.
+
+        """
+        if filepath not in self._entries:
+            raise KeyError(filepath)
+        self._modified.add(filepath)
+
+    def write(self, filepath):
+        """Serialize the tree of the document at ``filepath`` to its file.
+
+        :param filepath: a filesystem path to the file
+        :type filepath: :class:`pathlib.Path`
+        :return: the serialized document
+        :rtype: bytes
+
+        """
+        _, tree = self._entries[filepath]
+        data = etree.tounicode(tree).encode('utf8')
+        with filepath.open('wb') as fb:
+            fb.write(data)
+        self._entries[filepath] = (filepath.stat().st_mtime_ns, tree)
+        self._modified.discard(filepath)
+        return data
+
+    def flush(self):
+        """Serialize all the trees that have been changed in memory."""
+        for filepath in sorted(self._modified):
+            self.write(filepath)
+
+    def discard(self, filepath):
+        """Forget the document at ``filepath``, without writing it."""
+        self._entries.pop(filepath, None)
+        self._modified.discard(filepath)
@@ -1,18 +1,25 @@
+from io import BytesIO
 from xml import sax
+
+from lxml import etree
+from lxml.sax import saxify
+
 from press.models import CollectionMetadata, PressElement
 from .common import make_cnx_xpath, make_elm_tree, parse_common_properties
 
 
-def parse_collection_metadata(model):
+def parse_collection_metadata(model, cache=None):
     """Parse the metadata from the given object.
 
     :param model: the object to parse
     :type model: :class:`litezip.Collection`
+    :param cache: a cache of the publication's parsed documents
+    :type cache: :class:`press.parsers.DocumentCache`
     :returns: a metadata object
     :rtype: :class:`press.models.CollectionMetadata`
 
     """
-    elm_tree = make_elm_tree(model)
+    elm_tree = make_elm_tree(model, cache)
     xpath = make_cnx_xpath(elm_tree)
 
     props = parse_common_properties(elm_tree)
@@ -27,35 +34,42 @@ def parse_collection_metadata(model):
 
 
 class CollectionXmlHandler(sax.ContentHandler):
+    """Builds a tree of :class:`press.models.PressElement` from SAX events.
+
+    The character data is buffered until the element ends, because SAX
+    may deliver it in many chunks. The ``text`` of an element is the data
+    before its first child element and the ``tail`` is the data after it.
+    """
+
     def __init__(self, root):
         self.current_node = root
-        self.next_node = None
+        # text and tail buffers of the open elements
+        self._buffers = [([], [])]
 
     def startElementNS(self, name, qname, attrs):
         uri, localname = name
 
         # TODO: we could improve this by passing in just the URI and have the
         #       model map it to a namespace.
-        self.next_node = PressElement(localname,
-                                      self._attrs_no_uri(attrs))
+        node = PressElement(localname, self._attrs_no_uri(attrs))
 
-        self.current_node.add_child(self.next_node)
-        self.current_node = self.next_node
+        self.current_node.add_child(node)
+        self.current_node = node
+        self._buffers.append(([], []))
 
     def characters(self, content):
-        # we have to create a new node so that the hash is re-calculated,
-        # see docs for __hash__ method.
-        new_node = self.current_node.insert_text(content)
-        new_node.parent = self.current_node.parent
-        new_node.children = self.current_node.children
-        # the parent needs to contain the new child element for the old one
-        self.current_node.parent.children.pop()
-        self.current_node.parent.children.append(new_node)
-        # and finally...
-        self.current_node = new_node
+        text, tail = self._buffers[-1]
+        if self.current_node.children:
+            tail.append(content)
+        else:
+            text.append(content)
 
     def endElementNS(self, name, qname):
-        self.current_node = self.current_node.parent
+        text, tail = self._buffers.pop()
+        node = self.current_node
+        node.text = ''.join(text).strip()
+        node.tail = ''.join(tail).strip()
+        self.current_node = node.parent
 
     def _attrs_no_uri(self, attrs):
         return {name: value for (uri, name), value in attrs.items()}
@@ -66,17 +80,25 @@ def parse_collxml(input_collxml):
     Given a collxml document, parses the document to a python object
     where collections and sub-collections (both branching points) contain
     subcollections and modules (leaf nodes).
+
+    The document can be given as a file-like object, as bytes (e.g. from
+    the database) or as an already parsed :mod:`lxml.etree` tree, which
+    is walked rather than parsed again.
     """
     tree_root = PressElement('root')
+    handler = CollectionXmlHandler(tree_root)
+
+    if isinstance(input_collxml, (etree._ElementTree, etree._Element)):
+        saxify(input_collxml, handler)
+        return tree_root
 
     parser = sax.make_parser()
     parser.setFeature(sax.handler.feature_namespaces, 1)
-    parser.setContentHandler(CollectionXmlHandler(tree_root))
+    parser.setContentHandler(handler)
 
     # adds the ability to parse an object that comes from the database
-    if isinstance(input_collxml, memoryview):
-        import io
-        input_collxml = io.BytesIO(input_collxml)
+    if isinstance(input_collxml, (bytes, memoryview)):
+        input_collxml = BytesIO(input_collxml)
 
     parser.parse(input_collxml)  # parses a file-like object
 
@@ -20,11 +20,17 @@ def _maybe(a_list):
         return None
 
 
-def make_elm_tree(model):
+def make_elm_tree(model, cache=None):
     """Makes an element-like object (:mod:`lxml.etree`) from a litezip model
     (:class:`litezip.Collection` or :class:`litezip.Module`).
 
+    :param cache: a cache of the publication's parsed documents,
+                  in which case the cached tree is returned
+    :type cache: :class:`press.parsers.DocumentCache`
+
     """
+    if cache is not None:
+        return cache.parse(model.file)
     with model.file.open() as fb:
         elm_tree = etree.parse(fb)
     return elm_tree
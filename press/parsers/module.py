@@ -2,13 +2,16 @@ from press.models import ModuleMetadata
 from .common import make_elm_tree, parse_common_properties
 
 
-def parse_module_metadata(model):
+def parse_module_metadata(model, cache=None):
     """Parse the metadata from the given object.
 
     :param model: the object to parse
     :type model: :class:`litezip.Module`
+    :param cache: a cache of the publication's parsed documents
+    :type cache: :class:`press.parsers.DocumentCache`
     :returns: a metadata object
     :rtype: :class:`press.models.ModuleMetadata`
 
     """
-    return ModuleMetadata(**parse_common_properties(make_elm_tree(model)))
+    elm_tree = make_elm_tree(model, cache)
+    return ModuleMetadata(**parse_common_properties(elm_tree))
@@ -1,18 +1,57 @@
+import hashlib
+import shutil
 import tempfile
 import zipfile
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
 
+from litezip import Collection, Module, Resource
+from litezip.exceptions import MissingFile
+from litezip.main import (
+    COLLECTION_FILENAME,
+    COLLECTION_NSMAP,
+    MODULE_FILENAME,
+    Magic,
+)
+from lxml import etree
 from pyramid.threadlocal import get_current_registry
 
+from .exceptions import UploadTooLarge
+from .parsers import parse_module_metadata
+from .timing import PublicationTimer
+from .utils import (
+    BUFFER_CHUNK_SIZE,
+    lookup_hashes,
+    produce_hashes_from_filepath,
+)
+
 
 __all__ = (
     'discover_content_dir',
     'expand_zip',
+    'get_publishing_workers',
+    'get_scratch_location',
+    'get_upload_limits',
     'get_var_location',
+    'ingest_zip',
+    'parse_document_version',
+    'parse_litezip',
     'persist_file_to_filesystem',
+    'preprocess_modules',
 )
 
 
+#: Name prefix of the uploaded files within the shared directory
+UPLOAD_PREFIX = 'upload-'
+
+#: Name prefix of the expanded zip directories within the shared directory
+EXPANSION_PREFIX = 'expanded-'
+
+#: Default maximum (uncompressed) size of a zip to expand
+#: in the scratch directory
+DEFAULT_SCRATCH_MAX_SIZE = 67108864  # 64MB
+
+
 def get_var_location(registry=None):
     """Lookup the var location for this application.
 
@@ -25,25 +64,129 @@ def get_var_location(registry=None):
     return Path(registry.settings['shared_directory'])
 
 
+def get_upload_limits(registry=None):
+    """Lookup the upload chunk size and maximum upload size
+    for this application.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the chunk size and maximum size (``None`` when unlimited)
+    :rtype: tuple of int
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings
+    chunk_size = int(settings.get('upload.chunk_size') or BUFFER_CHUNK_SIZE)
+    max_size = settings.get('upload.max_size')
+    max_size = max_size and int(max_size) or None
+    return chunk_size, max_size
+
+
+def get_publishing_workers(registry=None):
+    """Lookup the number of workers used to preprocess modules
+    for this application.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the number of workers (``0`` when preprocessing is serial)
+    :rtype: int
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    return int(registry.settings.get('publishing.workers') or 0)
+
+
+def get_scratch_location(registry=None):
+    """Lookup the scratch location for this application, a (preferably
+    memory backed) directory where small zips are expanded, rather than
+    in the shared directory.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :return: the scratch location (``None`` when not configured)
+             and the maximum uncompressed size of a zip to expand there
+    :rtype: tuple of :class:`pathlib.Path` and int
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings
+    location = settings.get('scratch_directory')
+    max_size = int(settings.get('scratch_directory.max_size') or
+                   DEFAULT_SCRATCH_MAX_SIZE)
+    return location and Path(location) or None, max_size
+
+
 def persist_file_to_filesystem(file):
     """Persist the given ``file`` to the filesystem within
     the shared directory space.
 
+    The file is copied in chunks of ``upload.chunk_size`` bytes,
+    so that memory usage stays constant regardless of the file's size.
+
     :param file: file to persist
     :type file: file-like object
     :return: path to written file
     :rtype: :class:`pathlib.Path`
+    :raises press.exceptions.UploadTooLarge: when the file is larger
+        than the ``upload.max_size`` setting
 
     """
     shared_directory = get_var_location()
-    _, filepath = tempfile.mkstemp(dir=str(shared_directory))
+    chunk_size, max_size = get_upload_limits()
+    fd, filepath = tempfile.mkstemp(prefix=UPLOAD_PREFIX,
+                                    dir=str(shared_directory))
     filepath = Path(filepath)
-    with filepath.open('wb') as fb:
-        fb.write(file.read())
-    file.seek(0)
+    size = 0
+    try:
+        with open(fd, 'wb') as fb:
+            while True:
+                data = file.read(chunk_size)
+                if not data:
+                    break
+                size += len(data)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLarge(max_size)
+                fb.write(data)
+    except UploadTooLarge:
+        filepath.unlink()
+        raise
+    finally:
+        file.seek(0)
     return filepath
 
 
+def _make_expansion_dir(parent=None):
+    """Make a uniquely named directory within the ``parent`` directory,
+    which defaults to the shared directory.
+
+    """
+    if parent is None:
+        parent = get_var_location()
+    _names = tempfile._get_candidate_names()
+    while True:
+        dir = parent / (EXPANSION_PREFIX + next(_names))
+        try:
+            dir.mkdir()
+        except FileExistsError:  # pragma: no cover
+            continue
+        break
+    return dir
+
+
+def _member_path(root, name):
+    """Build the filesystem path for a zip member named ``name``
+    within ``root``, discarding any absolute or parent directory parts
+    the same way :meth:`zipfile.ZipFile.extract` does.
+
+    """
+    parts = [part for part in PurePosixPath(name.replace('\\', '/')).parts
+             if part not in ('', '.', '..', '/')]
+    return root.joinpath(*parts)
+
+
 def expand_zip(file):
     """Expand a zip file into a temporary directory and return the path
     to the expanded directory location.
@@ -55,20 +198,200 @@ def expand_zip(file):
     :rtype: :class:`pathlib.Path`
 
     """
-    shared_directory = get_var_location()
-    _names = tempfile._get_candidate_names()
-    while True:
-        dir = shared_directory / next(_names)
+    expand_path, _ = ingest_zip(file)
+    return expand_path
+
+
+def ingest_zip(file):
+    """Validate, expand and hash a zip file in a single pass.
+
+    Opening the zip validates its central directory.
+    Each member is then streamed to disk while its SHA1 and MD5 are
+    computed from the same read, which also verifies the member's CRC.
+
+    The zip is expanded within the scratch directory
+    (see :func:`get_scratch_location`) when one is configured
+    and the zip's uncompressed size is within its limit,
+    otherwise it is expanded within the shared directory.
+
+    :param file: zip file to ingest
+    :type file: can be a path to a file (a string), a file-like object
+                or a path-like object
+    :return: path to the expanded zip and a manifest mapping each
+             expanded file's path to its hashes (in the form returned by
+             :func:`press.utils.produce_hashes_from_filepath`)
+    :rtype: tuple of :class:`pathlib.Path` and dict
+    :raises zipfile.BadZipFile: when the file is not a valid zip
+        or a member fails its CRC check
+
+    """
+    chunk_size, _ = get_upload_limits()
+    scratch_directory, scratch_max_size = get_scratch_location()
+    with zipfile.ZipFile(file) as z:
+        infos = z.infolist()
+        size = sum([info.file_size for info in infos])
+        if scratch_directory is not None and size <= scratch_max_size:
+            expand_path = _make_expansion_dir(scratch_directory)
+        else:
+            expand_path = _make_expansion_dir()
         try:
-            dir.mkdir()
-        except FileExistsError:  # pragma: no cover
+            manifest = _expand_members(z, infos, expand_path, chunk_size)
+        except Exception:
+            shutil.rmtree(str(expand_path))
+            raise
+    return expand_path, manifest
+
+
+def _expand_members(z, infos, expand_path, chunk_size):
+    """Expand and hash the zip's members, see :func:`ingest_zip`."""
+    manifest = {}
+    for info in infos:
+        path = _member_path(expand_path, info.filename)
+        if info.is_dir():
+            path.mkdir(parents=True, exist_ok=True)
             continue
-        break
-    expand_path = dir
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sha1 = hashlib.sha1()
+        md5 = hashlib.md5()
+        with z.open(info) as src, path.open('wb') as dest:
+            while True:
+                data = src.read(chunk_size)
+                if not data:
+                    break
+                sha1.update(data)
+                md5.update(data)
+                dest.write(data)
+        manifest[path] = {
+            'sha1': sha1.hexdigest(),
+            'md5': md5.hexdigest(),
+        }
+    return manifest
 
-    with zipfile.ZipFile(file) as z:
-        z.extractall(path=str(expand_path))
-    return expand_path
+
+def _parse_metadata_text(filepath, name):
+    """Parse the text of the ``md:<name>`` element from the given document,
+    stopping as soon as the element has been found.
+
+    """
+    if not filepath.exists():
+        raise MissingFile(filepath)
+    tag = '{{{}}}{}'.format(COLLECTION_NSMAP['md'], name)
+    for _, elm in etree.iterparse(str(filepath), tag=tag):
+        return elm.text
+    return None  # pragma: no cover
+
+
+def _parse_document_id(filepath):
+    """Parse the ``md:content-id`` from the given document."""
+    return _parse_metadata_text(filepath, 'content-id')
+
+
+def parse_document_version(filepath):
+    """Parse the ``md:version`` from the given document
+    (a module's cnxml or a collection's collxml),
+    without parsing the rest of the document.
+
+    :param filepath: the document
+    :type filepath: :class:`pathlib.Path`
+    :return: the version
+    :rtype: str
+
+    """
+    return _parse_metadata_text(filepath, 'version')
+
+
+def _parse_resources(directory, excludes, manifest):
+    magic_wand = Magic(mime=True)
+    resources = []
+    for path in sorted(directory.glob('*')):
+        if any(exclude(path) for exclude in excludes):
+            continue
+        try:
+            sha1 = manifest[path]['sha1']
+        except KeyError:
+            sha1 = produce_hashes_from_filepath(path)['sha1']
+        media_type = magic_wand.from_file(str(path))
+        resources.append(Resource(path, path.name, media_type, sha1))
+    return tuple(resources)
+
+
+def parse_litezip(path, manifest=None):
+    """Parse a litezip directory to a data structure, as
+    :func:`litezip.parse_litezip` would, but reuse the resource hashes
+    in the given ``manifest`` rather than reading every file again.
+
+    :param path: the litezip contents directory
+    :type path: :class:`pathlib.Path`
+    :param manifest: file hashes as produced by :func:`ingest_zip`
+    :type manifest: dict
+    :return: the litezip struct
+    :rtype: tuple of :class:`litezip.Collection` and :class:`litezip.Module`
+
+    """
+    manifest = manifest or {}
+    file = path / COLLECTION_FILENAME
+    excludes = [
+        lambda filepath: filepath.name == COLLECTION_FILENAME,
+        lambda filepath: filepath.is_dir(),
+    ]
+    struct = [Collection(_parse_document_id(file), file,
+                         _parse_resources(path, excludes, manifest))]
+
+    excludes = [lambda filepath: filepath.name == MODULE_FILENAME]
+    for dir in path.iterdir():
+        if not dir.is_dir() or not dir.name.startswith('m'):
+            continue
+        file = dir / MODULE_FILENAME
+        struct.append(Module(_parse_document_id(file), file,
+                             _parse_resources(dir, excludes, manifest)))
+    return tuple(sorted(struct))
+
+
+def _preprocess_module(module, manifest, cache, timer):
+    with timer.item(module.id):
+        return (module,
+                parse_module_metadata(module, cache),
+                lookup_hashes(module.file, manifest))
+
+
+def preprocess_modules(modules, manifest=None, workers=None, cache=None,
+                       timer=None):
+    """Parse the metadata and produce the content hashes
+    for the given ``modules``, prior to publishing them.
+
+    This work does not touch the database, so when ``workers``
+    is greater than zero the modules are processed in a pool
+    of that many threads. Otherwise they are processed serially.
+
+    :param modules: the modules to process
+    :type modules: sequence of :class:`litezip.Module`
+    :param manifest: file hashes as produced by :func:`ingest_zip`
+    :type manifest: dict
+    :param workers: the number of workers, defaults to
+                    the ``publishing.workers`` setting
+    :type workers: int
+    :param cache: a cache of the publication's parsed documents
+    :type cache: :class:`press.parsers.DocumentCache`
+    :param timer: the publication's timer, which times each module
+    :type timer: :class:`press.timing.PublicationTimer`
+    :return: the module, its metadata and its content hashes
+             for each of the modules, in the given order
+    :rtype: list of :class:`litezip.Module`,
+            :class:`press.models.ModuleMetadata` and dict triples
+
+    """
+    if workers is None:
+        workers = get_publishing_workers()
+    if timer is None:
+        timer = PublicationTimer()  # i.e. the modules are not timed
+    modules = list(modules)
+    if workers <= 0 or len(modules) <= 1:
+        return [_preprocess_module(module, manifest, cache, timer)
+                for module in modules]
+    with ThreadPoolExecutor(max_workers=min(workers, len(modules))) as pool:
+        return list(pool.map(
+            lambda x: _preprocess_module(x, manifest, cache, timer),
+            modules))
 
 
 def discover_content_dir(dir):
@@ -0,0 +1,123 @@
+"""\
+The database tables of this application, as opposed to those of cnx-db,
+which hold what this application keeps track of about its publications
+(see :mod:`press.tracking` and :mod:`press.fingerprints`)
+and the legacy requests waiting to be sent (see :mod:`press.coalesce`).
+
+The tables are created once, by the migration command
+(see :mod:`press.migrate`), rather than when the application starts.
+
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    JSON,
+    MetaData,
+    Table,
+    Text,
+)
+
+
+__all__ = (
+    'create_schema',
+    'expire_rows',
+    'fingerprints',
+    'metadata',
+    'migrations',
+    'pending_requests',
+    'publication_items',
+    'publications',
+)
+
+
+metadata = MetaData()
+
+#: The publications made by this application
+publications = Table(
+    'press_publications', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('published', DateTime, nullable=False, index=True),
+)
+
+#: The content (in submission order) of each publication
+publication_items = Table(
+    'press_publication_items', metadata,
+    Column('publication_id', Integer,
+           ForeignKey('press_publications.id', ondelete='CASCADE'),
+           nullable=False, index=True),
+    Column('position', Integer, nullable=False),
+    Column('module_id', Text, nullable=False),
+    Column('major_version', Integer),
+    Column('minor_version', Integer),
+    Index('press_publication_items_module_id_idx',
+          'module_id', 'publication_id'),
+)
+
+#: The fingerprints of the published litezips, each with the published
+#: state of its content and the response to its publication
+fingerprints = Table(
+    'press_fingerprints', metadata,
+    Column('fingerprint', Text, primary_key=True),
+    Column('state', JSON, nullable=False),
+    Column('status_code', Integer, nullable=False),
+    Column('response', JSON(none_as_null=True)),
+    Column('recorded', DateTime, nullable=False, index=True),
+)
+
+#: The content whose legacy requests are waiting to be sent,
+#: by the url of the application that published it
+pending_requests = Table(
+    'press_pending_requests', metadata,
+    Column('application_url', Text, primary_key=True),
+    Column('module_id', Text, primary_key=True),
+    Column('major_version', Integer),
+    Column('minor_version', Integer),
+    Column('queued', DateTime, nullable=False),
+)
+
+#: The data migrations that have been applied (see :mod:`press.migrate`)
+migrations = Table(
+    'press_migrations', metadata,
+    Column('name', Text, primary_key=True),
+    Column('applied', DateTime, nullable=False),
+)
+
+
+def create_schema(engine):
+    """Create the tables that do not already exist.
+
+    :param engine: the database engine
+    :type engine: :class:`sqlalchemy.engine.Engine`
+
+    """
+    metadata.create_all(engine)
+
+
+def expire_rows(db_conn, column, max_age, now=None):
+    """Remove the rows of the column's table that are older than
+    the given age, according to the given timestamp column.
+
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+    :param column: the timestamp column of the table
+    :type column: :class:`sqlalchemy.schema.Column`
+    :param max_age: the age in seconds
+    :type max_age: float
+    :param now: the current time (defaults to now)
+    :type now: :class:`datetime.datetime`
+    :return: the number of removed rows
+    :rtype: int
+
+    """
+    if now is None:
+        now = datetime.now()
+    table = column.table
+    result = db_conn.execute(
+        table.delete()
+        .where(column < now - timedelta(seconds=max_age)))
+    return result.rowcount
@@ -1,14 +1,10 @@
-from pyramid import events as pyramid_events
-
 from press import events
 
 from .legacy_enqueue import legacy_enqueue as _legacy_enqueue
 from .legacy_update_latest import legacy_update_latest as _legacy_update_latest
 from .purge_cache import purge_cache as _purge_cache
-from .track_pubs import (
-    create_tracked_pubs_location,
-    track_publications_to_filesystem,
-)
+from .send_requests import send_http_requests as _send_http_requests
+from .track_pubs import track_publications as _track_publications
 
 
 def includeme(config):
@@ -21,14 +17,16 @@ def includeme(config):
         events.LegacyPublicationFinished,
     )
     config.add_subscriber(
-        create_tracked_pubs_location,
-        pyramid_events.ApplicationCreated,
+        _track_publications,
+        events.LegacyPublicationFinished,
     )
     config.add_subscriber(
-        track_publications_to_filesystem,
+        _purge_cache,
         events.LegacyPublicationFinished,
     )
+    # Sends the requests collected by the subscribers above,
+    # so it must be the last LegacyPublicationFinished subscriber.
     config.add_subscriber(
-        _purge_cache,
+        _send_http_requests,
         events.LegacyPublicationFinished,
     )
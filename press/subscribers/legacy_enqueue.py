@@ -1,4 +1,3 @@
-from press.outofband import make_request
 from press.utils import convert_to_legacy_domain
 
 
@@ -14,10 +13,6 @@ URL_TMPLT = (
 def legacy_enqueue(event):
     logger = event.request.log
 
-    # Get the celery task object
-    task_path = '.'.join([make_request.__module__, make_request.__name__])
-    _make_request = event.request.registry.celery_app.tasks[task_path]
-
     # Build the enqueue RPC url
     domain = convert_to_legacy_domain(event.request.domain)
     scheme = event.request.scheme
@@ -30,7 +25,7 @@ def legacy_enqueue(event):
             module_id=id,
             version=version,
         )
-        _make_request.delay(url)
+        event.http_requests.append(('GET', url))
         logger.info(
             "asynchronously enqueued '{}' within the legacy system".format(id)
         )
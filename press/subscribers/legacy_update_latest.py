@@ -1,4 +1,3 @@
-from press.outofband import make_request
 from press.utils import convert_to_legacy_domain
 
 
@@ -15,10 +14,6 @@ def legacy_update_latest(event):
     scheme = event.request.scheme
     base_url = '{}://{}'.format(scheme, domain)
 
-    # Get the celery task object
-    task_path = '.'.join([make_request.__module__, make_request.__name__])
-    _make_request = event.request.registry.celery_app.tasks[task_path]
-
     ids = sorted(event.ids)
     for id, _ in ids:
         logger.info(
@@ -29,4 +24,4 @@ def legacy_update_latest(event):
             base_url=base_url,
             module_id=id,
         )
-        _make_request.delay(url)
+        event.http_requests.append(('GET', url))
@@ -1,9 +1,26 @@
-from press.outofband import make_request
+from collections import OrderedDict
+
+from pyramid.settings import asbool
+
 from press.utils import convert_to_legacy_domain
 
 
-# Range of the sequence of ids to put into a purge url
-ID_CHUNK_SIZE = 10
+#: Default maximum length of a purge url, which bounds the size of its regex
+DEFAULT_PURGE_MAX_URL_LENGTH = 2048
+
+# The purge url, see ``_gen_purge_url``
+URL_TMPLT = '{base_url}/content/({regex_ids})/latest.*$'
+
+
+def get_purge_max_url_length(registry):
+    settings = registry.settings or {}
+    return int(settings.get('purge.max_url_length') or
+               DEFAULT_PURGE_MAX_URL_LENGTH)
+
+
+def get_purge_collapse_ids(registry):
+    settings = registry.settings or {}
+    return asbool(settings.get('purge.collapse_ids', True))
 
 
 def _gen_purge_url(base, ids):
@@ -11,18 +28,63 @@ def _gen_purge_url(base, ids):
     (e.g. col11629, m45111), generate a purge url.
 
     """
-    regex_ids = '({})'.format('|'.join(ids))
-    return '{}/content/{}/latest.*$'.format(base, regex_ids)
+    return URL_TMPLT.format(base_url=base, regex_ids='|'.join(ids))
+
+
+def _collapse_ids(ids):
+    """Collapse the ids that differ only by their last digit
+    into one pattern (e.g. m45110, m45111 and m45113 into ``m4511[013]``,
+    or ``m4511[0-9]`` when all ten are present).
+
+    :return: the patterns, each with the ids it matches
+    :rtype: sequence of tuples containing a str and a list of str
+
+    """
+    groups = OrderedDict()
+    for id in ids:
+        if id[-1:].isdigit():
+            key = (id[:-1], True)
+        else:
+            key = (id, False)
+        groups.setdefault(key, []).append(id)
+
+    for (prefix, collapsible), members in groups.items():
+        if not collapsible or len(members) == 1:
+            yield members[0], members
+            continue
+        digits = sorted([id[-1] for id in members])
+        digits = len(digits) == 10 and '0-9' or ''.join(digits)
+        yield '{}[{}]'.format(prefix, digits), members
+
+
+def _chunk_patterns(base, patterns, max_length):
+    """Group the patterns into chunks that each fit in a purge url
+    of at most ``max_length`` characters. A pattern that doesn't fit
+    on its own is put in a chunk of its own.
+
+    """
+    empty_length = len(_gen_purge_url(base, []))
+    chunk, ids, length = [], [], empty_length
+    for pattern, members in patterns:
+        # The pattern and its separator
+        pattern_length = len(pattern) + (chunk and 1 or 0)
+        if chunk and length + pattern_length > max_length:
+            yield chunk, ids
+            chunk, ids, length = [], [], empty_length
+            pattern_length = len(pattern)
+        chunk.append(pattern)
+        ids.extend(members)
+        length += pattern_length
+    if chunk:
+        yield chunk, ids
 
 
 # subscriber for press.events.LegacyPublicationFinished
 def purge_cache(event):
     logger = event.request.log
-    just_ids = list(map(lambda x: x[0], event.ids))
-
-    # Get the celery task object
-    task_path = '.'.join([make_request.__module__, make_request.__name__])
-    _make_request = event.request.registry.celery_app.tasks[task_path]
+    registry = event.request.registry
+    # Unique ids, in the order given
+    just_ids = list(OrderedDict.fromkeys([x[0] for x in event.ids]))
 
     # Build the legacy domain from the current request domain.
     domain = convert_to_legacy_domain(event.request.domain)
@@ -30,12 +92,15 @@ def purge_cache(event):
     scheme = event.request.scheme
     base_url = '{}://{}'.format(scheme, domain)
 
-    start = 0
-    range_stop = len(just_ids) + ID_CHUNK_SIZE
-    for end in range(ID_CHUNK_SIZE, range_stop, ID_CHUNK_SIZE):
-        ids = just_ids[start:end]
-        url = _gen_purge_url(base_url, ids)
-        _make_request.delay(url, method='PURGE_REGEXP')
+    if get_purge_collapse_ids(registry):
+        patterns = _collapse_ids(just_ids)
+    else:
+        patterns = [(id, [id]) for id in just_ids]
+
+    max_length = get_purge_max_url_length(registry)
+    for chunk, ids in _chunk_patterns(base_url, patterns, max_length):
+        url = _gen_purge_url(base_url, chunk)
+        event.http_requests.append(('PURGE_REGEXP', url))
 
         logger.debug("purge url:  {}".format(url))
         logger.info(
@@ -43,5 +108,3 @@ def purge_cache(event):
             "on the legacy domain"
             .format(', '.join(ids))
         )
-        # Set up for the next iterative chunk of data
-        start = end
@@ -0,0 +1,123 @@
+from pyramid.request import Request
+from pyramid.scripting import prepare
+
+from press.coalesce import PendingRequests, get_coalesce_window
+from press.events import LegacyPublicationFinished
+from press.outofband import make_requests
+from press.tasks import task
+
+from .legacy_enqueue import legacy_enqueue
+from .legacy_update_latest import legacy_update_latest
+from .purge_cache import purge_cache
+
+
+# The subscribers that build the requests for the published content,
+# in the order they are registered (see ``press.subscribers.includeme``).
+REQUEST_SUBSCRIBERS = (legacy_update_latest, legacy_enqueue, purge_cache)
+
+
+def _get_task(registry, func):
+    task_path = '.'.join([func.__module__, func.__name__])
+    return registry.celery_app.tasks[task_path]
+
+
+# subscriber for press.events.LegacyPublicationFinished
+def send_http_requests(event):
+    """Send the requests collected by the other subscribers
+    as one batch task. This subscriber must be registered last.
+
+    When coalescing (see :mod:`press.coalesce`), the published content
+    is instead added to the content waiting for its requests,
+    which are built and sent once the coalescing window has closed
+    (see :func:`send_pending_requests`).
+
+    """
+    logger = event.request.log
+    registry = event.request.registry
+    http_requests = list(event.http_requests)
+    if not http_requests:
+        return
+
+    window = get_coalesce_window(registry)
+    if window:
+        try:
+            _add_pending_requests(event, window)
+        except Exception:
+            # The publication has already been committed,
+            # so its requests are sent without coalescing.
+            logger.exception('failed to coalesce the requests')
+        else:
+            return
+
+    _make_requests = _get_task(registry, make_requests)
+    _make_requests.delay(http_requests)
+    logger.info(
+        "asynchronously sent {} requests to the legacy system"
+        .format(len(http_requests))
+    )
+
+
+def _add_pending_requests(event, window):
+    request = event.request
+    db_conn = request.db_conn
+    with db_conn.begin():
+        added = PendingRequests(db_conn).add(request.application_url,
+                                             event.ids)
+    coalesced = len(set(id for id, _ in event.ids)) - len(added)
+    if coalesced:
+        request.log.info(
+            "coalesced {} ids with the pending requests".format(coalesced))
+    if added:
+        # The pending requests are sent once the window has closed,
+        # including those of the content added since.
+        _send_pending_requests = _get_task(request.registry,
+                                           send_pending_requests)
+        _send_pending_requests.apply_async((request.application_url,),
+                                           countdown=window)
+        request.log.info(
+            "requests for {} ids to be sent to the legacy system "
+            "in {} seconds".format(len(added), window))
+
+
+@task(bind=True)
+def send_pending_requests(self, application_url):
+    """Send the requests of the content waiting for them
+    (see :class:`press.coalesce.PendingRequests`) as one batch
+    (see :func:`press.outofband.make_requests`).
+
+    :param application_url: the url of the application
+                            that published the content
+    :type application_url: str
+    :return: the number of requests
+    :rtype: int
+
+    """
+    registry = self.registry
+    # The requests are made for the host the content was published to.
+    request = Request.blank('/', base_url=application_url)
+    env = prepare(request=request, registry=registry)
+    request = env['request']
+    try:
+        db_conn = request.db_conn
+        with db_conn.begin():
+            ids = PendingRequests(db_conn).claim(application_url)
+        if not ids:
+            # e.g. sent along with the content of an earlier window
+            return 0
+
+        event = LegacyPublicationFinished(ids, request)
+        for subscriber in REQUEST_SUBSCRIBERS:
+            subscriber(event)
+
+        _make_requests = _get_task(registry, make_requests)
+        _make_requests.delay(event.http_requests)
+        request.log.info(
+            "asynchronously sent {} requests for {} pending ids "
+            "to the legacy system"
+            .format(len(event.http_requests), len(ids))
+        )
+        return len(event.http_requests)
+    finally:
+        # Release the request's resources (e.g. its database connection)
+        request._process_finished_callbacks()
+        env['closer']()
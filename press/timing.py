@@ -0,0 +1,125 @@
+"""\
+Timing of the phases of a publication.
+
+Each request has a :class:`PublicationTimer` (``request.timer``),
+which the publication code uses to time its phases
+(e.g. ``with request.timer.phase('expanding'): ...``).
+The timings are logged as one summary record per publication
+(see :func:`press.legacy_publishing.publish_upload`).
+
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pyramid.settings import asbool
+from pyramid.threadlocal import get_current_registry
+
+
+__all__ = (
+    'PublicationTimer',
+    'get_module_timings',
+)
+
+
+def get_module_timings(registry=None):
+    """Lookup whether the time taken by each module
+    of a publication is timed.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: bool
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    return asbool(settings.get('publishing.module_timings', False))
+
+
+class PublicationTimer:
+    """Accumulates the time spent in each phase of a publication
+    and, optionally, the time spent on each of its items (i.e. modules).
+
+    Phases may be nested (e.g. ``publishing.modules`` within
+    ``publishing``), in which case the time is counted in both.
+    A phase that is entered more than once accumulates its times.
+
+    :param items: whether the items are timed
+    :type items: bool
+    :param clock: the clock used to measure time
+    :type clock: callable returning seconds
+
+    """
+
+    def __init__(self, items=False, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = OrderedDict()
+        self.items = None
+        if items:
+            self.items = OrderedDict()
+        self._started = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time the phase named ``name``."""
+        start = self.clock()
+        if self._started is None:
+            self._started = start
+        # Registered on entry, so that phases are in the order started.
+        self.phases.setdefault(name, 0)
+        try:
+            yield
+        finally:
+            self.phases[name] += self.clock() - start
+
+    @contextmanager
+    def item(self, name):
+        """Time the item named ``name``, when items are timed.
+        This is safe to use from several threads at once.
+
+        """
+        if self.items is None:
+            yield
+            return
+        start = self.clock()
+        try:
+            yield
+        finally:
+            # Item names are unique, so this needs no lock.
+            self.items[name] = self.clock() - start
+
+    def summary(self):
+        """Summarize the timings in seconds, rounded to the millisecond.
+
+        :return: the ``total`` time since the first phase started,
+                 the time of each of the ``phases`` and, when items
+                 are timed, the time of each of the ``items``
+                 (slowest first)
+        :rtype: dict
+
+        """
+        total = 0
+        if self._started is not None:
+            total = self.clock() - self._started
+        summary = {
+            'total': round(total, 3),
+            'phases': {name: round(seconds, 3)
+                       for name, seconds in self.phases.items()},
+        }
+        if self.items is not None:
+            items = sorted(self.items.items(), key=lambda x: x[1],
+                           reverse=True)
+            summary['items'] = {name: round(seconds, 3)
+                                for name, seconds in items}
+        return summary
+
+
+def _create_timer(request):
+    """Request attribute factory to give access to the publication timer."""
+    return PublicationTimer(items=get_module_timings(request.registry))
+
+
+def includeme(config):
+    """Add the publication timer to every request."""
+    config.add_request_method(_create_timer, name='timer', reify=True)
@@ -0,0 +1,168 @@
+"""\
+Tracking of the publications made by this application.
+
+Each publication is appended to a log in the database
+(see :mod:`press.storage`), which is indexed by module id and by time,
+so that the publications that touched a module can be looked up
+without scanning every publication.
+
+The log is kept indefinitely, unless ``publication_log.max_age`` is set,
+in which case older publications are periodically removed from it.
+
+"""
+from datetime import datetime
+
+from pyramid.threadlocal import get_current_registry
+from sqlalchemy.sql import select
+
+from .housekeeping import get_sweep_interval
+from .models import TrackedPublication
+from .storage import expire_rows, publication_items, publications
+from .tasks import task
+
+
+__all__ = (
+    'PublicationLog',
+    'expire_publication_log',
+    'get_publication_log_max_age',
+)
+
+
+def get_publication_log_max_age(registry=None):
+    """Lookup the number of seconds the publications are kept in the log,
+    where ``0`` means they are kept indefinitely.
+
+    :param registry: the application registry
+    :type registry: :class:`pyramid.registry.Registry`
+    :rtype: float
+
+    """
+    if registry is None:
+        registry = get_current_registry()
+    settings = registry.settings or {}
+    return float(settings.get('publication_log.max_age') or 0)
+
+
+class PublicationLog:
+    """An append-only log of publications, stored in the database.
+    The caller is responsible for the transaction.
+
+    :param db_conn: a database connection object
+    :type db_conn: :class:`sqlalchemy.engine.Connection`
+
+    """
+
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+
+    def append(self, ids, published=None):
+        """Append a publication to the log.
+
+        :param ids: a pairing of moduleid and major & minor version
+        :type ids: sequence of tuples containing the module and a sequence
+                   of the major and minor version
+        :param published: when the publication was made (defaults to now)
+        :type published: :class:`datetime.datetime`
+
+        """
+        if published is None:
+            published = datetime.now()
+        result = self.db_conn.execute(
+            publications.insert().values(published=published))
+        publication_id, = result.inserted_primary_key
+        items = [
+            {'publication_id': publication_id,
+             'position': position,
+             'module_id': id,
+             'major_version': version[0],
+             'minor_version': version[1]}
+            for position, (id, version) in enumerate(ids)
+        ]
+        if items:
+            self.db_conn.execute(publication_items.insert(), items)
+
+    def find(self, module_id=None, since=None, until=None):
+        """Find the publications, optionally only those that touched
+        the given module and those made within the given time range.
+
+        :param module_id: the module's id (e.g. m12345 or col11629)
+        :type module_id: str
+        :param since: the earliest time of the publications (inclusive)
+        :type since: :class:`datetime.datetime`
+        :param until: the latest time of the publications (exclusive)
+        :type until: :class:`datetime.datetime`
+        :return: the publications in the order they were made
+        :rtype: list of :class:`press.models.TrackedPublication`
+
+        """
+        p, i = publications.c, publication_items.c
+        stmt = (
+            select([p.id, p.published, i.module_id,
+                    i.major_version, i.minor_version])
+            .select_from(publications.join(
+                publication_items, i.publication_id == p.id))
+            .order_by(p.published, p.id, i.position)
+        )
+        if module_id is not None:
+            stmt = stmt.where(p.id.in_(
+                select([i.publication_id]).where(i.module_id == module_id)))
+        if since is not None:
+            stmt = stmt.where(p.published >= since)
+        if until is not None:
+            stmt = stmt.where(p.published < until)
+
+        result = []
+        last_id = None
+        for id, published, module_id, major, minor in \
+                self.db_conn.execute(stmt):
+            if id != last_id:
+                last_id = id
+                result.append(TrackedPublication(published, []))
+            result[-1].ids.append((module_id, (major, minor)))
+        return result
+
+    def expire(self, max_age, now=None):
+        """Remove the publications older than the given age.
+
+        :param max_age: the age in seconds
+        :type max_age: float
+        :param now: the current time (defaults to now)
+        :type now: :class:`datetime.datetime`
+        :return: the number of removed publications
+        :rtype: int
+
+        """
+        # The publications' items are removed by the foreign key's cascade.
+        return expire_rows(self.db_conn, publications.c.published,
+                           max_age, now=now)
+
+
+@task(bind=True)
+def expire_publication_log(self):
+    """Periodically remove the publications older than
+    ``publication_log.max_age`` from the log
+    (see :meth:`PublicationLog.expire`).
+
+    """
+    max_age = get_publication_log_max_age(self.registry)
+    pyramid_request = self.get_pyramid_request()
+    db_conn = pyramid_request.db_conn
+    with db_conn.begin():
+        return PublicationLog(db_conn).expire(max_age)
+
+
+def includeme(config):
+    """Schedule the periodic expiry of the publication log
+    with Celery beat, when the publications are not kept indefinitely.
+
+    """
+    if not get_publication_log_max_age(config.registry):
+        return
+    task_path = '.'.join([expire_publication_log.__module__,
+                          expire_publication_log.__name__])
+    config.registry.celery_app.conf.beat_schedule.update({
+        'expire-publication-log': {
+            'task': task_path,
+            'schedule': get_sweep_interval(config.registry),
+        },
+    })
@@ -5,6 +5,7 @@ __all__ = (
     'convert_to_legacy_domain',
     'convert_version_tuple_to_version_string',
     'convert_version_to_legacy_version',
+    'lookup_hashes',
     'produce_hashes_from_filepath',
 )
 
@@ -58,3 +59,20 @@ def produce_hashes_from_filepath(filepath):
         'sha1': sha1.hexdigest(),
         'md5': md5.hexdigest(),
     }
+
+
+def lookup_hashes(filepath, manifest=None):
+    """Lookup the SHA1 and MD5 for a file in the given ``manifest``
+    (see :func:`press.publishing.ingest_zip`), falling back to producing
+    the hashes from the file when it is not in the manifest.
+
+    :param filepath: a filesystem path to the file
+    :type filepath: :class:`pathlib.Path`
+    :param manifest: mapping of filepath to hashes
+    :type manifest: dict
+
+    """
+    try:
+        return manifest[filepath]
+    except (KeyError, TypeError):
+        return produce_hashes_from_filepath(filepath)
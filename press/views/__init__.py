@@ -11,6 +11,7 @@ def includeme(config):
     add_route('api-ping', '/api/ping')
     add_route('auth-ping', '/api/auth-ping')
     add_route('publish-ping', '/api/publish-ping')
+    add_route('api-status', '/api/status')
 
     add_route('api.v1.versioned_content', '/content/{id}/{ver}')
 
@@ -18,6 +19,8 @@ def includeme(config):
     add_route('api.v2.resources', '/resources/{hash}')
 
     add_route('api.v3.publications', '/api/publish-litezip')
+    add_route('api.v3.publication_job', '/api/publish-litezip/jobs/{job_id}')
+    add_route('api.v3.publication_log', '/api/publication-log/{module_id}')
 
     s = config.registry.settings
     s['pyramid_swagger.exclude_paths'] = [
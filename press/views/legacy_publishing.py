@@ -1,21 +1,34 @@
 import logging
 import zipfile
+from datetime import datetime
 
-from litezip import parse_litezip, validate_litezip
 from pyramid.view import view_config
 
-from .. import events
-from ..exceptions import StaleVersion, Unchanged
-from ..legacy_publishing import publish_litezip
+from ..exceptions import UploadTooLarge
+from ..housekeeping import release_workspace
+from ..jobs import FAILED, FINISHED, get_job_store, run_publication_job
+from ..legacy_publishing import publish_upload
 from ..publishing import (
-    discover_content_dir,
-    expand_zip,
+    get_upload_limits,
     persist_file_to_filesystem,
 )
-from ..utils import (
-    convert_version_tuple_to_version_string,
-    convert_version_to_legacy_version
-)
+
+
+def _upload_too_large_response(max_size):
+    return {'messages': [
+        {'id': 4,
+         'message': 'upload too large',
+         'error': 'the uploaded file exceeds'
+                  ' the maximum size of {} bytes'.format(max_size),
+         },
+    ]}
+
+
+def _invalid_zip_response():
+    return {'messages': [
+        {'id': 1,
+         'message': 'The given file is not a valid zip formatted file.'},
+    ]}
 
 
 @view_config(route_name='api.v3.publications', request_method=['POST'],
@@ -29,81 +42,103 @@ def publish(request):
     publisher = request.swagger_data['publisher']
     message = request.swagger_data['message']
 
-    # TODO Check upload size... HTTP 413
+    # Check the upload size, first by what the client claims to be sending.
+    _, max_size = get_upload_limits(request.registry)
+    if max_size is not None and (request.content_length or 0) > max_size:
+        request.response.status = 413
+        return _upload_too_large_response(max_size)
 
-    # Check if it's a valid zipfile.
-    if not zipfile._check_zipfile(uploaded_file):
+    # Check that it's a valid zipfile, before persisting it.
+    # (Its members are checked while it is expanded.)
+    if not zipfile.is_zipfile(uploaded_file):
         request.response.status = 400
-        return {'messages': [
-            {'id': 1,
-             'message': 'The given file is not a valid zip formatted file.'},
-        ]}
+        return _invalid_zip_response()
     # Reset the file to the start.
     uploaded_file.seek(0)
 
-    upload_filepath = persist_file_to_filesystem(uploaded_file)
+    try:
+        upload_filepath = persist_file_to_filesystem(uploaded_file)
+    except UploadTooLarge as err:
+        request.response.status = 413
+        return _upload_too_large_response(err.max_size)
     logging.debug('write upload to: {}'.format(upload_filepath))
-    litezip_dir = expand_zip(upload_filepath)
-    litezip_dir = discover_content_dir(litezip_dir)
 
-    # Parse the litezip to a data type structure.
-    litezip_struct = parse_litezip(litezip_dir)
+    if _prefers_async(request):
+        return _queue_publication_job(request, upload_filepath,
+                                      publisher, message)
 
-    # Validate the litezip content
-    validation_msgs = validate_litezip(litezip_struct)
-    if validation_msgs:  # if it's not an empty list of messages
-        request.response.status = 400
-        return {'messages': [
-            {'id': 2,
-             'message': 'validation issue',
-             'item': str(path.relative_to(litezip_dir)),
-             'error': message,
-             }
-            for path, message in validation_msgs
-        ]}
+    # Release the uploaded and expanded files once the request is done.
+    workspace = [upload_filepath]
+    request.add_finished_callback(
+        lambda request: release_workspace(workspace, request.registry))
+
+    status_code, body = publish_upload(request, upload_filepath,
+                                       (publisher, message), workspace)
+    request.response.status = status_code
+    return body
+
+
+def _prefers_async(request):
+    """Check if the client prefers an asynchronous response
+    (i.e. ``Prefer: respond-async``, see RFC 7240).
 
-    start_event = events.LegacyPublicationStarted(
-        litezip_struct,
-        request,
+    """
+    preferences = request.headers.get('Prefer', '')
+    return 'respond-async' in [x.strip().lower()
+                               for x in preferences.split(',')]
+
+
+def _job_info(request, job):
+    info = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'phase': job['phase'],
+        'created': _format_time(job['created']),
+        'updated': _format_time(job['updated']),
+        'url': request.route_url('api.v3.publication_job', job_id=job['id']),
+    }
+    if job['status'] in (FINISHED, FAILED):
+        info['status_code'] = job['status_code']
+        info['result'] = job['result']
+    return info
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def _queue_publication_job(request, upload_filepath, publisher, message):
+    job = get_job_store(request.registry).create(
+        upload=str(upload_filepath),
+        publisher=publisher,
+        message=message,
+        application_url=request.application_url,
     )
-    request.registry.notify(start_event)
 
-    try:
-        with request.get_db_engine('common').begin() as db_conn:
-            id_mapping = publish_litezip(litezip_struct, (publisher, message),
-                                         db_conn)
-    except StaleVersion as err:
-        request.response.status = 400
+    # Get the celery task object
+    task_path = '.'.join([run_publication_job.__module__,
+                          run_publication_job.__name__])
+    _run_publication_job = request.registry.celery_app.tasks[task_path]
+    _run_publication_job.delay(job['id'])
+    request.log.info("queued publication job '{}'".format(job['id']))
+
+    request.response.status = 202
+    request.response.location = request.route_url(
+        'api.v3.publication_job', job_id=job['id'])
+    return _job_info(request, job)
+
+
+@view_config(route_name='api.v3.publication_job', request_method=['GET'],
+             renderer='json', http_cache=0, permission='publish')
+def publication_job(request):
+    job_id = request.matchdict['job_id']
+    job = get_job_store(request.registry).get(job_id)
+    if job is None:
+        request.response.status = 404
         return {'messages': [
-            {'id': 3,
-             'message': 'stale version',
-             'item': err.item.id,
-             'error': 'checked out version is {co}'
-                      ' but currently published'
-                      ' is {cv}'.format(co=err.checked_out_version,
-                                        cv=err.current_version),
-             }
+            {'id': 6,
+             'message': 'publication job not found',
+             'item': job_id,
+             },
         ]}
-    except Unchanged:
-        request.response.status = 202  # maybe?  # TODO: change neb as well.
-        return None
-
-    finish_event = events.LegacyPublicationFinished(
-        id_mapping.values(),
-        request,
-    )
-    request.registry.notify(finish_event)
-
-    resp_data = []
-    for src_id, (id, ver) in id_mapping.items():
-        version_string = convert_version_tuple_to_version_string(ver)
-        legacy_version = convert_version_to_legacy_version(ver)
-        resp_data.append({
-            'source_id': src_id,
-            'id': id,
-            'version': version_string,
-            'legacy_version': legacy_version,
-            'url': request.route_url('api.v1.versioned_content',
-                                     id=id, ver=legacy_version),
-        })
-    return resp_data
+    return _job_info(request, job)
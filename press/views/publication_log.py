@@ -0,0 +1,26 @@
+from pyramid.view import view_config
+
+from ..tracking import PublicationLog
+from ..utils import convert_version_tuple_to_version_string
+
+
+@view_config(route_name='api.v3.publication_log', request_method=['GET'],
+             renderer='json', http_cache=0, permission='view')
+def publication_log(request):
+    """Report the publications (made by this application)
+    that touched the given module or collection.
+
+    """
+    module_id = request.matchdict['module_id']
+    publications = PublicationLog(request.db_conn).find(module_id=module_id)
+    return {
+        'module_id': module_id,
+        'publications': [
+            {'published': publication.published.isoformat(),
+             'ids': [{'id': id,
+                      'version': convert_version_tuple_to_version_string(ver)}
+                     for id, ver in publication.ids],
+             }
+            for publication in publications
+        ],
+    }
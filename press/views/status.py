@@ -0,0 +1,15 @@
+from pyramid.view import view_config
+
+from ..auth import get_credential_cache
+from ..db import get_pool_gauges
+from ..housekeeping import get_disk_usage
+
+
+@view_config(route_name='api-status', renderer='json', http_cache=0)
+def status(request):
+    """Report the service's resource usage for monitoring."""
+    return {
+        'shared_directory': get_disk_usage(request.registry),
+        'credential_cache': get_credential_cache(request.registry).stats(),
+        'db_pool': get_pool_gauges(request.registry).stats(),
+    }
@@ -229,6 +229,12 @@ def testing(_init_database, db_engines, db_tables_session_scope):
         stmt = getattr(t, table).delete()
         db_engines['common'].execute(stmt)
 
+    # Create and clear out this application's tables
+    from press.storage import create_schema, metadata as storage_metadata
+    create_schema(db_engines['common'])
+    for table in reversed(storage_metadata.sorted_tables):
+        db_engines['common'].execute(table.delete())
+
     # Insert 'persons', because this application doesn't do people.
     # You either have a user before publishing or some other means of
     # creating a user exists.
@@ -243,10 +249,12 @@ def testing(_init_database, db_engines, db_tables_session_scope):
 def pretend_logger():
     info = pretend.call_recorder(lambda *a, **kw: None)
     debug = pretend.call_recorder(lambda *a, **kw: None)
+    error = pretend.call_recorder(lambda *a, **kw: None)
     exception = pretend.call_recorder(lambda *a, **kw: None)
     logger = pretend.stub(
         info=info,
         debug=debug,
+        error=error,
         exception=exception,
     )
     return logger
@@ -8,3 +8,13 @@ def webapp(env_vars):
     from press.main import make_wsgi_app
     app = make_wsgi_app()
     return TestApp(app)
+
+
+@pytest.fixture
+def db_conn(db_engines):
+    """A database connection, which is rolled back after the test."""
+    conn = db_engines['common'].connect()
+    trans = conn.begin()
+    yield conn
+    trans.rollback()
+    conn.close()
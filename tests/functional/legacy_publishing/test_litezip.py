@@ -1,5 +1,8 @@
+import pytest
 from sqlalchemy.sql import text
+from press.exceptions import StaleVersions
 from press.legacy_publishing.litezip import (
+    check_versions,
     publish_litezip,
 )
 from tests.helpers import (
@@ -161,3 +164,45 @@ def test_publish_litezip_minor_rev(
         .bindparams(moduleid=collection.id, major_version=1, minor_version=2))
     inserted_tree = db_engines['common'].execute(stmt).fetchone()[0]
     compare_legacy_tree_similarity(inserted_tree['contents'], tree)
+
+
+def test_check_versions(
+        content_util, persist_util, app, db_engines, db_tables):
+    # Insert initial collection and modules.
+    collection, tree, modules = content_util.gen_collection()
+    modules = list([persist_util.insert_module(m) for m in modules])
+    collection, tree, modules = content_util.rebuild_collection(collection,
+                                                                tree)
+    collection = persist_util.insert_collection(collection)
+
+    struct = tuple([collection] + modules)
+
+    # The checked out versions are the published versions.
+    with db_engines['common'].begin() as conn:
+        check_versions(struct, conn)
+
+    # Publish the first two modules ...
+    for module in modules[:2]:
+        index_cnxml = module.file.read_text()
+        start_offset = index_cnxml.find('test document')
+        module.file.write_text(index_cnxml[:start_offset] +
+                               'TEST DOCUMENT' +
+                               index_cnxml[start_offset + 13:])
+    # Publishing rewrites the versions in the files, keep the originals.
+    originals = {x.file: x.file.read_bytes() for x in struct}
+    with db_engines['common'].begin() as conn:
+        publish_litezip(struct, ('user1', 'test publish',), conn)
+    for file, data in originals.items():
+        file.write_bytes(data)
+
+    # ... which makes them and the collection stale.
+    with db_engines['common'].begin() as conn:
+        with pytest.raises(StaleVersions) as exc_info:
+            check_versions(struct, conn)
+
+    errors = exc_info.value.errors
+    assert sorted([x.item.id for x in errors]) \
+        == sorted([collection.id] + [x.id for x in modules[:2]])
+    for error in errors:
+        assert error.checked_out_version == '1.1'
+        assert error.current_version != '1.1'
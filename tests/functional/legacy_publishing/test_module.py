@@ -6,7 +6,9 @@ from dateutil.parser import parse as parse_date
 from litezip.main import COLLECTION_NSMAP
 
 from press.legacy_publishing.module import (
+    find_changed_modules,
     publish_legacy_page,
+    publish_legacy_pages,
 )
 from press.parsers import (
     parse_module_metadata,
@@ -391,3 +393,187 @@ def test_publish_revision_that_overwrites_existing_resources(
     assert new_resource.filename in files
     assert files[new_resource.filename].sha1 == new_resource.sha1
     assert files[new_resource.filename].file == new_resource.data.read_bytes()
+
+
+def test_publish_revision_with_many_new_resources(
+        content_util, persist_util, app, db_engines, db_tables):
+    resources = list([content_util.gen_resource() for x in range(0, 2)])
+    module = content_util.gen_module(resources=resources)
+    module = persist_util.insert_module(module)
+
+    # Add many new resources to the module, including resources
+    # that share the same file contents and a resource that reuses
+    # an existing file.
+    new_resources = list([content_util.gen_resource() for x in range(0, 25)])
+    data = b'the same file data'
+    new_resources.extend([content_util.gen_resource(data=data)
+                          for x in range(0, 3)])
+    new_resources.append(content_util.gen_resource(
+        data=resources[0].data.read_bytes()))
+    module.resources.extend(new_resources)
+
+    metadata = parse_module_metadata(module)
+
+    # TARGET
+    with db_engines['common'].begin() as conn:
+        (id, version), ident = publish_legacy_page(
+            module,
+            metadata,
+            ('user1', 'test publish',),
+            conn,
+        )
+
+    # Check for file insertion
+    stmt = (db_tables.module_files
+            .join(db_tables.files)
+            .select()
+            .where(db_tables.module_files.c.module_ident == ident))
+    result = db_engines['common'].execute(stmt).fetchall()
+    files = {x.filename: x for x in result}
+    for resource in module.resources:
+        assert files[resource.filename].sha1 == resource.sha1
+        assert files[resource.filename].file == resource.data.read_bytes()
+
+    # Check the files were not duplicated
+    shas = set([resource.sha1 for resource in module.resources])
+    stmt = (db_tables.files.select()
+            .where(db_tables.files.c.sha1.in_(shas)))
+    result = db_engines['common'].execute(stmt).fetchall()
+    assert len(result) == len(shas)
+
+
+def test_publish_revision_of_many_modules(
+        content_util, persist_util, app, db_engines, db_tables):
+    modules = []
+    for x in range(0, 4):
+        resources = list([content_util.gen_resource() for x in range(0, 2)])
+        module = content_util.gen_module(resources=resources)
+        modules.append(persist_util.insert_module(module))
+    unchanged_module = modules[-1]
+
+    # Change all but the last module's text, to make them publishable.
+    for module in modules[:-1]:
+        index_cnxml = module.file.read_text()
+        start_offset = index_cnxml.find('test document')
+        module.file.write_text(index_cnxml[:start_offset] +
+                               'TEST DOCUMENT' +
+                               index_cnxml[start_offset + 13:])
+    # Add a new resource to the first module.
+    new_resource = content_util.gen_resource()
+    modules[0].resources.append(new_resource)
+
+    items = [(module, parse_module_metadata(module)) for module in modules]
+
+    # TARGET
+    with db_engines['common'].begin() as conn:
+        published = publish_legacy_pages(
+            items,
+            ('user1', 'test publish',),
+            conn,
+        )
+
+    assert unchanged_module.id not in published
+    assert sorted(published) == sorted([m.id for m in modules[:-1]])
+
+    for model, metadata in items[:-1]:
+        (id, version), ident = published[model.id]
+        assert id == metadata.id
+
+        # Check core metadata insertion
+        stmt = (
+            db_tables.modules
+            .select()
+            .where(db_tables.modules.c.module_ident == ident)
+        )
+        result = db_engines['common'].execute(stmt).fetchone()
+        assert result.moduleid == metadata.id
+        assert version == (result.major_version, result.minor_version)
+        assert result.name == metadata.title
+        assert result.submitter == 'user1'
+
+        # Check subject and keyword metadata insertion
+        stmt = (db_tables.moduletags.join(db_tables.tags)
+                .select()
+                .where(db_tables.moduletags.c.module_ident == ident))
+        results = db_engines['common'].execute(stmt)
+        assert sorted([x.tag for x in results]) == sorted(metadata.subjects)
+        stmt = (db_tables.modulekeywords.join(db_tables.keywords)
+                .select()
+                .where(db_tables.modulekeywords.c.module_ident == ident))
+        results = db_engines['common'].execute(stmt)
+        assert sorted([x.word for x in results]) == sorted(metadata.keywords)
+
+        # Check for file insertion
+        stmt = (db_tables.module_files
+                .join(db_tables.files)
+                .select()
+                .where(db_tables.module_files.c.module_ident == ident))
+        result = db_engines['common'].execute(stmt).fetchall()
+        files = {x.filename: x for x in result}
+        assert len(files) == len(model.resources) + 2  # content files
+        assert files['index.cnxml'].file == model.file.read_bytes()
+        assert 'index.cnxml.html' in files
+        for resource in model.resources:
+            assert files[resource.filename].sha1 == resource.sha1
+
+
+def test_find_changed_modules(
+        content_util, persist_util, app, db_engines, db_tables):
+    modules = []
+    for x in range(0, 4):
+        resources = list([content_util.gen_resource() for x in range(0, 2)])
+        module = content_util.gen_module(resources=resources)
+        modules.append(persist_util.insert_module(module))
+    # A module that has not been published
+    new_module = content_util.gen_module()
+
+    # Change the first module's text ...
+    index_cnxml = modules[0].file.read_text()
+    start_offset = index_cnxml.find('test document')
+    modules[0].file.write_text(index_cnxml[:start_offset] +
+                               'TEST DOCUMENT' +
+                               index_cnxml[start_offset + 13:])
+    # ... and add a new resource to the second module.
+    modules[1].resources.append(content_util.gen_resource())
+
+    # TARGET
+    with db_engines['common'].begin() as conn:
+        changed = find_changed_modules(modules + [new_module], conn)
+
+    assert changed.modules == [modules[0], modules[1], new_module]
+    # The looked up rows and SHA1s are handed on for publishing.
+    assert sorted(changed.existing_modules) == sorted([m.id for m in modules])
+    assert sorted(changed.existing_shas) == sorted(
+        [row.module_ident for row in changed.existing_modules.values()])
+
+
+def test_publish_changed_modules(
+        content_util, persist_util, app, db_engines, db_tables):
+    modules = []
+    for x in range(0, 2):
+        module = content_util.gen_module()
+        modules.append(persist_util.insert_module(module))
+    # Change the first module's text.
+    index_cnxml = modules[0].file.read_text()
+    start_offset = index_cnxml.find('test document')
+    modules[0].file.write_text(index_cnxml[:start_offset] +
+                               'TEST DOCUMENT' +
+                               index_cnxml[start_offset + 13:])
+
+    with db_engines['common'].begin() as conn:
+        changed = find_changed_modules(modules, conn)
+        items = [(module, parse_module_metadata(module))
+                 for module in changed.modules]
+
+        # TARGET
+        published = publish_legacy_pages(
+            items,
+            ('user1', 'test publish',),
+            conn,
+            changed=changed,
+        )
+
+    assert sorted(published) == [modules[0].id]
+    (id, version), ident = published[modules[0].id]
+    assert id == modules[0].id
+    assert version == (2, None)
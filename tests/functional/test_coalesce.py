@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from press.coalesce import PENDING_EXPIRY, PendingRequests
+
+
+APP_URL = 'https://cnx.org'
+
+T0 = datetime(2018, 5, 21, 10, 0, 0)
+
+
+class TestPendingRequests:
+
+    def test_add(self, db_conn):
+        pending = PendingRequests(db_conn)
+
+        ids = [('col11', (1, 1)), ('m1', (2, None))]
+        assert pending.add(APP_URL, ids) == ['col11', 'm1']
+        # Only the content that is not waiting is added
+        ids = [('m2', (3, None)), ('m1', (3, None))]
+        assert pending.add(APP_URL, ids) == ['m2']
+        # ... by application url
+        assert pending.add('https://other.cnx.org', ids) == ['m2', 'm1']
+
+        # The latest version of each module is requested
+        assert pending.claim(APP_URL) == [
+            ('col11', (1, 1)),
+            ('m1', (3, None)),
+            ('m2', (3, None)),
+        ]
+
+    def test_claim(self, db_conn):
+        pending = PendingRequests(db_conn)
+        pending.add(APP_URL, [('m1', (2, None))])
+
+        assert pending.claim(APP_URL) == [('m1', (2, None))]
+        assert pending.claim(APP_URL) == []
+        # Once claimed (i.e. being sent) the content is requested again
+        assert pending.add(APP_URL, [('m1', (2, None))]) == ['m1']
+
+    def test_expired(self, db_conn):
+        pending = PendingRequests(db_conn)
+        pending.add(APP_URL, [('m1', (2, None))], now=T0)
+
+        # Assume the task that was to send the requests was lost
+        now = T0 + timedelta(seconds=PENDING_EXPIRY)
+        assert pending.add(APP_URL, [('m1', (2, None))], now=now) == []
+        now = T0 + timedelta(seconds=PENDING_EXPIRY + 1)
+        assert pending.add(APP_URL, [('m1', (2, None))], now=now) == ['m1']
+        # ... and waits again from then on
+        later = now + timedelta(seconds=1)
+        assert pending.add(APP_URL, [('m1', (3, None))], now=later) == []
+        assert pending.claim(APP_URL) == [('m1', (3, None))]
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from press.fingerprints import FingerprintStore
+from press.models import PublishedLitezip
+
+
+T0 = datetime(2018, 5, 21, 10, 0, 0)
+
+RESPONSE = [{'source_id': 'm37154', 'id': 'm37154', 'version': '2'}]
+
+
+class TestFingerprintStore:
+
+    def test(self, db_conn):
+        store = FingerprintStore(db_conn)
+
+        assert store.get('abc') is None
+
+        published = PublishedLitezip({'col11405': 10, 'm37154': 11},
+                                     200, RESPONSE)
+        store.set('abc', published)
+        assert store.get('abc') == published
+
+        # Republished
+        republished = PublishedLitezip({'col11405': 12, 'm37154': 13},
+                                       202, None)
+        store.set('abc', republished)
+        assert store.get('abc') == republished
+        assert store.get('def') is None
+
+    def test_expire(self, db_conn):
+        store = FingerprintStore(db_conn)
+        published = PublishedLitezip({'m37154': 11}, 200, RESPONSE)
+        store.set('abc', published, recorded=T0)
+        store.set('def', published, recorded=T0 + timedelta(hours=2))
+
+        assert store.expire(3600, now=T0 + timedelta(hours=2)) == 1
+
+        assert store.get('abc') is None
+        assert store.get('def') == published
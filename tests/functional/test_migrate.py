@@ -0,0 +1,41 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+from press.migrate import import_tracked_publications
+from press.models import TrackedPublication
+from press.tracking import PublicationLog
+
+
+def _write(directory, name, ids):
+    with (directory / name).open('w') as fb:
+        json.dump(ids, fb)
+
+
+def test_import_tracked_publications(tmpdir, db_conn):
+    directory = Path(str(tmpdir))
+    _write(directory, '2018-05-21 09:00:00.json', [['m9', [1, None]]])
+    _write(directory, '2018-05-21 08:00:00.5.json', [['m8', [1, None]]])
+    # Files that can not be read
+    _write(directory, 'not-a-datetime.json', [['m7', [1, None]]])
+    _write(directory, '2018-05-21 07:00:00.json', {'m6': 1})
+
+    assert import_tracked_publications(db_conn, directory) == 2
+
+    log = PublicationLog(db_conn)
+    assert log.find(until=datetime(2018, 5, 22)) == [
+        TrackedPublication(datetime(2018, 5, 21, 8, 0, 0, 500000),
+                           [('m8', (1, None))]),
+        TrackedPublication(datetime(2018, 5, 21, 9, 0, 0),
+                           [('m9', (1, None))]),
+    ]
+    # The imported files are removed, the others are left in place
+    assert sorted(x.name for x in directory.iterdir()) == [
+        '2018-05-21 07:00:00.json',
+        'not-a-datetime.json',
+    ]
+
+    # The import is only applied once
+    _write(directory, '2018-05-21 10:00:00.json', [['m10', [1, None]]])
+    assert import_tracked_publications(db_conn, directory) is None
+    assert log.find(module_id='m10') == []
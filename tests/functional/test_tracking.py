@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from press.models import TrackedPublication
+from press.tracking import PublicationLog
+
+
+T0 = datetime(2018, 5, 21, 10, 0, 0)
+
+
+class TestPublicationLog:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db_conn):
+        self.log = PublicationLog(db_conn)
+        self.log.append([('col11', (1, 1)), ('m1', (2, None))],
+                        published=T0)
+        self.log.append([('m2', (3, None))],
+                        published=T0 + timedelta(hours=1))
+        self.log.append([('m1', (3, None)), ('m2', (4, None))],
+                        published=T0 + timedelta(hours=2))
+
+    def test_find(self):
+        assert self.log.find() == [
+            TrackedPublication(T0, [('col11', (1, 1)), ('m1', (2, None))]),
+            TrackedPublication(T0 + timedelta(hours=1), [('m2', (3, None))]),
+            TrackedPublication(T0 + timedelta(hours=2),
+                               [('m1', (3, None)), ('m2', (4, None))]),
+        ]
+
+    def test_find_by_module_id(self):
+        publications = self.log.find(module_id='m1')
+        assert [x.published for x in publications] \
+            == [T0, T0 + timedelta(hours=2)]
+        # All the publication's ids are included
+        assert publications[1].ids == [('m1', (3, None)), ('m2', (4, None))]
+
+        assert self.log.find(module_id='m3') == []
+
+    def test_find_by_time(self):
+        publications = self.log.find(since=T0 + timedelta(hours=1))
+        assert [x.published for x in publications] \
+            == [T0 + timedelta(hours=1), T0 + timedelta(hours=2)]
+
+        publications = self.log.find(module_id='m2',
+                                     until=T0 + timedelta(hours=2))
+        assert [x.published for x in publications] \
+            == [T0 + timedelta(hours=1)]
+
+    def test_append_now(self):
+        self.log.append([('m9', (1, None))])
+
+        publication, = self.log.find(module_id='m9')
+        assert datetime.now() - publication.published < timedelta(minutes=1)
+
+    def test_expire(self):
+        now = T0 + timedelta(hours=2, minutes=30)
+
+        assert self.log.expire(7200, now=now) == 1
+
+        assert [x.published for x in self.log.find()] \
+            == [T0 + timedelta(hours=1), T0 + timedelta(hours=2)]
+        # The expired publication's items are removed with it
+        assert self.log.find(module_id='col11') == []
@@ -1,14 +1,19 @@
+from pathlib import Path
+from zipfile import ZipFile
+
 from lxml import etree
+from webtest import TestApp
 
 from litezip.main import COLLECTION_NSMAP
 
+from press.publishing import UPLOAD_PREFIX
 from tests.helpers import element_tree_from_model
 
 a_username = 'user1'
 a_passwd = 'foobar'
 
 
-def test_publishing_invalid_zip(tmpdir, webapp):
+def test_publishing_invalid_zip(tmpdir, env_vars, webapp):
     webapp.authorization = ('Basic', (a_username, a_passwd))
 
     file = tmpdir.mkdir('test').join('foo.txt')
@@ -34,6 +39,42 @@ def test_publishing_invalid_zip(tmpdir, webapp):
     ]
     assert resp.json['messages'] == expected_msgs
 
+    # Check the upload was never persisted
+    shared_directory = Path(env_vars['SHARED_DIR'])
+    assert list(shared_directory.glob('{}*'.format(UPLOAD_PREFIX))) == []
+
+
+def test_publishing_too_large_zip(tmpdir, env_vars, monkeypatch):
+    monkeypatch.setenv('UPLOAD_MAX_SIZE', '10')
+    from press.main import make_wsgi_app
+    webapp = TestApp(make_wsgi_app())
+    webapp.authorization = ('Basic', (a_username, a_passwd))
+
+    file = tmpdir.mkdir('test').join('foo.zip')
+    with ZipFile(str(file), 'w') as zb:
+        zb.writestr('foo.txt', 'foo bar baz')
+
+    publisher = 'user1'
+    message = 'test http publish'
+
+    # Submit a publication
+    with file.open('rb') as fb:
+        file_data = [('file', 'contents.zip', fb.read(),)]
+    form_data = {'publisher': publisher, 'message': message}
+    resp = webapp.post(
+        '/api/publish-litezip',
+        form_data,
+        upload_files=file_data,
+        expect_errors=True,
+    )
+    assert resp.status_code == 413
+    expected_msgs = [
+        {'id': 4,
+         'message': 'upload too large',
+         'error': 'the uploaded file exceeds the maximum size of 10 bytes'},
+    ]
+    assert resp.json['messages'] == expected_msgs
+
 
 def test_publishing_noauth_zip(tmpdir, webapp):
 
@@ -62,6 +103,61 @@ def test_publishing_noauth_zip(tmpdir, webapp):
     assert resp.json['messages'] == expected_msgs
 
 
+def test_publishing_async_invalid_zip(tmpdir, env_vars):
+    from press.main import make_wsgi_app
+    app = make_wsgi_app()
+    # Run the publication job within the request
+    app.registry.celery_app.conf.task_always_eager = True
+    webapp = TestApp(app)
+    webapp.authorization = ('Basic', (a_username, a_passwd))
+
+    file = tmpdir.mkdir('test').join('foo.txt')
+    file.write('foo bar')
+
+    publisher = 'user1'
+    message = 'test http publish'
+
+    # Submit a publication
+    with file.open('rb') as fb:
+        file_data = [('file', 'contents.zip', fb.read(),)]
+    form_data = {'publisher': publisher, 'message': message}
+    resp = webapp.post(
+        '/api/publish-litezip',
+        form_data,
+        upload_files=file_data,
+        headers={'Prefer': 'respond-async'},
+        expect_errors=True,
+    )
+    # Refused before a publication job is queued
+    assert resp.status_code == 400
+    assert 'job_id' not in resp.json
+    expected_msgs = [
+        {'id': 1,
+         'message': 'The given file is not a valid zip formatted file.'},
+    ]
+    assert resp.json['messages'] == expected_msgs
+
+    # Check the upload was never persisted
+    shared_directory = Path(env_vars['SHARED_DIR'])
+    assert list(shared_directory.glob('{}*'.format(UPLOAD_PREFIX))) == []
+
+
+def test_publication_job_not_found(webapp):
+    webapp.authorization = ('Basic', (a_username, a_passwd))
+    job_id = '0' * 32
+
+    resp = webapp.get('/api/publish-litezip/jobs/{}'.format(job_id),
+                      expect_errors=True)
+
+    assert resp.status_code == 404
+    expected_msgs = [
+        {'id': 6,
+         'message': 'publication job not found',
+         'item': job_id},
+    ]
+    assert resp.json['messages'] == expected_msgs
+
+
 def test_publishing_invalid_revision_litezip(content_util, persist_util,
                                              webapp, db_engines, db_tables):
     webapp.authorization = ('Basic', (a_username, a_passwd))
@@ -304,8 +400,30 @@ def test_publishing_overwrite_module_litezip(
         expect_errors=True,
     )
     assert resp.status_code == 200
+    published = resp.json
 
-    # Try to submit the publication again (version 1.1)
+    # Submit the identical publication again (e.g. a retry),
+    # which is recognized as already published.
+    with file.open('rb') as fb:
+        file_data = [('file', 'contents.zip', fb.read(),)]
+    form_data = {'publisher': publisher, 'message': message}
+    resp = webapp.post(
+        '/api/publish-litezip',
+        form_data,
+        upload_files=file_data,
+        expect_errors=True,
+    )
+    # ... and answered with the response to its publication.
+    assert resp.status_code == 200
+    assert resp.json == published
+
+    # Try to submit a changed publication of the old version (1.1)
+    index_cnxml = new_module.file.read_text()
+    start_offset = index_cnxml.find('TEST DOCUMENT')
+    new_module.file.write_text(index_cnxml[:start_offset] +
+                               'Test Document' +
+                               index_cnxml[start_offset + 13:])
+    file = content_util.mk_zipfile_from_litezip_struct(struct)
     with file.open('rb') as fb:
         file_data = [('file', 'contents.zip', fb.read(),)]
     form_data = {'publisher': publisher, 'message': message}
@@ -316,16 +434,18 @@ def test_publishing_overwrite_module_litezip(
         expect_errors=True,
     )
     assert resp.status_code == 400
-    expected_msgs = [
-        {
-            "id": 3,
-            "message": "stale version",
-            "item": new_module.id,
-            "error": "checked out version is 1.1"
-                     " but currently published is 1.2"
-        }
-    ]
-    assert expected_msgs == resp.json['messages']
+    expected_msg = {
+        "id": 3,
+        "message": "stale version",
+        "item": new_module.id,
+        "error": "checked out version is 1.1"
+                 " but currently published is 1.2"
+    }
+    assert expected_msg in resp.json['messages']
+    # The collection, published along with the module, is stale as well.
+    assert sorted([x['item'] for x in resp.json['messages']]) \
+        == sorted([collection.id, new_module.id])
+    assert set([x['id'] for x in resp.json['messages']]) == {3}
 
 
 def test_publishing_overwrite_collection_litezip(
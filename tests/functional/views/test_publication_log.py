@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from press.tracking import PublicationLog
+
+
+def test_publication_log(webapp, db_engines):
+    with db_engines['common'].begin() as db_conn:
+        log = PublicationLog(db_conn)
+        log.append([('col99001', (2, 1)), ('m99001', (3, None))],
+                   published=datetime(2018, 5, 21, 10, 0, 0))
+        log.append([('m99002', (1, None))])
+
+    webapp.authorization = ('Basic', ('user1', 'foobar'))
+    resp = webapp.get('/api/publication-log/m99001')
+
+    assert resp.status_code == 200
+    assert resp.json == {
+        'module_id': 'm99001',
+        'publications': [
+            {'published': '2018-05-21T10:00:00',
+             'ids': [{'id': 'col99001', 'version': '2.1'},
+                     {'id': 'm99001', 'version': '3'}]},
+        ],
+    }
+
+
+def test_publication_log_not_authenticated(webapp):
+    resp = webapp.get('/api/publication-log/m99001', expect_errors=True)
+    assert resp.status_code == 401
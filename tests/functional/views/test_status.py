@@ -0,0 +1,42 @@
+from webtest import TestApp
+
+
+def test_status(webapp):
+    resp = webapp.get('/api/status')
+    assert resp.status_code == 200
+    assert resp.content_type == 'application/json'
+    usage = resp.json['shared_directory']
+    assert usage['total'] >= usage['used']
+    assert sorted(usage.keys()) == [
+        'expansions', 'free', 'retained', 'total', 'uploads', 'used',
+    ]
+
+
+def test_status_credential_cache(env_vars, monkeypatch):
+    # The cache is disabled by default
+    monkeypatch.setenv('AUTH_CACHE_TTL', '300')
+    from press.main import make_wsgi_app
+    webapp = TestApp(make_wsgi_app())
+    webapp.authorization = ('Basic', ('user1', 'foobar'))
+    for i in range(2):
+        webapp.get('/api/auth-ping')
+
+    resp = webapp.get('/api/status')
+
+    stats = resp.json['credential_cache']
+    assert stats == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_status_db_pool(webapp):
+    webapp.authorization = ('Basic', ('user1', 'foobar'))
+    webapp.get('/api/auth-ping')
+
+    resp = webapp.get('/api/status')
+
+    stats = resp.json['db_pool']
+    assert sorted(stats.keys()) == [
+        'checked_out', 'checkouts', 'overflow', 'peak_checked_out', 'size',
+    ]
+    # The auth-ping request's connection has been returned to the pool
+    assert stats['checked_out'] == 0
+    assert stats['peak_checked_out'] >= 1
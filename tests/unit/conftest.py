@@ -5,16 +5,19 @@ import pytest
 # List of known tasks
 TASKS_AS_IMPORT_PATHS = [
     'press.outofband.make_request',
+    'press.outofband.make_requests',
+    'press.subscribers.send_requests.send_pending_requests',
 ]
 
 
 def _make_task(x):
     delay = pretend.call_recorder(lambda *a, **kw: None)
-    return x, pretend.stub(delay=delay)
+    apply_async = pretend.call_recorder(lambda *a, **kw: None)
+    return x, pretend.stub(delay=delay, apply_async=apply_async)
 
 
 @pytest.fixture
-def stub_request(pretend_logger):
+def stub_request(pretend_logger, tmpdir):
     # Stub out the Celery app
     tasks = dict(map(_make_task, TASKS_AS_IMPORT_PATHS))
     celery_app = pretend.stub(tasks=tasks)
@@ -24,7 +27,8 @@ def stub_request(pretend_logger):
     raven_client = pretend.stub(captureException=captureException)
 
     # Stub out the Pyramid registry
-    registry = pretend.stub(celery_app=celery_app)
+    settings = {'shared_directory': str(tmpdir.mkdir('shared'))}
+    registry = pretend.stub(celery_app=celery_app, settings=settings)
 
     # Create an event with a stub request
     request = pretend.stub(
@@ -1,12 +1,17 @@
+import io
+
 from lxml import etree
 from litezip.main import COLLECTION_NSMAP
 from press.legacy_publishing.utils import (
+    diff_collection_trees,
+    is_major_change,
+    is_minor_change,
     replace_derived_from,
     replace_id_and_version,
     needs_major_rev,
     needs_minor_rev,
 )
-from press.parsers import parse_collxml
+from press.parsers import DocumentCache, parse_collxml
 from tests.helpers import gen_element, element_tree_from_model
 
 
@@ -312,6 +317,138 @@ class TestMinorVersionRev():
         assert needs_minor_rev(tree_before, tree_after) is False
 
 
+def _make_collxml_tree(title='Book', content=(), abstract='Abstract',
+                       subjects=('Science',)):
+    """Make a collection tree from a ``content`` sequence of
+    ``(id, title, version)`` modules and ``(title, content)``
+    subcollections.
+
+    """
+    def render(content):
+        xml = []
+        for item in content:
+            if len(item) == 2:
+                xml.append('<col:subcollection><md:title>{}</md:title>'
+                           '<col:content>{}</col:content>'
+                           '</col:subcollection>'
+                           .format(item[0], render(item[1])))
+            else:
+                xml.append('<col:module document="{}"'
+                           ' cnxorg:version-at-this-collection-version="{}">'
+                           '<md:title>{}</md:title></col:module>'
+                           .format(item[0], item[2], item[1]))
+        return ''.join(xml)
+
+    subjects = ''.join(['<md:subject>{}</md:subject>'.format(x)
+                        for x in subjects])
+    collxml = (
+        '<col:collection xmlns:col="http://cnx.rice.edu/collxml"'
+        ' xmlns:cnxorg="http://cnx.rice.edu/system-info"'
+        ' xmlns:md="http://cnx.rice.edu/mdml">'
+        '<col:metadata><md:title>{}</md:title>'
+        '<md:abstract>{}</md:abstract>'
+        '<md:subjectlist>{}</md:subjectlist></col:metadata>'
+        '<col:content>{}</col:content></col:collection>'
+    ).format(title, abstract, subjects, render(content))
+    return parse_collxml(io.BytesIO(collxml.encode('utf-8')))
+
+
+BASE_CONTENT = (
+    ('m1', 'One', '1.1'),
+    ('Chapter', (
+        ('m2', 'Two', '1.2'),
+        ('m3', 'Three', '1.3'),
+    )),
+    ('m4', 'Four', '1.4'),
+)
+
+
+class TestDiffCollectionTrees:
+
+    def test_unchanged(self):
+        pre = _make_collxml_tree(content=BASE_CONTENT)
+        post = _make_collxml_tree(content=BASE_CONTENT)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes == ((), (), (), (), (), ())
+        assert not is_major_change(changes)
+        assert not is_minor_change(changes)
+
+    def test_added_and_removed(self):
+        pre = _make_collxml_tree(content=BASE_CONTENT)
+        content = BASE_CONTENT[:2] + (('m5', 'Five', '1.1'),)
+        post = _make_collxml_tree(content=content)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.added == ('m5',)
+        assert changes.removed == ('m4',)
+        assert changes.moved == ()
+        assert is_major_change(changes)
+
+    def test_moved(self):
+        pre = _make_collxml_tree(content=BASE_CONTENT)
+        # Move a module out of the subcollection, keeping the same order.
+        content = (
+            BASE_CONTENT[0],
+            ('m2', 'Two', '1.2'),
+            ('Chapter', (('m3', 'Three', '1.3'),)),
+            BASE_CONTENT[2],
+        )
+        post = _make_collxml_tree(content=content)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.moved == ('m2',)
+        assert changes.added == changes.removed == ()
+        assert is_major_change(changes)
+
+        # Swap the order of two modules.
+        content = (BASE_CONTENT[2], BASE_CONTENT[1], BASE_CONTENT[0])
+        post = _make_collxml_tree(content=content)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.moved == ('m1', 'm4')
+
+    def test_retitled(self):
+        pre = _make_collxml_tree(content=BASE_CONTENT)
+        content = (
+            BASE_CONTENT[0],
+            ('Chapter 1', BASE_CONTENT[1][1]),
+            ('m4', 'Four!', '1.4'),
+        )
+        post = _make_collxml_tree(content=content)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.retitled == ((0,), 'm4')
+        # Module and subcollection titles do not need a revision.
+        assert not is_major_change(changes)
+        assert not is_minor_change(changes)
+
+        post = _make_collxml_tree(title='Other Book', content=BASE_CONTENT)
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.retitled == ((),)
+        assert is_major_change(changes)
+
+    def test_metadata_and_version_changed(self):
+        pre = _make_collxml_tree(content=BASE_CONTENT)
+        content = BASE_CONTENT[:2] + (('m4', 'Four', '1.5'),)
+        post = _make_collxml_tree(content=content, abstract='Different',
+                                  subjects=('Math',))
+
+        changes = diff_collection_trees(pre, post)
+
+        assert changes.metadata_changed == ('abstract', 'subjects')
+        assert changes.version_changed == ('m4',)
+        assert not is_major_change(changes)
+        assert is_minor_change(changes)
+
+
 def test_replace_id_and_version(content_util):
     module = content_util.gen_module()
     id = '$$$_id_$$$'
@@ -327,6 +464,26 @@ def test_replace_id_and_version(content_util):
     assert '1.{}'.format(version[0]) in text
 
 
+def test_replace_id_and_version_with_cache(content_util):
+    module = content_util.gen_module()
+    id = '$$$_id_$$$'
+    version = ('$', '%',)
+    cache = DocumentCache()
+    tree = cache.parse(module.file)
+
+    # Call the target
+    replace_id_and_version(module, id, version, cache=cache)
+
+    # Check the cached tree was modified and written
+    elm = tree.xpath('//md:content-id', namespaces=COLLECTION_NSMAP)[0]
+    assert elm.text == id
+    assert cache.parse(module.file) is tree
+    with module.file.open('r') as fb:
+        text = fb.read()
+    assert id in text
+    assert '1.{}'.format(version[0]) in text
+
+
 class TestReplaceDerivedFrom:
 
     def test_create(self, content_util):
@@ -129,3 +129,77 @@ def test_objectified_magic():
 # https://github.com/openstax/cnx-press/issues/347
 def test_alltext_when_element_not_found():
     assert PressElement('sometag').find('nonExistentTag123').alltext() == ''
+
+
+def test_hash_is_reset_on_change():
+    element = PressElement('sometag', text='Text', attrs={'document': 'm1'})
+    other = PressElement('sometag', text='Text', attrs={'document': 'm1'})
+    assert hash(element) == hash(other)
+
+    element.text = 'Changed'
+    assert element != other
+    element.text = 'Text'
+    assert element == other
+
+    element.tail = 'Tail'
+    assert element != other
+    other.tail = 'Tail'
+    assert element == other
+
+    element.attrs = {'document': 'm2'}
+    assert element != other
+
+
+def test_compact_representation():
+    element = PressElement('sometag')
+
+    assert not hasattr(element, '__dict__')
+    # Tags are interned, so equal tags share the same string object.
+    assert PressElement(''.join(['some', 'tag'])).tag is element.tag
+    # Private names are not looked up as children.
+    element.add_child(PressElement('_private'))
+    try:
+        element._private
+    except AttributeError:
+        pass
+    else:  # pragma: no cover
+        assert False, '_private should not be found'
+
+
+def test_getitem_with_many_children():
+    collection = PressElement('collection')
+    for i in range(0, 1000):
+        collection.add_child(PressElement('module', text=str(i)))
+    collection.add_child(PressElement('title', text='Title'))
+
+    assert collection['title'].text == 'Title'
+    modules = collection['module']
+    assert [x.text for x in modules] == [str(i) for i in range(0, 1000)]
+    assert collection['missing'] is None
+
+    # The index follows the addition of children.
+    collection.add_child(PressElement('subtitle', text='Subtitle'))
+    assert collection.subtitle.text == 'Subtitle'
+
+
+def test_find_and_findall_use_tag_index():
+    collection = gen_press_element_tree()
+    mod3 = collection.child_number(3)
+
+    assert collection.find('mod3--2') is mod3.children[1]
+    assert collection.find() is collection
+    assert collection.find('missing') is PressElement.Empty
+    assert collection.findall('mod2') == (collection.child_number(2),)
+    assert [str(x) for x in collection.findall()] == [
+        str(x) for x in collection.iter()]
+
+    # Changes to the tree are reflected in the lookups.
+    mod3.add_child(PressElement('mod2', text='nested'))
+    assert [x.text for x in collection.findall('mod2')] == ['', 'nested']
+    del mod3.children[-1]
+    assert [x.text for x in collection.findall('mod2')] == ['']
+    mod3.children[0].tag = 'mod5'
+    assert collection.find('mod3--1') is PressElement.Empty
+    assert collection.find('mod5') is mod3.children[0]
+    collection.children = []
+    assert collection.findall('mod2') == ()
@@ -0,0 +1,94 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from litezip.main import COLLECTION_NSMAP
+from lxml import etree
+
+from press.parsers import DocumentCache
+
+
+@pytest.fixture
+def litezip_copy(litezip_valid_litezip, tmpdir):
+    """A copy of the valid litezip that can be modified"""
+    path = Path(str(tmpdir)) / 'litezip'
+    shutil.copytree(str(litezip_valid_litezip), str(path))
+    return path
+
+
+def _touch(filepath):
+    # Move the modification time forward, as a write to the file would.
+    stat = filepath.stat()
+    os.utime(str(filepath), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_parse(litezip_copy):
+    filepath = litezip_copy / 'collection.xml'
+    cache = DocumentCache()
+
+    tree = cache.parse(filepath)
+
+    assert filepath in cache
+    assert cache.parse(filepath) is tree
+    assert etree.tostring(tree) == etree.tostring(etree.parse(str(filepath)))
+
+
+def test_parse_after_file_changes(litezip_copy):
+    filepath = litezip_copy / 'collection.xml'
+    cache = DocumentCache()
+    tree = cache.parse(filepath)
+
+    _touch(filepath)
+
+    assert cache.parse(filepath) is not tree
+
+
+def test_modified_and_write(litezip_copy):
+    filepath = litezip_copy / 'collection.xml'
+    cache = DocumentCache()
+    tree = cache.parse(filepath)
+    elm = tree.xpath('//md:title', namespaces=COLLECTION_NSMAP)[0]
+    elm.text = 'Changed title'
+    cache.modified(filepath)
+
+    # The modified tree is kept regardless of the file on disk.
+    _touch(filepath)
+    assert cache.parse(filepath) is tree
+    assert b'Changed title' not in filepath.read_bytes()
+
+    data = cache.write(filepath)
+
+    assert b'Changed title' in data
+    assert filepath.read_bytes() == data
+    # Writing the file does not invalidate the tree.
+    assert cache.parse(filepath) is tree
+
+
+def test_flush(litezip_copy):
+    filepaths = [litezip_copy / 'collection.xml',
+                 litezip_copy / 'm37154' / 'index.cnxml']
+    cache = DocumentCache()
+    for filepath in filepaths:
+        tree = cache.parse(filepath)
+        elm = tree.xpath('//md:title', namespaces=COLLECTION_NSMAP)[0]
+        elm.text = 'Changed title'
+    cache.modified(filepaths[0])
+
+    cache.flush()
+
+    assert b'Changed title' in filepaths[0].read_bytes()
+    assert b'Changed title' not in filepaths[1].read_bytes()
+
+
+def test_discard(litezip_copy):
+    filepath = litezip_copy / 'collection.xml'
+    cache = DocumentCache()
+    tree = cache.parse(filepath)
+    cache.modified(filepath)
+
+    cache.discard(filepath)
+    cache.flush()
+
+    assert filepath not in cache
+    assert cache.parse(filepath) is not tree
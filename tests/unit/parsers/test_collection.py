@@ -1,3 +1,4 @@
+import io
 from pathlib import Path
 
 from litezip import parse_collection
@@ -17,6 +18,76 @@ def test_parse_collxml(content_util):
     assert output.tag == 'root'  # what the root tag is called.
 
 
+def _gen_collxml(num_nodes):
+    # Each module element contains a title element.
+    modules = ''.join([
+        '\n      <col:module document="m{0}" version="1.1">'
+        '\n        <md:title>Title {0} &amp; more</md:title>'
+        '\n      </col:module>'.format(i)
+        for i in range(0, (num_nodes - 2) // 2)
+    ])
+    xml = ('<?xml version="1.0"?>\n'
+           '<col:collection xmlns:col="http://cnx.rice.edu/collxml"'
+           ' xmlns:md="http://cnx.rice.edu/mdml">'
+           '\n  <col:content>{}\n  </col:content>'
+           '\n</col:collection>').format(modules)
+    return xml.encode('utf-8')
+
+
+def test_parse_collxml_creates_one_element_per_node(monkeypatch):
+    num_nodes = 5000
+    collxml = _gen_collxml(num_nodes)
+    init = PressElement.__init__
+    calls = []
+
+    def counting_init(self, *args, **kwargs):
+        calls.append(args)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(PressElement, '__init__', counting_init)
+
+    output = parse_collxml(io.BytesIO(collxml))
+
+    # One element for each xml element, plus the root element.
+    assert len(calls) == num_nodes + 1
+    assert len(output.findall()) == num_nodes + 1
+    # The text delivered in chunks (e.g. around entities) is kept whole.
+    titles = output.findall('title')
+    assert titles[0].text == 'Title 0 & more'
+    assert titles[-1].text == 'Title 2498 & more'
+    assert output.find('module').text == ''
+
+
+def test_parse_collxml_text_and_tail():
+    collxml = (b'<col:collection xmlns:col="http://cnx.rice.edu/collxml"'
+               b' xmlns:md="http://cnx.rice.edu/mdml">'
+               b'<md:title>\n  Before <md:emphasis>emphasized</md:emphasis>'
+               b' after\n</md:title>\n</col:collection>')
+
+    output = parse_collxml(io.BytesIO(collxml))
+
+    title = output.find('title')
+    assert title.text == 'Before'
+    assert title.tail == 'after'
+    assert title.find('emphasis').text == 'emphasized'
+    assert title.alltext() == 'Before emphasized after'
+
+
+def test_parse_collxml_from_tree(content_util):
+    collection, _, _ = content_util.gen_collection()
+    with collection.file.open('rb') as fb:
+        expected = parse_collxml(fb)
+
+    output = parse_collxml(etree.parse(str(collection.file)))
+
+    assert output.tag == 'root'
+    assert ([x.tag for x in output.findall()] ==
+            [x.tag for x in expected.findall()])
+    assert ([x.attrs for x in output.findall('module')] ==
+            [x.attrs for x in expected.findall('module')])
+    assert output.find('title').alltext() == expected.find('title').alltext()
+
+
 def test_parse_collection_metadata(litezip_valid_litezip):
     # given a Collection object,
     model = parse_collection(litezip_valid_litezip)
@@ -1,5 +1,4 @@
 import pretend
-from pyramid import events as pyramid_events
 
 from press import events
 from press import subscribers
@@ -7,6 +6,7 @@ from press.subscribers import (
     legacy_enqueue,
     legacy_update_latest,
     purge_cache,
+    send_requests,
     track_pubs,
 )
 
@@ -31,15 +31,15 @@ def test_includeme():
             events.LegacyPublicationFinished,
         ),
         pretend.call(
-            track_pubs.create_tracked_pubs_location,
-            pyramid_events.ApplicationCreated,
+            track_pubs.track_publications,
+            events.LegacyPublicationFinished,
         ),
         pretend.call(
-            track_pubs.track_publications_to_filesystem,
+            purge_cache.purge_cache,
             events.LegacyPublicationFinished,
         ),
         pretend.call(
-            purge_cache.purge_cache,
+            send_requests.send_http_requests,
             events.LegacyPublicationFinished,
         ),
     ]
@@ -1,7 +1,4 @@
-import pretend
-
 from press.events import LegacyPublicationFinished
-from press.outofband import make_request
 from press.subscribers.legacy_enqueue import legacy_enqueue
 
 
@@ -27,11 +24,9 @@ def test(requests_mock, stub_request):
     # Call the subcriber
     legacy_enqueue(event)
 
-    # Check for task calls
-    task_path = '.'.join([make_request.__module__, make_request.__name__])
-    task = stub_request.registry.celery_app.tasks[task_path]
-    expected_calls = list(map(pretend.call, map(_make_url, sorted(ids))))
-    assert task.delay.calls == expected_calls
+    # Check for the requests to be sent
+    expected = [('GET', _make_url(x)) for x in sorted(ids)]
+    assert event.http_requests == expected
 
     # Check for logging
     assert len(stub_request.log.info.calls) == len(ids)
@@ -1,7 +1,4 @@
-import pretend
-
 from press.events import LegacyPublicationFinished
-from press.outofband import make_request
 from press.subscribers.legacy_update_latest import (
     legacy_update_latest,
 )
@@ -21,15 +18,12 @@ class TestLegacyUpdateLatest:
         # Call the subcriber
         legacy_update_latest(event)
 
-        # Check for task calls
-        task_path = '.'.join([make_request.__module__, make_request.__name__])
-        task = stub_request.registry.celery_app.tasks[task_path]
-        expected_calls = [
-            pretend.call('mock://legacy.example.org/content/col32154/latest'),
-            pretend.call('mock://legacy.example.org/content/m12345/latest'),
-            pretend.call('mock://legacy.example.org/content/m54321/latest'),
+        # Check for the requests to be sent
+        assert event.http_requests == [
+            ('GET', 'mock://legacy.example.org/content/col32154/latest'),
+            ('GET', 'mock://legacy.example.org/content/m12345/latest'),
+            ('GET', 'mock://legacy.example.org/content/m54321/latest'),
         ]
-        assert task.delay.calls == expected_calls
 
         # Check for logging
         assert len(stub_request.log.info.calls) == len(ids)
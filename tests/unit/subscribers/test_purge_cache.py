@@ -1,10 +1,8 @@
 import pretend
 
 from press.events import LegacyPublicationFinished
-
-from press.outofband import make_request
 from press.subscribers.purge_cache import (
-    ID_CHUNK_SIZE,
+    _collapse_ids,
     purge_cache,
 )
 
@@ -18,14 +16,6 @@ def _make_url(ids):
     )
 
 
-def _chunk_ids(ids):
-    start = 0
-    range_stop = len(ids) + ID_CHUNK_SIZE
-    for end in range(ID_CHUNK_SIZE, range_stop, ID_CHUNK_SIZE):
-        yield ids[start:end]
-        start = end
-
-
 class TestPurgeCache:
 
     def test(self, stub_request):
@@ -41,13 +31,8 @@ class TestPurgeCache:
         # Call the subcriber
         purge_cache(event)
 
-        # Check for task calls
-        task_path = '.'.join([make_request.__module__, make_request.__name__])
-        task = stub_request.registry.celery_app.tasks[task_path]
-        expected_calls = [
-            pretend.call(url, method='PURGE_REGEXP'),
-        ]
-        assert task.delay.calls == expected_calls
+        # Check for the requests to be sent
+        assert event.http_requests == [('PURGE_REGEXP', url)]
 
         # Check for logging
         assert stub_request.log.debug.calls == [
@@ -93,18 +78,82 @@ class TestPurgeCache:
 
         # Check for logging, but not the details, because that's not the
         # focus of this particular test.
-        assert len(stub_request.log.debug.calls) == 3
-        assert len(stub_request.log.info.calls) == 3
-
-        # Assemble the expected urls together
-        just_ids = list(map(lambda x: x[0], ids))
-        expected_method = 'PURGE_REGEXP'
-        expected_calls = []
-        for chunk_of_ids in _chunk_ids(just_ids):
-            url = _make_url(chunk_of_ids)
-            expected_calls.append(pretend.call(url, method=expected_method))
-
-        # Check for task calls
-        task_path = '.'.join([make_request.__module__, make_request.__name__])
-        task = stub_request.registry.celery_app.tasks[task_path]
-        assert task.delay.calls == expected_calls
+        assert len(stub_request.log.debug.calls) == 1
+        assert len(stub_request.log.info.calls) == 1
+
+        # Check the ids were collapsed into a single purge
+        expected = _make_url([
+            'm1[24]', 'm5[24]', 'm2[24]', 'm6[24]', 'm3[24]',
+            'm7[24]', 'm4[24]', 'm8[24]', 'm9[24]',
+            'col32', 'col42', 'col52', 'col21',
+        ])
+        assert event.http_requests == [('PURGE_REGEXP', expected)]
+
+    def test_chunked_by_url_length(self, stub_request):
+        settings = stub_request.registry.settings
+        settings['purge.collapse_ids'] = 'false'
+        ids = [('m{}'.format(i), (1, None)) for i in range(10000, 10050)]
+        event = LegacyPublicationFinished(ids, stub_request)
+        # Room for 10 ids (six characters each, with separators)
+        max_length = len(_make_url(['m10000'] * 10))
+        settings['purge.max_url_length'] = str(max_length)
+
+        # Call the subcriber
+        purge_cache(event)
+
+        just_ids = [x[0] for x in ids]
+        expected = [('PURGE_REGEXP', _make_url(just_ids[i:i + 10]))
+                    for i in range(0, 50, 10)]
+        assert event.http_requests == expected
+        assert all([len(url) <= max_length
+                    for _, url in event.http_requests])
+        assert len(stub_request.log.info.calls) == 5
+
+    def test_collapsed_and_chunked(self, stub_request):
+        settings = stub_request.registry.settings
+        ids = [('m{}'.format(i), (1, None)) for i in range(10000, 10050)]
+        ids.append(('m20001', (1, None)))
+        event = LegacyPublicationFinished(ids, stub_request)
+        settings['purge.max_url_length'] = len(
+            _make_url(['m1000[0-9]'] * 3))
+
+        # Call the subcriber
+        purge_cache(event)
+
+        assert event.http_requests == [
+            ('PURGE_REGEXP',
+             _make_url(['m1000[0-9]', 'm1001[0-9]', 'm1002[0-9]'])),
+            ('PURGE_REGEXP',
+             _make_url(['m1003[0-9]', 'm1004[0-9]', 'm20001'])),
+        ]
+        # The ids are logged rather than the patterns
+        assert 'm10049, m20001' in stub_request.log.info.calls[1].args[0]
+
+    def test_oversized_id(self, stub_request):
+        stub_request.registry.settings['purge.max_url_length'] = 10
+        ids = [('m12345', (2, None)), ('m54321', (4, None))]
+        event = LegacyPublicationFinished(ids, stub_request)
+
+        # Call the subcriber
+        purge_cache(event)
+
+        # Each id is purged on its own
+        assert event.http_requests == [
+            ('PURGE_REGEXP', _make_url(['m12345'])),
+            ('PURGE_REGEXP', _make_url(['m54321'])),
+        ]
+
+
+def test_collapse_ids():
+    ids = ['m45110', 'm45111', 'm45113', 'col11629', 'm9', 'col',
+           'm45121'] + ['m4512{}'.format(i) for i in range(2, 10)] + \
+        ['m45120']
+    assert list(_collapse_ids(ids)) == [
+        ('m4511[013]', ['m45110', 'm45111', 'm45113']),
+        ('col11629', ['col11629']),
+        ('m9', ['m9']),
+        ('col', ['col']),
+        ('m4512[0-9]',
+         ['m45121'] + ['m4512{}'.format(i) for i in range(2, 10)] +
+         ['m45120']),
+    ]
@@ -0,0 +1,189 @@
+from contextlib import contextmanager
+
+import pretend
+import pytest
+
+from press.events import LegacyPublicationFinished
+from press.outofband import make_requests
+from press.subscribers import send_requests
+from press.subscribers.send_requests import (
+    send_http_requests,
+    send_pending_requests,
+)
+
+
+APP_URL = 'https://example.org'
+
+
+def _get_task(request, func=make_requests):
+    task_path = '.'.join([func.__module__, func.__name__])
+    return request.registry.celery_app.tasks[task_path]
+
+
+IDS = [('m12345', (2, None)), ('col11', (1, 1))]
+
+HTTP_REQUESTS = [
+    ('GET', 'https://legacy.example.org/content/m12345/latest'),
+    ('PURGE_REGEXP', 'https://legacy.example.org/content/(m12345)'),
+]
+
+
+@contextmanager
+def _begin():
+    yield
+
+
+class FakePendingRequests:
+    """Stands in for the pending requests of the database"""
+
+    def __init__(self):
+        self.pending = {}
+
+    def __call__(self, db_conn):
+        return self
+
+    def add(self, application_url, ids):
+        pending = self.pending.setdefault(application_url, {})
+        added = [id for id, _ in ids if id not in pending]
+        pending.update(ids)
+        return added
+
+    def claim(self, application_url):
+        return sorted(self.pending.pop(application_url, {}).items())
+
+
+@pytest.fixture
+def pending(monkeypatch):
+    pending = FakePendingRequests()
+    monkeypatch.setattr(send_requests, 'PendingRequests', pending)
+    return pending
+
+
+@pytest.fixture
+def request_(stub_request):
+    stub_request.scheme = 'https'
+    stub_request.application_url = APP_URL
+    stub_request.db_conn = pretend.stub(begin=_begin)
+    return stub_request
+
+
+class TestSendHttpRequests:
+
+    def test(self, request_):
+        event = LegacyPublicationFinished(IDS, request_)
+        event.http_requests.extend(HTTP_REQUESTS)
+
+        # Call the subcriber
+        send_http_requests(event)
+
+        # Check for a single task call
+        task = _get_task(request_)
+        assert task.delay.calls == [pretend.call(HTTP_REQUESTS)]
+
+        # Check for logging
+        assert request_.log.info.calls == [
+            pretend.call("asynchronously sent 2 requests "
+                         "to the legacy system"),
+        ]
+
+    def test_without_requests(self, request_):
+        event = LegacyPublicationFinished([], request_)
+
+        # Call the subcriber
+        send_http_requests(event)
+
+        task = _get_task(request_)
+        assert task.delay.calls == []
+
+    def test_coalesced(self, request_, pending):
+        request_.registry.settings['http.coalesce_window'] = 5
+        # A previous publication's content that is waiting
+        pending.add(APP_URL, IDS[:1])
+        event = LegacyPublicationFinished(IDS, request_)
+        event.http_requests.extend(HTTP_REQUESTS)
+
+        # Call the subcriber
+        send_http_requests(event)
+
+        # Check the content is waiting for the requests to be sent
+        # after the coalescing window, instead of sending them now
+        assert _get_task(request_).delay.calls == []
+        assert pending.pending == {APP_URL: dict(IDS)}
+        task = _get_task(request_, send_pending_requests)
+        assert task.apply_async.calls == [
+            pretend.call((APP_URL,), countdown=5.0),
+        ]
+        assert request_.log.info.calls == [
+            pretend.call("coalesced 1 ids with the pending requests"),
+            pretend.call("requests for 1 ids to be sent "
+                         "to the legacy system in 5.0 seconds"),
+        ]
+
+        # Check nothing is scheduled when all the content is waiting
+        event = LegacyPublicationFinished(IDS, request_)
+        event.http_requests.extend(HTTP_REQUESTS)
+        send_http_requests(event)
+        assert len(task.apply_async.calls) == 1
+
+    def test_coalesce_failure(self, request_, pending):
+        request_.registry.settings['http.coalesce_window'] = 5
+
+        def add(*args):
+            raise RuntimeError('database is gone')
+
+        pending.add = add
+        event = LegacyPublicationFinished(IDS, request_)
+        event.http_requests.extend(HTTP_REQUESTS)
+
+        send_http_requests(event)
+
+        # The requests are sent without coalescing
+        assert request_.log.exception.calls == [
+            pretend.call('failed to coalesce the requests'),
+        ]
+        task = _get_task(request_)
+        assert task.delay.calls == [pretend.call(HTTP_REQUESTS)]
+
+
+class TestSendPendingRequests:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, request_, pending, monkeypatch):
+        self.request = request_
+        self.pending = pending
+        request_._process_finished_callbacks = \
+            pretend.call_recorder(lambda: None)
+        self.closer = pretend.call_recorder(lambda: None)
+
+        def prepare(request, registry):
+            assert request.application_url == APP_URL
+            return {'request': request_, 'closer': self.closer}
+
+        monkeypatch.setattr(send_requests, 'prepare', prepare)
+        self.task = pretend.stub(registry=request_.registry)
+
+    def test(self):
+        self.pending.add(APP_URL, IDS)
+
+        assert send_pending_requests(self.task, APP_URL) == 5
+
+        # The requests of all the pending content are sent as one batch
+        task = _get_task(self.request)
+        http_requests, = task.delay.calls[0].args
+        assert sorted(set(method for method, _ in http_requests)) \
+            == ['GET', 'PURGE_REGEXP']
+        urls = [url for _, url in http_requests]
+        assert 'https://legacy.example.org/content/col11/latest' in urls
+        assert 'https://legacy.example.org/content/m12345/1.2' \
+            '/enqueue?colcomplete=True&collxml=True' in urls
+        assert self.pending.pending == {}
+        # The request's resources are released
+        assert self.request._process_finished_callbacks.calls \
+            == [pretend.call()]
+        assert self.closer.calls == [pretend.call()]
+
+    def test_nothing_pending(self):
+        assert send_pending_requests(self.task, APP_URL) == 0
+
+        assert _get_task(self.request).delay.calls == []
+        assert self.closer.calls == [pretend.call()]
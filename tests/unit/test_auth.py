@@ -0,0 +1,151 @@
+import pretend
+import pytest
+
+from press import auth
+from press.auth import (
+    DEFAULT_AUTH_CACHE_SIZE,
+    DEFAULT_AUTH_CACHE_TTL,
+    CredentialCache,
+    check_credentials,
+    get_credential_cache,
+)
+
+
+class FauxClock:
+
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestCredentialCache:
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.clock = FauxClock()
+        self.cache = CredentialCache(ttl=60, max_size=2, clock=self.clock)
+
+    def test_get_and_set(self):
+        assert self.cache.get('user1', 'foobar') is None
+
+        self.cache.set('user1', 'foobar', ['user1', 'Maintainer'])
+
+        assert self.cache.get('user1', 'foobar') == ['user1', 'Maintainer']
+        assert self.cache.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+
+    def test_other_password(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+        assert self.cache.get('user1', 'barfoo') is None
+        assert self.cache.get('user2', 'foobar') is None
+
+    def test_passwords_are_not_kept(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+        (username, digest), = self.cache._entries
+        assert username == 'user1'
+        assert b'foobar' not in digest
+
+    def test_expiry(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+
+        self.clock.now += 59
+        assert self.cache.get('user1', 'foobar') == ['user1']
+        self.clock.now += 1
+        assert self.cache.get('user1', 'foobar') is None
+
+        assert self.cache.stats() == {'hits': 1, 'misses': 1, 'size': 0}
+
+    def test_bounded(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+        self.cache.set('user2', 'foobar', ['user2'])
+        # Use user1, so that user2 is the least recently used
+        self.cache.get('user1', 'foobar')
+
+        self.cache.set('user3', 'foobar', ['user3'])
+
+        assert len(self.cache) == 2
+        assert self.cache.get('user2', 'foobar') is None
+        assert self.cache.get('user1', 'foobar') == ['user1']
+        assert self.cache.get('user3', 'foobar') == ['user3']
+
+    def test_cached_principals_are_copied(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+        self.cache.get('user1', 'foobar').append('Maintainer')
+        assert self.cache.get('user1', 'foobar') == ['user1']
+
+    def test_invalidate(self):
+        self.cache.set('user1', 'foobar', ['user1'])
+        self.cache.set('user2', 'foobar', ['user2'])
+
+        self.cache.invalidate('user1')
+
+        assert self.cache.get('user1', 'foobar') is None
+        assert self.cache.get('user2', 'foobar') == ['user2']
+
+        self.cache.invalidate()
+        assert len(self.cache) == 0
+
+    def test_disabled(self):
+        cache = CredentialCache(ttl=0)
+        cache.set('user1', 'foobar', ['user1'])
+        assert cache.get('user1', 'foobar') is None
+
+
+class TestCheckCredentials:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        self.cache = CredentialCache(ttl=60)
+        self.request = pretend.stub(
+            registry=pretend.stub(credential_cache=self.cache),
+        )
+        self.principals = {('user1', 'foobar'): ['user1', 'Maintainer']}
+        self.lookup = pretend.call_recorder(
+            lambda u, p, request: self.principals.get((u, p)))
+        monkeypatch.setattr(auth, '_lookup_principals', self.lookup)
+
+    def test(self):
+        for i in range(3):
+            principals = check_credentials('user1', 'foobar', self.request)
+            assert principals == ['user1', 'Maintainer']
+
+        # Looked up only once
+        assert len(self.lookup.calls) == 1
+        assert self.cache.stats() == {'hits': 2, 'misses': 1, 'size': 1}
+
+    def test_failed_credentials_are_not_cached(self):
+        for i in range(2):
+            assert check_credentials('user1', 'barfoo', self.request) is None
+        assert len(self.lookup.calls) == 2
+        assert len(self.cache) == 0
+
+
+def test_includeme():
+    settings = {'auth.cache_ttl': '30', 'auth.cache_size': '10'}
+    registry = pretend.stub(settings=settings)
+    config = pretend.stub(
+        registry=registry,
+        set_authentication_policy=lambda policy: None,
+        set_authorization_policy=lambda policy: None,
+    )
+
+    auth.includeme(config)
+
+    cache = get_credential_cache(registry)
+    assert (cache.ttl, cache.max_size) == (30, 10)
+
+
+def test_includeme_defaults():
+    registry = pretend.stub(settings={})
+    config = pretend.stub(
+        registry=registry,
+        set_authentication_policy=lambda policy: None,
+        set_authorization_policy=lambda policy: None,
+    )
+
+    auth.includeme(config)
+
+    cache = get_credential_cache(registry)
+    assert (cache.ttl, cache.max_size) \
+        == (DEFAULT_AUTH_CACHE_TTL, DEFAULT_AUTH_CACHE_SIZE)
@@ -0,0 +1,11 @@
+import pretend
+
+from press.coalesce import DEFAULT_COALESCE_WINDOW, get_coalesce_window
+
+
+def test_get_coalesce_window():
+    registry = pretend.stub(settings={})
+    assert get_coalesce_window(registry) == DEFAULT_COALESCE_WINDOW == 0
+
+    registry = pretend.stub(settings={'http.coalesce_window': '5'})
+    assert get_coalesce_window(registry) == 5
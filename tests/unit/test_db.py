@@ -0,0 +1,83 @@
+import pretend
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+from press import db as press_db
+from press.db import PoolGauges, get_pool_gauges, includeme
+
+
+@pytest.fixture
+def engine(tmpdir):
+    url = 'sqlite:///{}'.format(tmpdir.join('test.db'))
+    engine = create_engine(url, poolclass=QueuePool, pool_size=2)
+    yield engine
+    engine.dispose()
+
+
+class TestPoolGauges:
+
+    def test(self, engine):
+        gauges = PoolGauges(engine.pool)
+
+        conn1 = engine.connect()
+        conn2 = engine.connect()
+        conn3 = engine.connect()
+        assert gauges.stats() == {
+            'size': 2,
+            'checked_out': 3,
+            'peak_checked_out': 3,
+            'checkouts': 3,
+            'overflow': 1,
+        }
+
+        for conn in (conn1, conn2, conn3):
+            conn.close()
+        with engine.connect() as conn:
+            conn.execute('select 1')
+        stats = gauges.stats()
+        assert stats['checked_out'] == 0
+        assert stats['peak_checked_out'] == 3
+        assert stats['checkouts'] == 4
+
+    def test_unbounded_pool(self, tmpdir):
+        url = 'sqlite:///{}'.format(tmpdir.join('test.db'))
+        engine = create_engine(url, poolclass=NullPool)
+        gauges = PoolGauges(engine.pool)
+
+        with engine.connect():
+            stats = gauges.stats()
+
+        assert stats['size'] is None
+        assert stats['checked_out'] == 1
+        assert stats['overflow'] == 0
+
+
+def test_db_conn(engine):
+    add_finished_callback = pretend.call_recorder(lambda callback: None)
+    request = pretend.stub(
+        get_db_engine=lambda name: engine,
+        add_finished_callback=add_finished_callback,
+    )
+
+    db_conn = press_db._db_conn(request)
+
+    assert db_conn.execute('select 1').scalar() == 1
+    # The connection is closed once the request has finished
+    callback, = add_finished_callback.calls[0].args
+    callback(request)
+    assert db_conn.closed
+
+
+def test_includeme(engine):
+    registry = pretend.stub(getUtility=lambda iface, name: engine)
+    add_request_method = pretend.call_recorder(lambda fn, name, reify: None)
+    config = pretend.stub(registry=registry,
+                          add_request_method=add_request_method)
+
+    includeme(config)
+
+    assert get_pool_gauges(registry).pool is engine.pool
+    assert add_request_method.calls == [
+        pretend.call(press_db._db_conn, name='db_conn', reify=True),
+    ]
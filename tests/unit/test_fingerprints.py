@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import celery
+import pretend
+import pytest
+
+from press.fingerprints import (
+    DEFAULT_FINGERPRINTS_TTL,
+    fingerprint_manifest,
+    get_fingerprints_ttl,
+    includeme,
+)
+
+
+ROOT = Path('/shared/expanded-abc')
+
+
+def _manifest(files):
+    return {ROOT / path: {'sha1': sha1, 'md5': 'faux-md5'}
+            for path, sha1 in files.items()}
+
+
+FILES = {
+    'col11405/collection.xml': 'a1',
+    'col11405/cover.png': 'b2',
+    'col11405/m37154/index.cnxml': 'c3',
+    'col11405/m37154/fig1.png': 'd4',
+    'col11405/m37217/index.cnxml': 'e5',
+}
+
+
+class TestFingerprintManifest:
+
+    def test_deterministic(self):
+        fingerprint = fingerprint_manifest(_manifest(FILES), ROOT)
+        assert len(fingerprint) == 40
+        # Regardless of the root or the order of the files
+        other_root = Path('/scratch/expanded-xyz')
+        manifest = {other_root / path: {'sha1': sha1}
+                    for path, sha1 in reversed(list(FILES.items()))}
+        assert fingerprint_manifest(manifest, other_root) == fingerprint
+
+    @pytest.mark.parametrize('change', [
+        # changed file
+        lambda x: x.update({'col11405/m37154/fig1.png': 'ff'}),
+        # removed file
+        lambda x: x.pop('col11405/cover.png'),
+        # added file
+        lambda x: x.update({'col11405/m37217/fig1.png': 'd4'}),
+        # moved file
+        lambda x: x.update({'col11405/m37217/fig1.png':
+                            x.pop('col11405/m37154/fig1.png')}),
+        # renamed directory
+        lambda x: x.update({'col11405/m99999/index.cnxml':
+                            x.pop('col11405/m37217/index.cnxml')}),
+    ])
+    def test_changes(self, change):
+        files = dict(FILES)
+        change(files)
+        assert fingerprint_manifest(_manifest(files), ROOT) \
+            != fingerprint_manifest(_manifest(FILES), ROOT)
+
+
+def test_get_fingerprints_ttl():
+    registry = pretend.stub(settings={})
+    assert get_fingerprints_ttl(registry) == DEFAULT_FINGERPRINTS_TTL
+
+    registry = pretend.stub(settings={'fingerprints.ttl': '60'})
+    assert get_fingerprints_ttl(registry) == 60
+
+
+def test_includeme():
+    celery_app = celery.Celery('press', autofinalize=False)
+    settings = {'shared_directory.sweep_interval': 60}
+    registry = pretend.stub(celery_app=celery_app, settings=settings)
+    config = pretend.stub(registry=registry)
+
+    includeme(config)
+
+    assert celery_app.conf.beat_schedule == {
+        'expire-fingerprints': {
+            'task': 'press.fingerprints.expire_fingerprints',
+            'schedule': 60,
+        },
+    }
@@ -0,0 +1,182 @@
+import os
+import time
+from pathlib import Path
+
+import celery
+import pretend
+import pytest
+
+from press.housekeeping import (
+    DEFAULT_SWEEP_INTERVAL,
+    DEFAULT_WORKSPACE_TTL,
+    RETAINED_DIR,
+    get_disk_usage,
+    get_retention,
+    includeme,
+    release_workspace,
+    sweep_shared_directory,
+    sweep_workspace,
+)
+from press.publishing import EXPANSION_PREFIX, UPLOAD_PREFIX
+
+
+class TestGetRetention:
+
+    def test_defaults(self):
+        registry = pretend.stub(settings={})
+        assert get_retention(registry) == (0, DEFAULT_WORKSPACE_TTL)
+
+    def test_with_settings(self):
+        settings = {'shared_directory.keep_last': '3',
+                    'shared_directory.ttl': '60'}
+        registry = pretend.stub(settings=settings)
+        assert get_retention(registry) == (3, 60)
+
+
+class _SharedDirectory:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.shared_dir = Path(str(tmpdir.mkdir('shared')))
+        self.settings = {'shared_directory': str(self.shared_dir)}
+        self.registry = pretend.stub(settings=self.settings)
+
+    def make_workspace(self, name):
+        upload = self.shared_dir / (UPLOAD_PREFIX + name)
+        upload.write_bytes(b'zip')
+        expansion = self.shared_dir / (EXPANSION_PREFIX + name)
+        (expansion / 'col11405').mkdir(parents=True)
+        (expansion / 'col11405' / 'collection.xml').write_bytes(b'xml')
+        return [upload, expansion]
+
+
+class TestReleaseWorkspace(_SharedDirectory):
+
+    def test_remove(self):
+        workspace = self.make_workspace('a')
+        other = self.make_workspace('b')
+
+        release_workspace(workspace, self.registry)
+
+        # Only the given publication's files are removed
+        assert sorted(self.shared_dir.iterdir()) == sorted(other)
+
+    def test_invalid_upload(self):
+        # The upload was not a zip, so there is no expansion
+        upload, expansion = self.make_workspace('a')
+        release_workspace([upload], self.registry)
+        assert list(self.shared_dir.iterdir()) == [expansion]
+
+    def test_keep_last_from_scratch_directory(self, tmpdir):
+        self.settings['shared_directory.keep_last'] = 1
+        scratch_dir = Path(str(tmpdir.mkdir('scratch')))
+        expansion = scratch_dir / (EXPANSION_PREFIX + 'a')
+        expansion.mkdir()
+        (expansion / 'index.cnxml').write_bytes(b'xml')
+
+        release_workspace([expansion], self.registry)
+
+        retained, = (self.shared_dir / RETAINED_DIR).iterdir()
+        assert (retained / expansion.name / 'index.cnxml').exists()
+        assert list(scratch_dir.iterdir()) == []
+
+    def test_keep_last(self):
+        self.settings['shared_directory.keep_last'] = 2
+        workspaces = [self.make_workspace(x) for x in 'abc']
+
+        for workspace in workspaces:
+            release_workspace(workspace, self.registry)
+
+        assert list(self.shared_dir.iterdir()) \
+            == [self.shared_dir / RETAINED_DIR]
+        retained = sorted((self.shared_dir / RETAINED_DIR).iterdir())
+        assert len(retained) == 2
+        # The last two are retained
+        for workspace, path in zip(workspaces[1:], retained):
+            assert path.name.endswith(workspace[0].name)
+            assert sorted([x.name for x in path.iterdir()]) \
+                == sorted([x.name for x in workspace])
+            assert (path / workspace[1].name / 'col11405' /
+                    'collection.xml').exists()
+
+
+class TestSweepWorkspace(_SharedDirectory):
+
+    def test(self):
+        self.settings['shared_directory.ttl'] = 60
+        old = self.make_workspace('old')
+        new = self.make_workspace('new')
+        other = self.shared_dir / 'tracked-pubs'
+        other.mkdir()
+        now = time.time()
+        for path in old + [other]:
+            os.utime(str(path), (now - 120, now - 120))
+
+        removed = sweep_workspace(self.registry, now=now)
+
+        assert sorted(removed) == sorted(old)
+        assert sorted(self.shared_dir.iterdir()) == sorted(new + [other])
+
+    def test_scratch_directory(self, tmpdir):
+        scratch_dir = Path(str(tmpdir.mkdir('scratch')))
+        self.settings['scratch_directory'] = str(scratch_dir)
+        old = scratch_dir / (EXPANSION_PREFIX + 'old')
+        old.mkdir()
+        now = time.time() + DEFAULT_WORKSPACE_TTL + 1
+
+        assert sweep_workspace(self.registry, now=now) == [old]
+        assert list(scratch_dir.iterdir()) == []
+
+    def test_task(self):
+        workspace = self.make_workspace('a')
+        now = time.time() - DEFAULT_WORKSPACE_TTL - 1
+        for path in workspace:
+            os.utime(str(path), (now, now))
+        info = pretend.call_recorder(lambda *a, **kw: None)
+        request = pretend.stub(registry=self.registry,
+                               log=pretend.stub(info=info))
+        task = pretend.stub(get_pyramid_request=lambda: request)
+
+        assert sweep_shared_directory(task) == 2
+
+        assert list(self.shared_dir.iterdir()) == []
+        assert len(info.calls) == 2
+
+
+class TestGetDiskUsage(_SharedDirectory):
+
+    def test(self):
+        self.make_workspace('a')
+        self.make_workspace('b')
+        upload = self.shared_dir / (UPLOAD_PREFIX + 'c')
+        upload.write_bytes(b'zip')
+        self.settings['shared_directory.keep_last'] = 5
+        release_workspace([upload], self.registry)
+
+        usage = get_disk_usage(self.registry)
+
+        assert usage['total'] >= usage['used'] > 0
+        assert usage['free'] > 0
+        assert usage['uploads'] == 2
+        assert usage['expansions'] == 2
+        assert usage['retained'] == 1
+
+    def test_empty(self):
+        usage = get_disk_usage(self.registry)
+        assert (usage['uploads'], usage['expansions'], usage['retained']) \
+            == (0, 0, 0)
+
+
+def test_includeme():
+    celery_app = celery.Celery('press', autofinalize=False)
+    registry = pretend.stub(celery_app=celery_app, settings={})
+    config = pretend.stub(registry=registry)
+
+    includeme(config)
+
+    assert celery_app.conf.beat_schedule == {
+        'sweep-shared-directory': {
+            'task': 'press.housekeeping.sweep_shared_directory',
+            'schedule': DEFAULT_SWEEP_INTERVAL,
+        },
+    }
@@ -0,0 +1,213 @@
+import os
+import time
+from pathlib import Path
+
+import celery
+import pretend
+import pytest
+from pyramid.registry import Registry
+
+from press import jobs
+from press.housekeeping import DEFAULT_SWEEP_INTERVAL
+from press.jobs import (
+    FAILED,
+    FINISHED,
+    JOBS_DIR,
+    PROCESSING,
+    QUEUED,
+    JobStore,
+    expire_publication_jobs,
+    get_job_store,
+    includeme,
+    run_publication_job,
+)
+from press.publishing import UPLOAD_PREFIX
+
+
+class TestJobStore:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.directory = Path(str(tmpdir)) / JOBS_DIR
+        self.store = JobStore(self.directory)
+
+    def test_create(self):
+        job = self.store.create(publisher='ream', message='test')
+
+        assert len(job['id']) == 32
+        assert job['status'] == QUEUED
+        assert job['phase'] is None
+        assert job['created'] == job['updated']
+        assert job['data'] == {'publisher': 'ream', 'message': 'test'}
+        assert self.store.get(job['id']) == job
+
+    def test_get_unknown(self):
+        assert self.store.get('0' * 32) is None
+
+    def test_get_invalid_id(self):
+        self.store.create()
+        assert self.store.get('../jobs/x') is None
+        assert self.store.get('') is None
+
+    def test_update(self):
+        job = self.store.create()
+
+        updated = self.store.update(job['id'], status=PROCESSING,
+                                    phase='validating')
+
+        assert updated['status'] == PROCESSING
+        assert updated['phase'] == 'validating'
+        assert updated['updated'] >= job['updated']
+        assert self.store.get(job['id']) == updated
+
+    def test_update_unknown(self):
+        job = self.store.create()
+        self.store.expire(-1)
+
+        assert self.store.update(job['id'], status=PROCESSING) is None
+        # The job is not written again
+        assert self.store.get(job['id']) is None
+
+    def test_expire(self):
+        old = self.store.create()
+        new = self.store.create()
+        now = time.time()
+        path = self.directory / '{}.json'.format(old['id'])
+        os.utime(str(path), (now - 120, now - 120))
+
+        assert self.store.expire(60, now=now) == [old['id']]
+        assert self.store.get(old['id']) is None
+        assert self.store.get(new['id']) == new
+
+    def test_expire_without_jobs(self):
+        assert self.store.expire(60) == []
+
+
+class TestRunPublicationJob:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.shared_dir = Path(str(tmpdir))
+        self.registry = Registry('testing')
+        self.registry.settings = {'shared_directory': str(self.shared_dir)}
+        self.task = pretend.stub(registry=self.registry)
+        self.store = get_job_store(self.registry)
+        self.upload = self.shared_dir / (UPLOAD_PREFIX + 'a')
+        self.upload.write_bytes(b'zip')
+        self.job = self.store.create(
+            upload=str(self.upload),
+            publisher='ream',
+            message='test',
+            application_url='https://cnx.org',
+        )
+
+    def test(self, monkeypatch):
+        phases = []
+
+        def publish_upload(request, upload_filepath, submission, workspace,
+                           report):
+            assert request.application_url == 'https://cnx.org'
+            assert upload_filepath == self.upload
+            assert submission == ('ream', 'test')
+            for phase in ('expanding', 'publishing'):
+                report(phase)
+                job = self.store.get(self.job['id'])
+                phases.append((job['status'], job['phase']))
+            return 200, [{'id': 'abc'}]
+
+        monkeypatch.setattr(jobs, 'publish_upload', publish_upload)
+
+        run_publication_job(self.task, self.job['id'])
+
+        assert phases == [(PROCESSING, 'expanding'),
+                          (PROCESSING, 'publishing')]
+        job = self.store.get(self.job['id'])
+        assert job['status'] == FINISHED
+        assert job['status_code'] == 200
+        assert job['result'] == [{'id': 'abc'}]
+        # The workspace has been released
+        assert not self.upload.exists()
+
+    def test_unknown_job(self, monkeypatch):
+        publish_upload = pretend.call_recorder(lambda *a, **kw: (200, []))
+        monkeypatch.setattr(jobs, 'publish_upload', publish_upload)
+
+        # e.g. the job has expired
+        assert run_publication_job(self.task, '0' * 32) is None
+
+        assert publish_upload.calls == []
+        # The job's upload is left for the sweep of the shared directory
+        assert self.upload.exists()
+
+    def test_job_removed_while_running(self, monkeypatch):
+        def publish_upload(request, upload_filepath, submission, workspace,
+                           report):
+            report('expanding')
+            # e.g. the job expired while it was being processed
+            self.store.expire(-1)
+            report('publishing')
+            return 200, [{'id': 'abc'}]
+
+        monkeypatch.setattr(jobs, 'publish_upload', publish_upload)
+
+        run_publication_job(self.task, self.job['id'])
+
+        assert self.store.get(self.job['id']) is None
+        # The workspace has been released
+        assert not self.upload.exists()
+
+    def test_invalid(self, monkeypatch):
+        result = {'messages': [{'id': 2}]}
+        monkeypatch.setattr(jobs, 'publish_upload',
+                            lambda *a, **kw: (400, result))
+
+        run_publication_job(self.task, self.job['id'])
+
+        job = self.store.get(self.job['id'])
+        assert job['status'] == FAILED
+        assert job['status_code'] == 400
+        assert job['result'] == result
+
+    def test_error(self, monkeypatch):
+        def publish_upload(*args, **kwargs):
+            raise RuntimeError('boom')
+
+        monkeypatch.setattr(jobs, 'publish_upload', publish_upload)
+
+        with pytest.raises(RuntimeError):
+            run_publication_job(self.task, self.job['id'])
+
+        job = self.store.get(self.job['id'])
+        assert job['status'] == FAILED
+        assert job['status_code'] == 500
+        assert not self.upload.exists()
+
+
+def test_expire_publication_jobs(tmpdir):
+    settings = {'shared_directory': str(tmpdir),
+                'shared_directory.ttl': '60'}
+    registry = pretend.stub(settings=settings)
+    store = get_job_store(registry)
+    job = store.create()
+    store.create()
+    now = time.time()
+    path = Path(str(tmpdir)) / JOBS_DIR / '{}.json'.format(job['id'])
+    os.utime(str(path), (now - 120, now - 120))
+
+    assert expire_publication_jobs(pretend.stub(registry=registry)) == 1
+    assert store.get(job['id']) is None
+
+
+def test_includeme():
+    celery_app = celery.Celery('press', autofinalize=False)
+    registry = pretend.stub(celery_app=celery_app, settings={})
+    config = pretend.stub(registry=registry)
+
+    includeme(config)
+
+    assert celery_app.conf.beat_schedule == {
+        'expire-publication-jobs': {
+            'task': 'press.jobs.expire_publication_jobs',
+            'schedule': DEFAULT_SWEEP_INTERVAL,
+        },
+    }
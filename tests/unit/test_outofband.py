@@ -1,9 +1,26 @@
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 import pretend
 import pytest
 import requests
 import requests_mock as rmock
 
-from press.outofband import make_request
+from press import outofband
+from press.outofband import (
+    DeadlineExceeded,
+    dispatch_requests,
+    get_http_concurrency,
+    get_http_deadline,
+    get_http_host_concurrency,
+    get_http_session,
+    get_http_stats,
+    get_http_timeout,
+    make_request,
+    make_requests,
+)
 
 from tests.helpers import (
     count_calls,
@@ -166,3 +183,338 @@ class TestMakeRequest:
         # There should be exception log calls, but because of the nature
         # of our retry() method, we aren't able to continue through the logic.
         assert self.request.log.exception.calls == []
+
+
+class TestMakeRequests:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, stub_request):
+        self.request = stub_request
+
+        self.max_retries = 3
+
+        # Mock Celery task
+        @count_calls
+        def retry(args, exc):
+            if retry.call_count == self.max_retries:
+                raise FauxMaxRetriesExceededError()
+            make_requests(self.celery_task, *args)
+
+        self.task_retry_method = pretend.call_recorder(retry)
+        self.celery_task = pretend.stub(
+            get_pyramid_request=lambda: self.request,
+            retry=self.task_retry_method,
+            MaxRetriesExceededError=FauxMaxRetriesExceededError,
+        )
+
+        self.base_url = '{}://legacy.{}/content'.format(
+            self.request.scheme,
+            self.request.domain,
+        )
+
+    def test_success(self, requests_mock):
+        requests_mock.register_uri('GET', rmock.ANY, text='ok')
+        requests_mock.register_uri('PURGE_REGEXP', rmock.ANY, status_code=204)
+        http_requests = [
+            ('GET', '{}/m{}/latest'.format(self.base_url, i))
+            for i in range(10)
+        ]
+        http_requests.append(('PURGE_REGEXP', self.base_url))
+
+        # Call the target
+        outcomes = make_requests(self.celery_task, http_requests)
+
+        # Check the requests were made
+        history = requests_mock.request_history
+        assert sorted([(r.method, r.url) for r in history]) \
+            == sorted(http_requests)
+        # Check the outcome of each request is reported (in order)
+        expected = [{'method': method, 'url': url, 'status': 200}
+                    for method, url in http_requests[:-1]]
+        expected.append({'method': 'PURGE_REGEXP', 'url': self.base_url,
+                         'status': 204})
+        assert outcomes == expected
+
+        # Check for logging
+        assert len(self.request.log.info.calls) == len(http_requests)
+        assert self.request.log.error.calls == []
+        assert self.task_retry_method.calls == []
+
+    def test_without_requests(self, requests_mock):
+        assert make_requests(self.celery_task, []) == []
+        assert requests_mock.request_history == []
+
+    def test_failed_request_and_retry(self, requests_mock):
+        ok_url = '{}/m1/latest'.format(self.base_url)
+        failing_url = '{}/m2/latest'.format(self.base_url)
+
+        @count_calls
+        def request_callback(request, context):
+            if request_callback.call_count < 2:
+                raise requests.exceptions.ConnectTimeout()
+            return 'ok'
+
+        requests_mock.register_uri('GET', ok_url, text='ok')
+        requests_mock.register_uri('GET', failing_url, text=request_callback)
+
+        # Call the target
+        outcomes = make_requests(
+            self.celery_task,
+            [('GET', ok_url), ('GET', failing_url)],
+        )
+
+        # Check only the failed request was retried
+        assert len(self.task_retry_method.calls) == 1
+        assert self.task_retry_method.calls[0].kwargs['args'] \
+            == ([('GET', failing_url)],)
+        assert [r.url for r in requests_mock.request_history].count(ok_url) \
+            == 1
+        assert request_callback.call_count == 2
+
+        # Check the outcomes of the first attempt are reported
+        assert outcomes[0] == {'method': 'GET', 'url': ok_url, 'status': 200}
+        assert outcomes[1]['url'] == failing_url
+        assert 'ConnectTimeout' in outcomes[1]['error']
+
+        # Check raven was not used and the failure was logged
+        assert self.request.raven_client.captureException.calls == []
+        assert len(self.request.log.error.calls) == 1
+        assert failing_url in self.request.log.error.calls[0].args[0]
+
+    def test_max_retries(self, requests_mock):
+        # See the note about the retry mock in TestMakeRequest.test_max_retries
+        url = '{}/m1/latest'.format(self.base_url)
+        requests_mock.register_uri(
+            'GET', url, exc=requests.exceptions.ConnectTimeout)
+
+        # Call the target
+        with pytest.raises(FauxMaxRetriesExceededError):
+            make_requests(self.celery_task, [('GET', url)])
+
+        assert len(self.task_retry_method.calls) == self.max_retries
+        assert len(self.request.raven_client.captureException.calls) \
+            == self.max_retries
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def http_server():
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    """Responds after sleeping for the number of seconds in the path
+    (e.g. ``/0.2``), while counting the requests in flight.
+
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight,
+                                       server.in_flight)
+        try:
+            time.sleep(float(self.path.strip('/')))
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_http_server():
+    server = _ThreadingHTTPServer(('127.0.0.1', 0), _SlowHandler)
+    server.lock = threading.Lock()
+    server.in_flight = server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def clean_sessions(monkeypatch):
+    monkeypatch.setattr(outofband, '_sessions', {})
+
+
+class TestGetHttpSession:
+
+    def test_reused(self, clean_sessions):
+        registry = pretend.stub(settings={'http.pool_size': 3})
+
+        session = get_http_session(registry)
+
+        assert get_http_session(registry) is session
+        adapter = session.get_adapter('https://legacy.example.org')
+        assert adapter._pool_maxsize == 3
+
+    def test_new_session_per_process(self, clean_sessions, monkeypatch):
+        registry = pretend.stub(settings={})
+        session = get_http_session(registry)
+
+        # e.g. a forked worker process
+        monkeypatch.setattr(outofband.os, 'getpid', lambda: -1)
+
+        assert get_http_session(registry) is not session
+        assert list(outofband._sessions.keys()) == [-1]
+
+    def test_connection_reuse_stats(self, clean_sessions, http_server):
+        registry = pretend.stub(settings={})
+        session = get_http_session(registry)
+        assert get_http_stats() == {
+            'requests': 0, 'connections': 0, 'reused': 0}
+
+        for i in range(0, 5):
+            resp = session.get('{}/{}'.format(http_server, i))
+            assert resp.text == 'ok'
+
+        assert get_http_stats() == {
+            'requests': 5, 'connections': 1, 'reused': 4}
+
+
+class TestDispatchRequests:
+
+    def _dispatch(self, http_requests, **settings):
+        registry = pretend.stub(settings=settings)
+        start = time.monotonic()
+        results = dispatch_requests(http_requests, registry)
+        return results, time.monotonic() - start
+
+    def test_concurrent(self, clean_sessions, slow_http_server):
+        delay = 0.2
+        http_requests = [('GET', '{}/{}'.format(slow_http_server.url, delay))
+                         for i in range(8)]
+
+        # Serially (as the requests used to be made)
+        results, serial_elapsed = self._dispatch(
+            http_requests,
+            **{'http.concurrency': 1, 'http.host_concurrency': 1})
+        assert [outcome['status'] for outcome, _ in results] == [200] * 8
+        assert serial_elapsed >= delay * 8
+        assert slow_http_server.max_in_flight == 1
+
+        # Concurrently
+        results, elapsed = self._dispatch(
+            http_requests,
+            **{'http.concurrency': 8, 'http.host_concurrency': 4})
+        assert [outcome['status'] for outcome, _ in results] == [200] * 8
+        assert [exc for _, exc in results] == [None] * 8
+        assert slow_http_server.max_in_flight == 4
+        # Two rounds of four requests, rather than eight rounds of one
+        assert elapsed < delay * 4
+        assert elapsed * 2 < serial_elapsed
+
+    def test_host_concurrency(self, clean_sessions, slow_http_server):
+        # The same server under another host name
+        other_url = slow_http_server.url.replace('127.0.0.1', 'localhost')
+        http_requests = [('GET', '{}/0.1'.format(slow_http_server.url))
+                         for i in range(6)]
+        http_requests.append(('GET', '{}/0'.format(other_url)))
+
+        results, elapsed = self._dispatch(
+            http_requests,
+            **{'http.concurrency': 3, 'http.host_concurrency': 2})
+
+        assert [exc for _, exc in results] == [None] * 7
+        # Two requests to the first host and one to the other host
+        assert slow_http_server.max_in_flight <= 3
+        # The outcomes are in the order of the requests
+        assert [outcome['url'] for outcome, _ in results] \
+            == [url for _, url in http_requests]
+
+    def test_deadline(self, clean_sessions, slow_http_server):
+        slow_url = '{}/1'.format(slow_http_server.url)
+        fast_url = '{}/0'.format(slow_http_server.url)
+
+        results, elapsed = self._dispatch(
+            [('GET', slow_url), ('GET', fast_url)],
+            **{'http.deadline': 0.2})
+
+        (slow, slow_exc), (fast, fast_exc) = results
+        assert isinstance(slow_exc, DeadlineExceeded)
+        assert 'DeadlineExceeded' in slow['error']
+        assert fast == {'method': 'GET', 'url': fast_url, 'status': 200}
+        assert fast_exc is None
+        assert elapsed < 1
+
+    def test_deadline_waiting_for_host(self, clean_sessions,
+                                       slow_http_server):
+        http_requests = [('GET', '{}/0.5'.format(slow_http_server.url)),
+                         ('GET', '{}/0'.format(slow_http_server.url))]
+
+        results, elapsed = self._dispatch(
+            http_requests,
+            **{'http.deadline': 0.2, 'http.host_concurrency': 1})
+
+        assert [isinstance(exc, DeadlineExceeded) for _, exc in results] \
+            == [True, True]
+
+    def test_without_requests(self):
+        assert dispatch_requests([], pretend.stub(settings={})) == []
+
+
+def test_get_http_host_concurrency():
+    registry = pretend.stub(settings={})
+    assert get_http_host_concurrency(registry) \
+        == outofband.DEFAULT_HTTP_HOST_CONCURRENCY
+
+    registry = pretend.stub(settings={'http.host_concurrency': '1'})
+    assert get_http_host_concurrency(registry) == 1
+
+
+def test_get_http_deadline():
+    registry = pretend.stub(settings={})
+    assert get_http_deadline(registry) == outofband.DEFAULT_HTTP_DEADLINE
+
+    registry = pretend.stub(settings={'http.deadline': '2.5'})
+    assert get_http_deadline(registry) == 2.5
+
+
+def test_get_http_concurrency():
+    registry = pretend.stub(settings={})
+    assert get_http_concurrency(registry) == outofband.DEFAULT_HTTP_CONCURRENCY
+
+    registry = pretend.stub(settings={'http.concurrency': '2'})
+    assert get_http_concurrency(registry) == 2
+
+
+def test_get_http_timeout():
+    registry = pretend.stub(settings={})
+    assert get_http_timeout(registry) == (1, 120)
+
+    settings = {'http.connect_timeout': '2.5', 'http.read_timeout': 30}
+    registry = pretend.stub(settings=settings)
+    assert get_http_timeout(registry) == (2.5, 30)
@@ -1,17 +1,33 @@
+import hashlib
 import io
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import BadZipFile, ZipFile
+
+import litezip
 
 import pretend
 import pytest
 from pyramid import testing as pyramid_testing
 
+from press.exceptions import UploadTooLarge
 from press.publishing import (
+    DEFAULT_SCRATCH_MAX_SIZE,
+    EXPANSION_PREFIX,
     discover_content_dir,
     expand_zip,
+    get_publishing_workers,
+    get_scratch_location,
+    get_upload_limits,
     get_var_location,
+    ingest_zip,
+    parse_document_version,
+    parse_litezip,
     persist_file_to_filesystem,
+    preprocess_modules,
 )
+from press.parsers import parse_module_metadata
+from press.timing import PublicationTimer
+from press.utils import BUFFER_CHUNK_SIZE, produce_hashes_from_filepath
 
 
 class TestGetVarLocation:
@@ -65,6 +81,76 @@ def test_persist_file_to_filesystem(tmpdir):
     assert filepath in [fp for fp in shared_directory.iterdir()]
 
 
+class TestGetUploadLimits:
+
+    def test_defaults(self):
+        registry = pretend.stub(settings={})
+
+        chunk_size, max_size = get_upload_limits(registry)
+        assert chunk_size == BUFFER_CHUNK_SIZE
+        assert max_size is None
+
+    def test_with_settings(self):
+        settings = {'upload.chunk_size': '10', 'upload.max_size': '100'}
+        registry = pretend.stub(settings=settings)
+
+        chunk_size, max_size = get_upload_limits(registry)
+        assert chunk_size == 10
+        assert max_size == 100
+
+
+class TestGetPublishingWorkers:
+
+    def test_default(self):
+        registry = pretend.stub(settings={})
+        assert get_publishing_workers(registry) == 0
+
+    def test_with_settings(self):
+        registry = pretend.stub(settings={'publishing.workers': '4'})
+        assert get_publishing_workers(registry) == 4
+
+
+def test_persist_file_to_filesystem_in_chunks(tmpdir):
+    file_content = io.BytesIO(b'foo bar baz' * 10)
+    read = pretend.call_recorder(file_content.read)
+    file = pretend.stub(read=read, seek=file_content.seek)
+    # Configure a dummy application.
+    shared_directory = Path(tmpdir.mkdir('shared'))
+    settings = {
+        'shared_directory': str(shared_directory),
+        'upload.chunk_size': 25,
+    }
+    with pyramid_testing.testConfig(settings=settings):
+        filepath = persist_file_to_filesystem(file)
+
+    with filepath.open('rb') as fb:
+        assert fb.read() == file_content.getvalue()
+    # 110 bytes in 25 byte chunks, plus the final empty read
+    assert read.calls == [pretend.call(25)] * 6
+    # Check the file was reset to the start
+    assert file_content.tell() == 0
+
+
+def test_persist_file_to_filesystem_too_large(tmpdir):
+    file_content = io.BytesIO(b'foo bar baz' * 10)
+    # Configure a dummy application.
+    shared_directory = Path(tmpdir.mkdir('shared'))
+    settings = {
+        'shared_directory': str(shared_directory),
+        'upload.chunk_size': 25,
+        'upload.max_size': 100,
+    }
+    with pyramid_testing.testConfig(settings=settings):
+        with pytest.raises(UploadTooLarge) as exc_info:
+            persist_file_to_filesystem(file_content)
+
+    assert exc_info.value.max_size == 100
+    # Check the partially written file was removed
+    assert list(shared_directory.iterdir()) == []
+    # Check the file was reset to the start
+    assert file_content.tell() == 0
+
+
 def test_expand_zip(app, tmpdir):
     zipfile = io.BytesIO()
     files = [
@@ -93,6 +179,193 @@ def test_expand_zip(app, tmpdir):
     assert sorted(expanded_files) == sorted(files)
 
 
+def test_ingest_zip(tmpdir):
+    zipfile = io.BytesIO()
+    files = {
+        'foo/bar.txt': b'foobar',
+        'foo/mar.txt': b'foomar',
+        'smoo.txt': b'smoo',
+        # Unsafe paths are kept within the expanded directory.
+        '../../escape.txt': b'escape',
+    }
+    with ZipFile(zipfile, mode='a') as zb:
+        for name, data in files.items():
+            zb.writestr(name, data)
+    # Reset file pointer location
+    zipfile.seek(0)
+
+    # Configure a dummy application.
+    settings = {'shared_directory': str(tmpdir.mkdir('shared'))}
+    with pyramid_testing.testConfig(settings=settings):
+        expand_path, manifest = ingest_zip(zipfile)
+
+    expected_files = {
+        expand_path / 'foo/bar.txt': b'foobar',
+        expand_path / 'foo/mar.txt': b'foomar',
+        expand_path / 'smoo.txt': b'smoo',
+        expand_path / 'escape.txt': b'escape',
+    }
+    assert sorted(manifest) == sorted(expected_files)
+    for path, data in expected_files.items():
+        assert path.read_bytes() == data
+        assert manifest[path] == {
+            'sha1': hashlib.sha1(data).hexdigest(),
+            'md5': hashlib.md5(data).hexdigest(),
+        }
+
+
+def test_ingest_zip_with_invalid_file(tmpdir):
+    settings = {'shared_directory': str(tmpdir.mkdir('shared'))}
+    with pyramid_testing.testConfig(settings=settings):
+        with pytest.raises(BadZipFile):
+            ingest_zip(io.BytesIO(b'foo bar baz'))
+
+
+def test_ingest_zip_with_corrupt_member(tmpdir):
+    zipfile = io.BytesIO()
+    with ZipFile(zipfile, mode='a') as zb:
+        zb.writestr('foo.txt', b'foo bar baz')
+    # Corrupt the stored (uncompressed) member data to fail the CRC check.
+    data = zipfile.getvalue().replace(b'foo bar baz', b'foo bar bat')
+
+    shared_directory = Path(str(tmpdir.mkdir('shared')))
+    settings = {'shared_directory': str(shared_directory)}
+    with pyramid_testing.testConfig(settings=settings):
+        with pytest.raises(BadZipFile):
+            ingest_zip(io.BytesIO(data))
+    # Check the partially expanded directory was removed
+    assert list(shared_directory.iterdir()) == []
+
+
+class TestIngestZipWithScratchDirectory:
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.shared_dir = Path(str(tmpdir.mkdir('shared')))
+        self.scratch_dir = Path(str(tmpdir.mkdir('scratch')))
+        self.settings = {
+            'shared_directory': str(self.shared_dir),
+            'scratch_directory': str(self.scratch_dir),
+        }
+        self.zipfile = io.BytesIO()
+        with ZipFile(self.zipfile, mode='a') as zb:
+            zb.writestr('foo/bar.txt', b'foobar')
+            zb.writestr('smoo.txt', b'smoo')
+        self.zipfile.seek(0)
+
+    def test_small_zip(self):
+        self.settings['scratch_directory.max_size'] = 10
+        with pyramid_testing.testConfig(settings=self.settings):
+            expand_path, manifest = ingest_zip(self.zipfile)
+
+        assert expand_path.parent == self.scratch_dir
+        assert expand_path.name.startswith(EXPANSION_PREFIX)
+        assert (expand_path / 'foo/bar.txt').read_bytes() == b'foobar'
+        assert sorted(manifest) == [expand_path / 'foo/bar.txt',
+                                    expand_path / 'smoo.txt']
+        assert list(self.shared_dir.iterdir()) == []
+
+    def test_large_zip(self):
+        # Larger than the scratch directory's limit
+        self.settings['scratch_directory.max_size'] = 9
+        with pyramid_testing.testConfig(settings=self.settings):
+            expand_path, manifest = ingest_zip(self.zipfile)
+
+        assert expand_path.parent == self.shared_dir
+        assert (expand_path / 'smoo.txt').read_bytes() == b'smoo'
+        assert list(self.scratch_dir.iterdir()) == []
+
+
+class TestGetScratchLocation:
+
+    def test_defaults(self):
+        registry = pretend.stub(settings={})
+        assert get_scratch_location(registry) \
+            == (None, DEFAULT_SCRATCH_MAX_SIZE)
+
+    def test_with_settings(self):
+        settings = {'scratch_directory': '/dev/shm/press',
+                    'scratch_directory.max_size': '1024'}
+        registry = pretend.stub(settings=settings)
+        assert get_scratch_location(registry) \
+            == (Path('/dev/shm/press'), 1024)
+
+
+def test_parse_litezip(litezip_valid_litezip):
+    expected = litezip.parse_litezip(litezip_valid_litezip)
+
+    struct = parse_litezip(litezip_valid_litezip)
+    assert struct == expected
+
+
+def test_parse_litezip_with_manifest(litezip_valid_litezip):
+    expected = litezip.parse_litezip(litezip_valid_litezip)
+    module = [x for x in expected if x.resources][0]
+    resource = module.resources[0]
+    manifest = {resource.data: {'sha1': 'faux-sha1', 'md5': 'faux-md5'}}
+
+    struct = parse_litezip(litezip_valid_litezip, manifest)
+    parsed_module = [x for x in struct if x.id == module.id][0]
+    assert parsed_module.resources[0].sha1 == 'faux-sha1'
+    assert parsed_module.resources[1:] == module.resources[1:]
+
+
+def test_parse_document_version(litezip_valid_litezip):
+    struct = litezip.parse_litezip(litezip_valid_litezip)
+    module = [x for x in struct if isinstance(x, litezip.Module)][0]
+
+    version = parse_document_version(module.file)
+
+    assert version == parse_module_metadata(module).version
+
+
+@pytest.mark.parametrize('workers', [0, 4])
+def test_preprocess_modules(litezip_valid_litezip, workers):
+    struct = litezip.parse_litezip(litezip_valid_litezip)
+    modules = [x for x in struct if isinstance(x, litezip.Module)]
+
+    results = preprocess_modules(modules, workers=workers)
+
+    assert [x[0] for x in results] == modules
+    for module, metadata, hashes in results:
+        assert metadata == parse_module_metadata(module)
+        assert hashes == produce_hashes_from_filepath(module.file)
+
+
+def test_preprocess_modules_with_manifest(litezip_valid_litezip):
+    struct = litezip.parse_litezip(litezip_valid_litezip)
+    modules = [x for x in struct if isinstance(x, litezip.Module)]
+    hashes = {'sha1': 'faux-sha1', 'md5': 'faux-md5'}
+    manifest = {modules[0].file: hashes}
+
+    results = preprocess_modules(modules, manifest, workers=2)
+
+    assert results[0][2] == hashes
+    assert results[1][2] == produce_hashes_from_filepath(modules[1].file)
+
+
+@pytest.mark.parametrize('workers', [0, 4])
+def test_preprocess_modules_with_timer(litezip_valid_litezip, workers):
+    struct = litezip.parse_litezip(litezip_valid_litezip)
+    modules = [x for x in struct if isinstance(x, litezip.Module)]
+    timer = PublicationTimer(items=True)
+
+    preprocess_modules(modules, workers=workers, timer=timer)
+
+    assert sorted(timer.items) == sorted([x.id for x in modules])
+
+
+def test_preprocess_modules_uses_workers_setting(litezip_valid_litezip):
+    struct = litezip.parse_litezip(litezip_valid_litezip)
+    modules = [x for x in struct if isinstance(x, litezip.Module)]
+    settings = {'publishing.workers': 3}
+
+    with pyramid_testing.testConfig(settings=settings):
+        results = preprocess_modules(modules)
+
+    assert [x[0] for x in results] == modules
+
+
 def test_discover_content_dir(tmpdir):
     root = Path(str(tmpdir.mkdir('root')))
     dir = root / 'foo'
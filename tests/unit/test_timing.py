@@ -0,0 +1,115 @@
+import pretend
+import pytest
+
+from press import timing as press_timing
+from press.timing import PublicationTimer, get_module_timings, includeme
+
+
+class FauxClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += seconds
+
+
+class TestPublicationTimer:
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.clock = FauxClock()
+
+    def test_phases(self):
+        timer = PublicationTimer(clock=self.clock)
+
+        with timer.phase('expanding'):
+            self.clock.tick(1.5)
+        with timer.phase('publishing'):
+            self.clock.tick(1)
+            with timer.phase('publishing.modules'):
+                self.clock.tick(2)
+        with timer.phase('notifying'):
+            self.clock.tick(0.25)
+        self.clock.tick(1)  # untimed
+        with timer.phase('notifying'):
+            self.clock.tick(0.25)
+
+        assert timer.summary() == {
+            'total': 6,
+            'phases': {
+                'expanding': 1.5,
+                'publishing': 3,
+                'publishing.modules': 2,
+                'notifying': 0.5,
+            },
+        }
+        # Phases are reported in the order they were first started
+        assert list(timer.summary()['phases']) \
+            == ['expanding', 'publishing', 'publishing.modules', 'notifying']
+
+    def test_phase_with_error(self):
+        timer = PublicationTimer(clock=self.clock)
+
+        with pytest.raises(ValueError):
+            with timer.phase('validating'):
+                self.clock.tick(2)
+                raise ValueError()
+
+        assert timer.summary()['phases'] == {'validating': 2}
+
+    def test_items(self):
+        timer = PublicationTimer(items=True, clock=self.clock)
+
+        with timer.phase('preprocessing'):
+            with timer.item('m1'):
+                self.clock.tick(0.001)
+            with timer.item('m2'):
+                self.clock.tick(0.0034)
+
+        summary = timer.summary()
+        # Slowest first, rounded to the millisecond
+        assert list(summary['items'].items()) == [('m2', 0.003),
+                                                  ('m1', 0.001)]
+
+    def test_items_not_timed(self):
+        timer = PublicationTimer(clock=self.clock)
+
+        with timer.item('m1'):
+            self.clock.tick(1)
+
+        assert timer.summary() == {'total': 0, 'phases': {}}
+
+
+@pytest.mark.parametrize('settings, expected', [
+    ({}, False),
+    ({'publishing.module_timings': 'true'}, True),
+    ({'publishing.module_timings': False}, False),
+])
+def test_get_module_timings(settings, expected):
+    registry = pretend.stub(settings=settings)
+    assert get_module_timings(registry) is expected
+
+
+def test_includeme():
+    add_request_method = pretend.call_recorder(lambda fn, name, reify: None)
+    config = pretend.stub(add_request_method=add_request_method)
+
+    includeme(config)
+
+    assert add_request_method.calls == [
+        pretend.call(press_timing._create_timer, name='timer', reify=True),
+    ]
+
+
+def test_request_timer():
+    settings = {'publishing.module_timings': True}
+    request = pretend.stub(registry=pretend.stub(settings=settings))
+
+    timer = press_timing._create_timer(request)
+
+    assert isinstance(timer, PublicationTimer)
+    assert timer.items == {}
@@ -0,0 +1,39 @@
+import celery
+import pretend
+
+from press.tracking import get_publication_log_max_age, includeme
+
+
+def test_get_publication_log_max_age():
+    registry = pretend.stub(settings={})
+    assert get_publication_log_max_age(registry) == 0
+
+    registry = pretend.stub(settings={'publication_log.max_age': '3600'})
+    assert get_publication_log_max_age(registry) == 3600
+
+
+def test_includeme():
+    celery_app = celery.Celery('press', autofinalize=False)
+    settings = {'publication_log.max_age': 86400,
+                'shared_directory.sweep_interval': 60}
+    registry = pretend.stub(celery_app=celery_app, settings=settings)
+    config = pretend.stub(registry=registry)
+
+    includeme(config)
+
+    assert celery_app.conf.beat_schedule == {
+        'expire-publication-log': {
+            'task': 'press.tracking.expire_publication_log',
+            'schedule': 60,
+        },
+    }
+
+
+def test_includeme_kept_indefinitely():
+    celery_app = celery.Celery('press', autofinalize=False)
+    registry = pretend.stub(celery_app=celery_app, settings={})
+    config = pretend.stub(registry=registry)
+
+    includeme(config)
+
+    assert celery_app.conf.beat_schedule == {}